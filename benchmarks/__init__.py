@@ -0,0 +1,7 @@
+"""
+Benchmarks
+-----------
+
+Performance benchmarks of pyAEMET. Run them from the repository root,
+e.g. `python -m benchmarks.bench_decimal_notation`.
+"""
@@ -0,0 +1,208 @@
+"""
+Client benchmark
+------------------
+
+Offline benchmark of `AemetClima` against the local mock of AEMET
+OpenData (see `benchmarks.mock_server`), run in its own process. It
+runs `daily_clima`, `sites_info`, `sites_curation` and `near_sites` and
+reports their throughput, the latency percentiles of the HTTP requests
+(or of the queries, for `near_sites`) and the peak of memory over time.
+
+    python -m benchmarks.bench_client --sites 100 --years 10 \\
+        --latency 0.05 --throttle 0.05 --max-workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import threading
+import subprocess
+from datetime import date
+
+import numpy as np
+import requests
+
+from src.pyaemet.climatology import AemetClima
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+
+from .mock_server import API_PATH
+
+
+def resident_memory() -> int:
+    """ Resident memory of the process, in bytes """
+
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Not Linux: peak resident memory, in KB (bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler():
+    """
+    Sample the resident memory in a background thread. Unlike
+    `tracemalloc`, it does not slow down the code being measured.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(resident_memory() - self.baseline)
+
+    def __enter__(self):
+        self.baseline = resident_memory()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append(resident_memory() - self.baseline)
+
+    @property
+    def peak(self) -> int:
+        return max(self.samples)
+
+    def timeline(self, points: int = 8) -> str:
+        """ Memory over the baseline at `points` moments of the run, in MB """
+
+        positions = np.linspace(0, len(self.samples) - 1, points).astype(int)
+        return " ".join("%.0f" % (self.samples[i] / 1024**2)
+                        for i in sorted(set(positions)))
+
+
+def timed_requests(client: AemetClima) -> list:
+    """ Record the latency of every HTTP request sent by the client """
+
+    latencies = []
+    session = client.session
+    get = session.get
+
+    def timed_get(url, **kwargs):
+        tic = time.perf_counter()
+        try:
+            return get(url, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - tic)
+
+    session.get = timed_get
+
+    return latencies
+
+
+def run(label: str, func, latencies: list, units: str = "requests",
+        count=None):
+    """ Run a benchmark and print its report """
+
+    latencies.clear()
+
+    with MemorySampler() as memory:
+        tic = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - tic
+
+    n_items = count(result) if count is not None else len(latencies)
+    p50, p90, p99 = (np.percentile(latencies, [50, 90, 99]) * 1e3
+                     if latencies else (np.nan,) * 3)
+
+    print(f"{label:>15}: {elapsed:7.2f} s | "
+          f"{n_items / elapsed:9.1f} {units}/s | "
+          f"latency p50 {p50:7.1f} p90 {p90:7.1f} p99 {p99:7.1f} ms | "
+          f"peak {memory.peak / 1024**2:6.1f} MB | "
+          f"MB over time: {memory.timeline()}")
+
+    return result
+
+
+def start_server(args, port: int = 8777):
+    """
+    Run the mock server in its own process, so its work is not measured
+    as part of the client.
+    """
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_server",
+         "--port", str(port), "--latency", str(args.latency),
+         "--throttle", str(args.throttle), "--padding", str(args.padding)],
+        stdout=subprocess.PIPE, text=True)
+    # Wait until it is listening
+    process.stdout.readline()
+
+    return process, "http://127.0.0.1:%d" % port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sites", type=int, default=50)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument("--padding", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8777)
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="requests per second allowed by the client")
+    args = parser.parse_args()
+
+    server, url = start_server(args, port=args.port)
+
+    try:
+        client = AemetClima(
+            apikey="benchmark",
+            scheduler=RateLimiter(rate=args.rate, burst=args.rate,
+                                  max_rate=args.rate, backoff=0.05),
+            reverse_geocoder=ReverseGeocoder(offline=True))
+        client._aemet_request.main_url = url + API_PATH
+        latencies = timed_requests(client)
+
+        sites = run("sites_info", lambda: client.sites_info(update=True),
+                    latencies)
+        codes = list(sites.site[:args.sites])
+        start, end = date(2020 - args.years, 1, 1), date(2019, 12, 31)
+
+        run("daily_clima",
+            lambda: client.daily_clima(codes, start, end, verbosity=False,
+                                       max_workers=args.max_workers),
+            latencies, units="rows", count=len)
+
+        run("sites_curation",
+            lambda: client.sites_curation(start, codes, end_dt=end,
+                                          verbosity=False),
+            latencies, units="sites", count=len)
+
+        rng = np.random.default_rng(0)
+        points = np.column_stack([rng.uniform(36.0, 43.5, args.queries),
+                                  rng.uniform(-9.0, 3.0, args.queries)])
+
+        def near_sites():
+            for latitude, longitude in points:
+                tic = time.perf_counter()
+                client.near_sites(latitude, longitude, n_near=5,
+                                  max_distance=100)
+                latencies.append(time.perf_counter() - tic)
+            return points
+
+        run("near_sites", near_sites, latencies, units="queries", count=len)
+
+        stats = requests.get(url + "/stats", timeout=10).json()
+        print(f"{'server':>15}: {stats['requests']} requests | "
+              f"{stats['throttled']} throttled (429) | "
+              f"{stats['bytes_sent'] / 1024**2:.1f} MB sent")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Decimal notation benchmark
+----------------------------
+
+Compare the legacy row-by-row decimal notation conversion against the
+column-wise vectorized one on a synthetic download of AEMET daily
+observations.
+
+    python -m benchmarks.bench_decimal_notation --rows 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.pyaemet.utilities.curation import (
+    decimal_notation,
+    decimal_notation_columns,
+    )
+from src.pyaemet.utilities.dictionaries import OBSERVATIONS_TRANSLATION
+
+
+def synthetic_observations(rows: int, seed: int = 0) -> pd.DataFrame:
+    """ Raw observations, as strings with comma decimal notation """
+
+    rng = np.random.default_rng(seed)
+
+    def numbers(low, high):
+        values = pd.Series(rng.uniform(low, high, rows).round(1)) \
+                   .astype(str).str.replace(".", ",", regex=False)
+        values[rng.random(rows) < 0.05] = None
+        return values.astype(object)
+
+    return pd.DataFrame({
+        "date": pd.date_range("1990-01-01", periods=rows, freq="h")
+                  .strftime("%Y-%m-%d"),
+        "site": "1111X",
+        "altitude": "52",
+        "temp_avg": numbers(-10, 40),
+        "precipitation": numbers(0, 100),
+        "temp_min": numbers(-15, 30),
+        "temp_max": numbers(-5, 45),
+        "wnd_dir": numbers(0, 36),
+        "wnd_spd": numbers(0, 20),
+        "wnd_gst": numbers(0, 40),
+        "press_max": numbers(950, 1050),
+        "press_min": numbers(950, 1050),
+        "hr_sun": numbers(0, 14),
+        })
+
+
+def _dtypes(data):
+    return {k: v["dtype"] for k, v in OBSERVATIONS_TRANSLATION.items()
+            if k in data.columns}
+
+
+def legacy(data: pd.DataFrame) -> pd.DataFrame:
+    return data.apply(decimal_notation, axis=1).astype(_dtypes(data))
+
+
+def vectorized(data: pd.DataFrame) -> pd.DataFrame:
+    dtypes = _dtypes(data)
+    numeric = [k for k, v in dtypes.items() if v == "float64"]
+    return decimal_notation_columns(data, numeric=numeric).astype(dtypes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raw = synthetic_observations(args.rows)
+
+    timings = {}
+    results = {}
+    for name, func in (("vectorized", vectorized), ("legacy", legacy)):
+        start = time.perf_counter()
+        results[name] = func(raw.copy())
+        timings[name] = time.perf_counter() - start
+        print(f"{name:>10}: {timings[name]:8.2f} s "
+              f"({args.rows / timings[name]:,.0f} rows/s)")
+
+    pd.testing.assert_frame_equal(results["legacy"], results["vectorized"])
+    print(f"   speedup: {timings['legacy'] / timings['vectorized']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Distance benchmark
+--------------------
+
+Compare the legacy row-wise spherical law of cosines of
+`SitesDataFrame.calc_distance` against the NumPy haversine, on the full
+bundled inventory and on a synthetic set of stations.
+
+    python -m benchmarks.bench_distance --synthetic 100000
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src.pyaemet.climatology import AemetClima
+from src.pyaemet.types_classes.sites import SitesDataFrame
+
+
+def legacy_calc_distance(sites, latitude, longitude, radius=6371.0):
+    """ `SitesDataFrame.calc_distance` before the haversine version """
+
+    coor1 = pd.DataFrame(np.deg2rad(sites[["latitude", "longitude"]]))
+    latitude, longitude = np.deg2rad(latitude), np.deg2rad(longitude)
+
+    new_data = sites.copy()
+    new_data["distance"] = coor1.apply(
+        lambda row: radius *
+        np.arccos(np.cos(row["latitude"] - latitude) -
+                  np.cos(row["latitude"]) * np.cos(latitude) *
+                  (1 - np.cos(row["longitude"] - longitude))
+                  ), axis=1)
+
+    return new_data
+
+
+def synthetic_sites(n_sites: int, seed: int = 0) -> SitesDataFrame:
+    """ Random stations over the Iberian Peninsula and Canary Islands """
+
+    rng = np.random.default_rng(seed)
+
+    return SitesDataFrame(data={
+        "site": [f"S{i:06d}" for i in range(n_sites)],
+        "name": "SYNTHETIC",
+        "latitude": rng.uniform(27.3, 44.0, n_sites),
+        "longitude": rng.uniform(-19.3, 4.6, n_sites),
+        }, library="pyaemet")
+
+
+def compare(label: str, sites: SitesDataFrame, repeat: int):
+    point = (43.47, -3.798)
+
+    legacy = timeit.timeit(lambda: legacy_calc_distance(sites, *point),
+                           number=repeat) / repeat
+    vectorized = timeit.timeit(lambda: sites.calc_distance(*point),
+                               number=repeat) / repeat
+
+    np.testing.assert_allclose(
+        legacy_calc_distance(sites, *point)["distance"],
+        sites.calc_distance(*point)["distance"], rtol=1e-6, atol=1e-6)
+
+    print(f"{label:>22} ({len(sites):>7} sites): "
+          f"legacy {legacy * 1e3:9.2f} ms | "
+          f"haversine {vectorized * 1e3:7.2f} ms | "
+          f"speedup {legacy / vectorized:7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    compare("bundled inventory", AemetClima._saved_sites_info(), args.repeat)
+    compare("synthetic", synthetic_sites(args.synthetic), 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Import time benchmark
+-----------------------
+
+Measure the cold start of `import pyaemet` and of a new `AemetClima`
+client in fresh interpreters, against the same start when the heavy
+dependencies (folium, geocoder, tqdm, pkg_resources and asyncio) are
+imported eagerly, as pyaemet did before they were made lazy.
+
+    python -m benchmarks.bench_import --repeat 15
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["folium", "geocoder", "tqdm", "pkg_resources", "asyncio"]
+
+SCRIPT = """
+import json, sys, time
+eager = {eager!r}
+tic = time.perf_counter()
+for module in eager:
+    __import__(module)
+import src.pyaemet as pyaemet
+imported = time.perf_counter()
+client = pyaemet.AemetClima(apikey=None)
+created = time.perf_counter()
+client.aemet_sites
+loaded = time.perf_counter()
+print(json.dumps({{
+    "import": imported - tic,
+    "client": created - imported,
+    "inventory": loaded - created,
+    "heavy": [module for module in {heavy!r} if module in sys.modules],
+    }}))
+"""
+
+
+def cold_start(eager: list, repeat: int) -> dict:
+    """ Median timings of `repeat` fresh interpreters """
+
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c",
+             SCRIPT.format(eager=eager, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    timings = {key: statistics.median(run[key] for run in runs)
+               for key in ("import", "client", "inventory")}
+    timings["heavy"] = runs[-1]["heavy"]
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    eager = cold_start(HEAVY_MODULES, args.repeat)
+    lazy = cold_start([], args.repeat)
+
+    for label, timings in [("eager", eager), ("lazy", lazy)]:
+        print(f"{label:>6}: import {timings['import'] * 1e3:7.1f} ms | "
+              f"AemetClima() {timings['client'] * 1e3:6.1f} ms | "
+              f"inventory {timings['inventory'] * 1e3:6.1f} ms | "
+              f"loaded: {', '.join(timings['heavy']) or '-'}")
+
+    print(f"cold start (import + AemetClima()) speedup: "
+          f"{(eager['import'] + eager['client']) / (lazy['import'] + lazy['client']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Mock AEMET OpenData server
+----------------------------
+
+Local stand-in of AEMET OpenData implementing its two-stage protocol:
+the API endpoint answers with the `estado` and the `datos`/`metadatos`
+URLs, which are downloaded afterwards. It serves the bundled sites'
+inventory and synthetic daily observations, or recorded payloads, with
+a configurable latency, 429 injection and payload size.
+
+    python -m benchmarks.mock_server --port 8777 --latency 0.05
+
+:author Jaimedgp
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+from pandas import isna
+
+from src.pyaemet.climatology import AemetClima
+from src.pyaemet.aemet_request import ClimaValues
+from src.pyaemet.utilities.dictionaries import (
+    SITES_TRANSLATION,
+    OBSERVATIONS_TRANSLATION,
+    )
+
+API_PATH = "/opendata/api/valores/climatologicos/"
+
+_OBSERVATIONS = re.compile(r"diarios/datos/fechaini/(\d{4}-\d\d-\d\d)T[^/]*"
+                           r"/fechafin/(\d{4}-\d\d-\d\d)T[^/]*"
+                           r"/estacion/([^/?]+)")
+
+
+def _dms(value: float, positive: str, negative: str) -> str:
+    """ Degrees into the AEMET "DDMMSS" + orientation notation """
+
+    seconds = round(abs(value) * 3600)
+    return "%02d%02d%02d%s" % (seconds // 3600, seconds % 3600 // 60,
+                               seconds % 60,
+                               positive if value >= 0 else negative)
+
+
+def _aemet_number(value: float) -> str:
+    return ("%.1f" % value).replace(".", ",")
+
+
+def _hour(rng: random.Random) -> str:
+    return rng.choice(["%02d:%02d" % (rng.randrange(24), rng.randrange(60)),
+                       "%02d" % rng.randrange(24), "Varias"])
+
+
+class MockAemetServer():
+    """
+    Threaded HTTP server answering as AEMET OpenData.
+
+    Parameters
+    ----------
+    port : int, optional
+        Port to listen on, by default a free one.
+    latency : float, optional
+        Seconds every request is delayed, by default 0.02.
+    throttle : float, optional
+        Fraction of the API requests answered with a 429, by default 0.
+    retry_after : float, optional
+        `Retry-After` seconds of the 429 answers, by default 0.
+    missing : float, optional
+        Fraction of the days without observations, by default 0.05.
+    padding : int, optional
+        Indentation of the JSON payloads, to make them bigger without
+        changing their content, by default 0 (compact JSON).
+    recorded : dict, optional
+        Payloads served instead of the synthetic ones, keyed by the
+        endpoint after the API path (e.g. the sites' inventory URL).
+    seed : int, optional
+        Seed of the synthetic observations and the 429 injection.
+    """
+
+    def __init__(
+            self,
+            port: int = 0,
+            latency: float = 0.02,
+            throttle: float = 0.0,
+            retry_after: float = 0.0,
+            missing: float = 0.05,
+            padding: int = 0,
+            recorded: Optional[dict] = None,
+            seed: int = 0,
+    ):
+
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.missing = missing
+        self.padding = padding
+        self.recorded = {} if recorded is None else recorded
+        self.seed = seed
+
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+
+        self._payloads = {}
+        self._answers = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port),
+                                           self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        """ URL of the climatological values API """
+
+        return "http://127.0.0.1:%d%s" % (self.port, API_PATH)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def connect(self, client):
+        """ Point an `AemetClima` (or `AsyncAemetClima`) to the server """
+
+        client._aemet_request.main_url = self.url
+        return client
+
+    def stats(self) -> dict:
+        """ Requests served, 429 injected and bytes sent """
+
+        return {"requests": self.requests,
+                "throttled": self.throttled,
+                "bytes_sent": self.bytes_sent}
+
+    def encode(self, payload) -> bytes:
+        """ JSON body in the ISO-8859-15 encoding AEMET uses """
+
+        return json.dumps(payload, ensure_ascii=False,
+                          indent=self.padding or None) \
+                   .encode("iso-8859-15", errors="replace")
+
+    def _store(self, payload) -> str:
+        """ Keep a `datos` payload and return its URL """
+
+        body = self.encode(payload)
+
+        with self._lock:
+            key = "d%d" % len(self._payloads)
+            self._payloads[key] = body
+
+        return "http://127.0.0.1:%d/sh/%s" % (self.port, key)
+
+    def _api(self, endpoint: str):
+        """
+        First stage answer of an API endpoint. The payloads of an
+        endpoint are only generated the first time it is requested.
+        """
+
+        with self._lock:
+            answer = self._answers.get(endpoint)
+        if answer is None:
+            answer = self._new_answer(endpoint)
+            with self._lock:
+                self._answers[endpoint] = answer
+
+        return answer
+
+    def _new_answer(self, endpoint: str):
+
+        if endpoint in self.recorded:
+            datos = self.recorded[endpoint]
+            fields = None
+        elif endpoint == ClimaValues.sites_url:
+            datos, fields = self.sites_payload(), SITES_TRANSLATION
+        else:
+            match = _OBSERVATIONS.match(endpoint)
+            if match is None:
+                return 404, {"descripcion": "No encontrado", "estado": 404}
+            datos = self.observations_payload(
+                date.fromisoformat(match[1]), date.fromisoformat(match[2]),
+                match[3].split(","))
+            fields = OBSERVATIONS_TRANSLATION
+            if not datos:
+                return 200, {"descripcion": "No hay datos que satisfagan "
+                             + "esos criterios", "estado": 404}
+
+        metadatos = {"unidad_generadora": "Mock AEMET OpenData",
+                     "periodicidad": "1 vez al día",
+                     "descripcion": "Datos sintéticos",
+                     "formato": "application/json",
+                     "copyright": "-",
+                     "notaLegal": "-",
+                     "campos": [{"id": v["id"].lower(),
+                                 "descripcion": k,
+                                 "tipo_datos": "string",
+                                 "requerido": True}
+                                for k, v in (fields or {}).items()]}
+
+        return 200, {"descripcion": "exito", "estado": 200,
+                     "datos": self._store(datos),
+                     "metadatos": self._store(metadatos)}
+
+    def sites_payload(self) -> list:
+        """ The bundled inventory as AEMET serves it """
+
+        sites = AemetClima._saved_sites_info()
+        payload = []
+        for row in sites.itertuples(index=False):
+            payload.append({
+                "latitud": _dms(row.latitude, "N", "S"),
+                "provincia": row.subregion_aemet,
+                "altitud": "%d" % row.altitude,
+                "indicativo": row.site,
+                "nombre": row.name,
+                "indsinop": "" if isna(row.synindic) else row.synindic,
+                "longitud": _dms(row.longitude, "E", "W")})
+
+        return payload
+
+    def observations_payload(self, start: date, end: date,
+                             sites: list) -> list:
+        """ Synthetic daily observations of the sites between two dates """
+
+        payload = []
+        for st in sites:
+            rng = random.Random("%s-%s-%s" % (self.seed, st, start))
+            day = start
+            while day <= end:
+                if rng.random() >= self.missing:
+                    temp = 15 + 10 * rng.random()
+                    payload.append({
+                        "fecha": day.isoformat(), "indicativo": st,
+                        "nombre": "MOCK " + st, "provincia": "MOCK",
+                        "altitud": "%d" % rng.randrange(2000),
+                        "tmed": _aemet_number(temp),
+                        "prec": rng.choice(["0,0", "Ip",
+                                            _aemet_number(20 * rng.random())]),
+                        "tmin": _aemet_number(temp - 5),
+                        "horatmin": _hour(rng),
+                        "tmax": _aemet_number(temp + 5),
+                        "horatmax": _hour(rng),
+                        "dir": "%d" % rng.randrange(37),
+                        "velmedia": _aemet_number(10 * rng.random()),
+                        "racha": _aemet_number(20 * rng.random()),
+                        "horaracha": _hour(rng),
+                        "sol": _aemet_number(12 * rng.random()),
+                        "presMax": _aemet_number(1000 + 30 * rng.random()),
+                        "horaPresMax": _hour(rng),
+                        "presMin": _aemet_number(990 + 30 * rng.random()),
+                        "horaPresMin": _hour(rng)})
+                day += timedelta(days=1)
+
+        return payload
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send(self, status: int, payload, headers: dict = None):
+                body = payload if isinstance(payload, bytes) \
+                    else server.encode(payload)
+                self.send_response(status)
+                self.send_header("Content-Type",
+                                 "application/json;charset=ISO-8859-15")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                path = self.path.split("?")[0]
+
+                if self.path == "/stats":
+                    return self.send(200, server.stats())
+
+                with server._lock:
+                    server.requests += 1
+                    throttled = (path.startswith(API_PATH)
+                                 and server._rng.random() < server.throttle)
+                    server.throttled += throttled
+
+                if throttled:
+                    return self.send(
+                        429, {"descripcion": "Límite de peticiones o caudal "
+                              + "por minuto excedido", "estado": 429},
+                        {"Retry-After": "%g" % server.retry_after})
+
+                if path.startswith(API_PATH):
+                    return self.send(*server._api(path[len(API_PATH):]))
+
+                if path.startswith("/sh/"):
+                    payload = server._payloads.get(path[4:])
+                    if payload is not None:
+                        return self.send(200, payload)
+
+                return self.send(404, {"descripcion": "No encontrado",
+                                       "estado": 404})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8777)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument("--padding", type=int, default=0)
+    parser.add_argument("--missing", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = MockAemetServer(port=args.port, latency=args.latency,
+                             throttle=args.throttle, padding=args.padding,
+                             missing=args.missing)
+    print("Serving AEMET OpenData at", server.url, flush=True)
+    server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,11 @@ __license__ = "GPL-3.0 License"
 __version__ = "1.1.0"
 
 from .climatology import AemetClima
+
+
+def __getattr__(name):
+    # asyncio is only imported by the applications that use it
+    if name == "AsyncAemetClima":
+        from .async_climatology import AsyncAemetClima
+        return AsyncAemetClima
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
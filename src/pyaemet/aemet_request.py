@@ -6,29 +6,96 @@ Python module to operate with AEMET OpenData API REST
 :author Jaimedgp
 """
 
+import time
+import threading
 from datetime import date, datetime
 
-import requests
+import numpy as np
 import pandas as pd
+from requests import HTTPError
 
 from .types_classes.sites import SitesDataFrame
 
-from .utilities.coordinates import transform_coordinates, get_site_address
+from .utilities.session import AemetSession
+from .utilities.scheduler import RateLimiter
+from .utilities.transport import Transport
+from .utilities.decoding import CHUNK_SIZE, charset, decode_columns
+from .utilities.cache import ObservationsCache, MetadataCache
+from .utilities.instrumentation import (
+    RequestTrace,
+    STATS_KEY,
+    emit_to,
+    untimed,
+    )
+from .utilities.coordinates import (
+    transform_coordinates,
+    ReverseGeocoder,
+    ADDRESS_COLUMNS,
+    )
 from .utilities.dictionaries import SITES_TRANSLATION, OBSERVATIONS_TRANSLATION
 from .utilities.curation import (
     update_fields,
-    decimal_notation,
-    convert_hours,
+    decimal_notation_columns,
+    hours_to_minutes_columns,
+    minutes_to_time_columns,
     remove_newline
     )
 
 
 
+# Hours of the day, parsed into minutes of the day
+HOUR_COLUMNS = [k for k, v in OBSERVATIONS_TRANSLATION.items()
+                if v["dtype"] == "Int16"]
+
+
 class _AemetApiRequest():
     """ Class to download data using AEMET api"""
 
-    def __init__(self, apikey):
-        """ Get the needed API key"""
+    # Fields of the `datos` of every endpoint that are never used
+    skipped_fields = {}
+
+    def __init__(
+            self,
+            apikey,
+            session: AemetSession = None,
+            scheduler: RateLimiter = None,
+            hooks: list = None,
+            transport: Transport = None,
+            metadata_cache: MetadataCache = None,
+    ):
+        """ Get the needed API key, the pooled HTTP session, the
+        scheduler pacing the requests, the hooks observing them, the
+        optional transport sending them instead of the session and the
+        cache of the `metadatos` of every endpoint"""
+
+        if session is None:
+            session = AemetSession()
+        self._session = session
+
+        if transport is None:
+            transport = session
+        else:
+            transport.bind(session)
+        self._transport = transport
+        self._paced = getattr(transport, "paced", True)
+        # The transports archiving or replaying the `metadatos`
+        self._known_metadatos = getattr(transport, "metadatos",
+                                        lambda endpoint: None)
+        self._record_metadatos = getattr(transport, "record_metadatos",
+                                         lambda endpoint, metadatos: None)
+
+        if metadata_cache is None:
+            metadata_cache = MetadataCache()
+        self._metadata_cache = metadata_cache
+        self._metadatos_locks = {}
+        self._lock = threading.Lock()
+
+        if scheduler is None:
+            scheduler = RateLimiter()
+        self._scheduler = scheduler
+
+        self._hooks = list(hooks or [])
+        self._emit = emit_to(self._hooks)
 
         self.main_url = "https://opendata.aemet.es/opendata/api/"
         self._params = {"api_key": apikey}
@@ -37,131 +104,551 @@ class _AemetApiRequest():
                          "Content-Type": "application/json",
                          }
 
-    def _aemet_request(self, url):
+    def add_hook(self, hook):
+        """ Send the events of every request and parsing step to `hook` """
+
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def _trace(self, endpoint: str) -> RequestTrace:
+        """ New trace of a call to an endpoint, sent to the hooks """
+
+        return RequestTrace(endpoint, self._emit)
+
+    def _get(self, url, check_estado: bool = False,
+             trace: RequestTrace = None, stage: str = "api", read=None,
+             **kwargs):
+        """
+        Send a GET request once the scheduler allows it and retry it,
+        with backoff, while AEMET answers `429 Too Many Requests`.
+
+        :param check_estado: also look for the 429 in the `estado` field
+            of the JSON body, as the first stage answers it with a 200.
+        :param trace: trace where the request is recorded
+        :param stage: stage of the request recorded in the trace
+        :param read: function reading the body of a streamed response,
+            which returns its result and the number of bytes read
+        :raises HTTPError: if the request is still rate limited after
+            the maximum number of retries.
+        """
+
+        if trace is None:
+            trace = self._trace(url)
+
+        latency = 0.0
+        response = None
+        attempt = 0
+        size = None
+        try:
+            for attempt in range(self._scheduler.max_retries + 1):
+                if self._paced:
+                    self._scheduler.acquire()
+                tic = time.perf_counter()
+                response = self._transport.get(url, **kwargs)
+                latency += time.perf_counter() - tic
+
+                if not self._is_rate_limited(response, check_estado):
+                    self._scheduler.success()
+                    if read is None:
+                        return response
+                    # Not read again if the streamed body fails
+                    size = 0
+                    value, size = read(response)
+                    return value
+
+                if attempt < self._scheduler.max_retries:
+                    time.sleep(self._scheduler.throttle(
+                        attempt, RateLimiter.retry_after(response)))
+        finally:
+            trace.record("request", stage, latency,
+                         status=None if response is None
+                         else response.status_code,
+                         retries=attempt,
+                         bytes=0 if response is None
+                         else len(response.content) if size is None
+                         else size)
+
+        raise HTTPError("AEMET rate limit still exceeded after "
+                        + "%d retries: %s" % (self._scheduler.max_retries,
+                                              response.text),
+                        response=response)
+
+    @staticmethod
+    def _is_rate_limited(response, check_estado: bool = False) -> bool:
+        """ Check if AEMET rejected the request by its rate limit """
+
+        if response.status_code == 429:
+            return True
+
+        if check_estado and response.ok and response.text != "":
+            try:
+                return response.json().get("estado") == 429
+            except (ValueError, AttributeError):
+                return False
+
+        return False
+
+    def _first_stage(self, url, trace: RequestTrace = None):
         """
+        Request the API endpoint, which answers with the `datos` and
+        `metadatos` URLs to download.
+
+        Possible errores:
+        -----------------
+
+        429:
+        404:
+        401:
+
+        :returns: `[response, None]` when the `datos` and `metadatos` are
+            available or `[None, error]` with the error information.
         """
 
-        response = requests.request("GET",
-                                    self.main_url+url,
-                                    headers=self._headers,
-                                    params=self._params
-                                    )
+        response = self._get(self.main_url+url,
+                             check_estado=True,
+                             trace=trace,
+                             stage="api",
+                             headers=self._headers,
+                             params=self._params
+                             )
 
         if response.ok:
-            """
-            Possible errores:
-            -----------------
-
-            429:
-            404:
-            401:
-            """
             if response.text == "":
-                return [{},
+                return [None,
                         {"status":
                             "Nothing returned. Please check the API key"}
                        ]
             elif response.json()["estado"] == 200:
-                data_url = response.json()["datos"]
-                metadata_url = response.json()["metadatos"]
+                return [response.json(), None]
+
+        return [None, response.json()]
+
+    def _second_stage(self, url, trace: RequestTrace = None,
+                      stage: str = "datos"):
+        """
+        Download the `datos` or `metadatos` of a first stage.
+
+        The `datos` are streamed and decoded while they are downloaded
+        into one list per field (see `decode_columns`), without the
+        `skipped_fields` of the endpoint.
+        """
+
+        if trace is None:
+            trace = self._trace(url)
 
-                return [requests.request("GET",
-                                         data_url, headers=self._headers) \
-                                .json(),
-                        requests.request("GET",
-                                         metadata_url,
-                                         headers=self._headers) \
-                                .json()
-                        ]
+        if stage != "datos":
+            response = self._get(url, trace=trace, stage=stage,
+                                 headers=self._headers)
+            with trace.step("json_" + stage):
+                return response.json()
 
-        return [ {}, response.json() ]
+        skip = self.skipped_fields.get(trace.endpoint, ())
+
+        def read(response):
+            size = 0
+
+            def chunks():
+                nonlocal size
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    yield chunk
+
+            with trace.step("json_" + stage):
+                data = decode_columns(
+                    chunks(), charset(response.headers.get("Content-Type")),
+                    skip=skip)
+
+            return data, size
+
+        return self._get(url, trace=trace, stage=stage, read=read,
+                         stream=True, headers=self._headers)
+
+    def _metadatos(self, url, trace: RequestTrace):
+        """
+        `metadatos` of the endpoint of the trace, only downloaded when it
+        is neither in the metadata cache nor archived by the transport.
+        Every document used is given to the transport, so a recording
+        keeps it by its endpoint whichever chunk downloaded it.
+        """
+
+        with self._lock:
+            lock = self._metadatos_locks.setdefault(trace.endpoint,
+                                                    threading.Lock())
+
+        # The chunks requested at the same time wait for the first one
+        with lock:
+            tic = time.perf_counter()
+            metadatos = self._metadata_cache.get(trace.endpoint)
+
+            if metadatos is None:
+                # e.g. replayed from an archive
+                metadatos = self._known_metadatos(trace.endpoint)
+                if metadatos is not None:
+                    self._metadata_cache.store(trace.endpoint, metadatos)
+
+            if metadatos is not None:
+                trace.record("cache", "metadatos",
+                             time.perf_counter() - tic)
+                self._record_metadatos(trace.endpoint, metadatos)
+                return metadatos
+
+            metadatos = self._second_stage(url, trace=trace,
+                                           stage="metadatos")
+
+            # Errors are not cached
+            if isinstance(metadatos, dict) and "campos" in metadatos:
+                self._metadata_cache.store(trace.endpoint, metadatos)
+                self._record_metadatos(trace.endpoint, metadatos)
+
+        return metadatos
+
+    def _aemet_request(self, url, trace: RequestTrace = None):
+        """
+        Download the `datos` and `metadatos` of an API endpoint.
+
+        :param trace: trace where the requests are recorded
+        :returns: `[datos, metadatos]` or `[{}, error]`
+        """
+
+        if trace is None:
+            trace = self._trace(url)
+
+        response, error = self._first_stage(url, trace=trace)
+
+        if response is None:
+            return [{}, error]
+
+        return [self._second_stage(response["datos"], trace=trace),
+                self._metadatos(response["metadatos"], trace)
+                ]
 
 
 class ClimaValues(_AemetApiRequest):
     """ Class to download climatological data using AEMET api"""
 
-    def __init__(self, apikey):
-        """ Get the needed API key"""
+    sites_url = "inventarioestaciones/todasestaciones/"
+    observations_endpoint = "diarios/datos/"
 
-        super().__init__(apikey)
+    skipped_fields = {observations_endpoint: ("nombre", "provincia")}
+
+    def __init__(
+            self,
+            apikey,
+            session: AemetSession = None,
+            scheduler: RateLimiter = None,
+            cache: ObservationsCache = None,
+            reverse_geocoder: ReverseGeocoder = None,
+            hooks: list = None,
+            transport: Transport = None,
+            metadata_cache: MetadataCache = None,
+    ):
+        """ Get the needed API key, the optional observations cache and
+        the reverse geocoder of the sites' addresses"""
+
+        super().__init__(apikey, session=session, scheduler=scheduler,
+                         hooks=hooks, transport=transport,
+                         metadata_cache=metadata_cache)
         self.main_url += "valores/climatologicos/"
+        self._cache = cache
+
+        if reverse_geocoder is None:
+            reverse_geocoder = ReverseGeocoder()
+        self._reverse_geocoder = reverse_geocoder
 
     def get_sites_info(self, old_dataframe: SitesDataFrame):
         """
         """
 
-        data, metadata = self._aemet_request(url=("inventarioestaciones/" +
-                                                  "todasestaciones/"))
+        trace = self._trace(self.sites_url)
+        data, metadata = self._aemet_request(url=self.sites_url, trace=trace)
 
-        if not bool(data):
-            return pd.DataFrame(columns=SITES_TRANSLATION.keys()), metadata
+        data, metadata = self.parse_sites_info(data, metadata, old_dataframe,
+                                               self._reverse_geocoder,
+                                               step=trace.step)
+        metadata[STATS_KEY] = trace.events
 
-        data = pd.DataFrame(data) \
-                 .rename(columns={v["id"]: k
-                                  for k, v in SITES_TRANSLATION.items()}) \
-                 .apply(transform_coordinates) \
-                 .astype({k: v["dtype"]
-                          for k, v in SITES_TRANSLATION.items()
-                          if k in data})
+        return data, metadata
 
-        if (not all(data.columns.isin(old_dataframe.columns)) or
-                (not data.equals(old_dataframe.loc[:, data.columns]))):
+    @staticmethod
+    def parse_sites_info(
+            data,
+            metadata,
+            old_dataframe: SitesDataFrame,
+            reverse_geocoder: ReverseGeocoder = None,
+            step=untimed,
+    ):
+        """
+        Build the sites' inventory from the `datos` and `metadatos`
+        downloaded from AEMET.
 
-            data = data.merge(data.apply(get_site_address, axis=1,
-                                         result_type="expand")
-                                  .drop_duplicates(),
-                              on=["latitude", "longitude"],
-                              how='left'
-                              ).drop_duplicates()
+        :param step: timer of the parsing steps, see `RequestTrace.step`
+        """
 
-        else:
-            old_dataframe.metadata.update({"access_date":
-                                           datetime.now().isoformat()})
-            return old_dataframe
+        if not bool(data):
+            return pd.DataFrame(columns=SITES_TRANSLATION.keys()), metadata
+
+        with step("frame"):
+            data = pd.DataFrame(data) \
+                     .rename(columns={v["id"]: k
+                                      for k, v in SITES_TRANSLATION.items()})
+        with step("coordinates"):
+            data = data.apply(transform_coordinates)
+        with step("astype"):
+            data = data.astype({k: v["dtype"]
+                                for k, v in SITES_TRANSLATION.items()
+                                if k in data})
+
+        # Unless an address is missing, nothing to geocode again
+        if (all(data.columns.isin(old_dataframe.columns)) and
+                data.equals(old_dataframe.loc[:, data.columns]) and
+                not old_dataframe.reindex(columns=ADDRESS_COLUMNS)
+                                 .isna().all(axis=1).any()):
+            old_dataframe.metadata.update({
+                "access_date": datetime.now().isoformat(),
+                "geocoding": {"lookups": 0, "avoided": len(old_dataframe)}
+                })
+            return old_dataframe, old_dataframe.metadata
+
+        if reverse_geocoder is None:
+            reverse_geocoder = ReverseGeocoder()
+
+        with step("geocoding"):
+            data, geocoding = ClimaValues._sites_address(data, old_dataframe,
+                                                         reverse_geocoder)
 
         metadata = {k+"_aemet": v for k, v in metadata.items()}
         metadata["access_date"] = datetime.now().isoformat()
         metadata["fields"] = update_fields(data.columns,
                                            metadata.pop("campos_aemet"),
                                            SITES_TRANSLATION)
+        metadata["geocoding"] = geocoding
 
         return remove_newline(data), metadata
 
-    def get_observations(
-            self,
+    @staticmethod
+    def _sites_address(
+            data,
+            old_dataframe: SitesDataFrame,
+            reverse_geocoder: ReverseGeocoder,
+    ):
+        """
+        Add the district, city, subregion and region of every site.
+
+        The address of the sites already in `old_dataframe` with the same
+        coordinates is reused and only the new or moved sites, or those
+        without any address stored, are geocoded.
+
+        :returns: the sites with their address and the number of
+            geocoding `lookups` done and `avoided`
+        """
+
+        keys = ["site", "latitude", "longitude"]
+
+        if all(col in old_dataframe.columns for col in keys + ADDRESS_COLUMNS):
+            old = old_dataframe.loc[:, keys + ADDRESS_COLUMNS] \
+                               .drop_duplicates(subset="site") \
+                               .rename(columns={"latitude": "old_latitude",
+                                                "longitude": "old_longitude"})
+            data = data.merge(old, on="site", how="left")
+            unchanged = (np.isclose(data["latitude"], data["old_latitude"])
+                         & np.isclose(data["longitude"],
+                                      data["old_longitude"]))
+            data = data.drop(columns=["old_latitude", "old_longitude"])
+        else:
+            data = data.assign(**{col: pd.NA for col in ADDRESS_COLUMNS})
+            unchanged = np.zeros(len(data), dtype=bool)
+
+        # A failed lookup left the address empty, so it is looked up again
+        pending = np.asarray(~unchanged
+                             | data[ADDRESS_COLUMNS].isna().all(axis=1))
+        coordinates = data.loc[pending, ["latitude", "longitude"]] \
+                          .drop_duplicates()
+        requests_before = reverse_geocoder.requests
+
+        if not coordinates.empty:
+            addresses = reverse_geocoder.addresses(coordinates,
+                                                   lookup=old_dataframe)
+            moved = data.loc[pending, ["latitude", "longitude"]] \
+                        .merge(addresses, on=["latitude", "longitude"],
+                               how="left")
+            data.loc[pending, ADDRESS_COLUMNS] = \
+                moved[ADDRESS_COLUMNS].values
+
+        lookups = reverse_geocoder.requests - requests_before
+
+        data = data.astype({k: SITES_TRANSLATION[k]["dtype"]
+                            for k in ADDRESS_COLUMNS})
+
+        return data, {"lookups": lookups,
+                      "avoided": len(data) - lookups}
+
+    @staticmethod
+    def observations_url(
             fechaIniStr: date,
             fechaFinStr: date,
             idema: str
     ):
-        """ Docstring """
+        """ Build the daily observations endpoint of a chunk """
 
         params = {"fechaIniStr": fechaIniStr.strftime("%Y-%m-%dT%H:%M:%SUTC"),
                   "fechaFinStr": fechaFinStr.strftime("%Y-%m-%dT%H:%M:%SUTC"),
                   "idema": idema
                   }
 
-        data, metadata = self._aemet_request(url=("diarios/datos/fechaini/" +
-                                                  "{fechaIniStr}/fechafin/" +
-                                                  "{fechaFinStr}/estacion/" +
-                                                  "{idema}"
-                                                  ).format(**params))
+        return (ClimaValues.observations_endpoint + "fechaini/" +
+                "{fechaIniStr}/fechafin/" +
+                "{fechaFinStr}/estacion/" +
+                "{idema}"
+                ).format(**params)
 
-        if not bool(data):
+    def get_observations(
+            self,
+            fechaIniStr: date,
+            fechaFinStr: date,
+            idema: str,
+            hours_as_time: bool = False,
+    ):
+        """
+        Download the daily observations of the sites `idema` between two
+        dates.
+
+        The hours (`hr_*` columns) are given in minutes of the day, -1
+        meaning several hours ("Varias"). With `hours_as_time` they are
+        converted into the legacy `datetime.time` objects.
+        """
+
+        trace = self._trace(self.observations_endpoint)
+
+        if self._cache is not None:
+            data, metadata = self._cached_observations(fechaIniStr,
+                                                       fechaFinStr,
+                                                       idema,
+                                                       trace=trace)
+        else:
+            data, metadata = self.parse_observations(
+                *self._aemet_request(url=self.observations_url(fechaIniStr,
+                                                               fechaFinStr,
+                                                               idema),
+                                     trace=trace),
+                step=trace.step)
+
+        if hours_as_time:
+            with trace.step("hours_as_time"):
+                data = minutes_to_time_columns(data, HOUR_COLUMNS)
+
+        # A copy, the metadata of the cache is shared by every call
+        metadata = dict(metadata)
+        metadata[STATS_KEY] = trace.events
+
+        return data, metadata
+
+    def _cached_observations(
+            self,
+            fechaIniStr: date,
+            fechaFinStr: date,
+            idema: str,
+            trace: RequestTrace = None,
+    ):
+        """
+        Download only the days of each site missing in the cache, store
+        them and return them merged with the cached observations.
+        """
+
+        if trace is None:
+            trace = self._trace(self.observations_endpoint)
+        step = trace.step
+
+        sites = idema.split(",")
+
+        # Sites missing the same days are requested together
+        missing = {}
+        for st in sites:
+            ranges = tuple(self._cache.missing_ranges(st, fechaIniStr,
+                                                      fechaFinStr))
+            missing.setdefault(ranges, []).append(st)
+
+        metadata = self._cache.metadata
+        errors = {}
+        for ranges, group in missing.items():
+            for start, end in ranges:
+                data, meta = self.parse_observations(
+                    *self._aemet_request(
+                        url=self.observations_url(start, end,
+                                                  ",".join(group)),
+                        trace=trace),
+                    step=step)
+
+                # 404: AEMET has no data for those days, which is also
+                # worth remembering. Any other error is not cached and
+                # only reported by this call.
+                if "fields" not in meta and meta.get("estado") != 404:
+                    errors.update(meta)
+                    continue
+
+                with step("cache_store"):
+                    for st in group:
+                        self._cache.store(st, data[data["site"] == st],
+                                          start, end)
+
+                if "fields" in meta:
+                    metadata.update(meta)
+                    self._cache.metadata = metadata
+
+        metadata = dict(metadata, **errors)
+        if "access_date" in metadata:
+            # Served now, even if every day was taken from the cache
+            metadata["access_date"] = datetime.now().isoformat()
+
+        with step("cache_load"):
+            frames = [self._cache.load(st, fechaIniStr, fechaFinStr)
+                      for st in sites]
+        frames = [frame for frame in frames
+                  if frame is not None and not frame.empty]
+
+        if not frames:
             return (pd.DataFrame(columns=OBSERVATIONS_TRANSLATION.keys()),
                     metadata)
 
-        data = pd.DataFrame(data) \
-                 .drop(["nombre", "provincia"], axis=1) \
-                 .rename(columns={v["id"]: k
-                                  for k, v in OBSERVATIONS_TRANSLATION.items()
-                                  }) \
-                 .replace({"Ip": "0,05", "Varias": "-1", "Acum": None}) \
-                 .apply(decimal_notation, axis=1)
+        return pd.concat(frames), metadata
 
-        data = data.astype({k: v["dtype"]
-                            for k, v in OBSERVATIONS_TRANSLATION.items()
-                            if k in data.columns}) \
-                   .apply(convert_hours)
+    @staticmethod
+    def parse_observations(data, metadata, step=untimed):
+        """
+        Build the daily observations from the `datos` and `metadatos`
+        downloaded from AEMET.
+
+        :param step: timer of the parsing steps, see `RequestTrace.step`
+        """
+
+        if not bool(data):
+            return (pd.DataFrame(columns=OBSERVATIONS_TRANSLATION.keys()),
+                    metadata)
+
+        with step("frame"):
+            data = pd.DataFrame(data) \
+                     .drop(columns=["nombre", "provincia"],
+                           errors="ignore") \
+                     .rename(columns={v["id"]: k
+                                      for k, v in
+                                      OBSERVATIONS_TRANSLATION.items()})
+        with step("replace"):
+            data = data.replace({"Ip": "0,05", "Varias": "-1", "Acum": None})
+
+        with step("decimal_notation"):
+            data = decimal_notation_columns(
+                data,
+                numeric=[k for k, v in OBSERVATIONS_TRANSLATION.items()
+                         if v["dtype"] == "float64"])
+
+        with step("hours"):
+            data = hours_to_minutes_columns(data, HOUR_COLUMNS)
+
+        with step("astype"):
+            data = data.astype({k: v["dtype"]
+                                for k, v in OBSERVATIONS_TRANSLATION.items()
+                                if k in data.columns})
 
         metadata = {k+"_aemet": v for k, v in metadata.items()}
         metadata["access_date"] = datetime.now().isoformat()
@@ -169,4 +656,5 @@ class ClimaValues(_AemetApiRequest):
                                            metadata.pop("campos_aemet"),
                                            OBSERVATIONS_TRANSLATION)
 
-        return remove_newline(data), metadata
+        with step("remove_newline"):
+            return remove_newline(data), metadata
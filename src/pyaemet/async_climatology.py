@@ -0,0 +1,428 @@
+"""
+This is the AsyncAemetClima class, the asyncio counterpart of
+`AemetClima`. It requests the same information about the climatic
+stations and the same meteorological observations, but every request is
+awaited instead of blocking the event loop and the two stages of many
+chunks (API call and `datos`/`metadatos` downloads) run concurrently.
+"""
+
+import os
+import asyncio
+from collections import deque
+from datetime import date, datetime
+from itertools import islice
+from typing import Optional, Union
+
+from pandas import Series, DataFrame, concat
+
+from .types_classes.sites import SitesDataFrame, NearSitesDataFrame
+from .types_classes.observations import ObservationsDataFrame
+from .climatology import (
+    AemetClima,
+    CURATION_ERRORS,
+    _Availability,
+    _SiteParts,
+    )
+from .aemet_request import ClimaValues, HOUR_COLUMNS
+from .utilities.curation import minutes_to_time_columns
+from .utilities.scheduler import RateLimiter
+from .utilities.planner import ChunkPlanner, OVERSIZE_ERRORS
+from .utilities.instrumentation import STATS_KEY, merge_metadata
+from .utilities.transport import Transport
+from .utilities.cache import ObservationsCache, MetadataCache
+
+
+class AsyncAemetClima():
+    """
+    The `AsyncAemetClima` class is used to interface with AEMET's
+    Climatic Station Web Service API from asyncio applications. The
+    blocking HTTP calls run in worker threads and, at most,
+    `max_in_flight` of them are sent to AEMET at the same time.
+    """
+
+    def __init__(
+        self,
+        apikey,
+        max_in_flight: int = 8,
+        timeout: tuple = (10.0, 60.0),
+        gzip: bool = True,
+        scheduler: Optional[RateLimiter] = None,
+        hooks: Optional[list] = None,
+        transport: Optional[Transport] = None,
+        metadata_cache: Optional[MetadataCache] = None,
+        cache: Optional[ObservationsCache] = None,
+        planner: Optional[ChunkPlanner] = None,
+    ):
+        """
+        Initialize the `AsyncAemetClima` class with a valid API Key.
+
+        Parameters
+        ----------
+        apikey : str
+            The API Key obtained from AEMET's web services.
+        max_in_flight : int, optional
+            Maximum number of requests sent to AEMET at the same time,
+            by default 8. It is also the size of the connection pool.
+        timeout : tuple, optional
+            Connect and read timeouts, in seconds, of every request, by
+            default (10.0, 60.0).
+        gzip : bool, optional
+            Negotiate compressed responses with AEMET, by default True.
+        scheduler : RateLimiter, optional
+            Token bucket pacing every request sent to AEMET and retrying
+            the ones rejected by its rate limit (HTTP 429), by default
+            the same `RateLimiter(rate=1.0, burst=5)` as `AemetClima`.
+        hooks : list, optional
+            Callables receiving an event (dict) for every HTTP request
+            and parsing step, as in `AemetClima`.
+        transport : Transport, optional
+            Send the requests in place of the pooled session, e.g. to
+            record or replay them, as in `AemetClima`.
+        metadata_cache : MetadataCache, optional
+            Cache of the `metadatos` document of every endpoint, as in
+            `AemetClima`.
+        cache : ObservationsCache, optional
+            On-disk cache of the daily observations, as in `AemetClima`.
+            Only the days of each site not already cached are downloaded.
+        planner : ChunkPlanner, optional
+            Size of the chunks the downloads are split in, as in
+            `AemetClima`.
+        """
+
+        self._clima = AemetClima(apikey=apikey,
+                                 pool_size=max_in_flight,
+                                 timeout=timeout,
+                                 gzip=gzip,
+                                 scheduler=scheduler,
+                                 hooks=hooks,
+                                 transport=transport,
+                                 metadata_cache=metadata_cache,
+                                 cache=cache,
+                                 planner=planner)
+        self._aemet_request = self._clima._aemet_request
+
+        self.max_in_flight = max_in_flight
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def aemet_sites(self):
+        return self._clima.aemet_sites
+
+    def connection_stats(self) -> dict:
+        """
+        Report how many requests reused an already open connection.
+        """
+
+        return self._clima.connection_stats()
+
+    @property
+    def stats(self):
+        return self._clima.stats
+
+    def request_stats(self):
+        """
+        Report where the time of the requests goes, as
+        `AemetClima.request_stats`.
+        """
+
+        return self._clima.request_stats()
+
+    def _in_flight(self) -> asyncio.Semaphore:
+        """ Semaphore bounding the requests of the running event loop """
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._loop = loop
+
+        return self._semaphore
+
+    async def _call(self, func, *args):
+        """ Run a blocking HTTP call once there is room in flight """
+
+        async with self._in_flight():
+            return await asyncio.to_thread(func, *args)
+
+    async def _request(self, url, trace=None):
+        """
+        Asynchronous version of `_AemetApiRequest._aemet_request`. The
+        `datos` and `metadatos` of the chunk are downloaded at the same
+        time.
+        """
+
+        if trace is None:
+            trace = self._aemet_request._trace(url)
+
+        response, error = await self._call(self._aemet_request._first_stage,
+                                           url, trace)
+
+        if response is None:
+            return [{}, error]
+
+        return list(await asyncio.gather(
+            self._call(self._aemet_request._second_stage, response["datos"],
+                       trace, "datos"),
+            self._call(self._aemet_request._metadatos,
+                       response["metadatos"], trace)
+            ))
+
+    async def sites_info(self, update: bool = True) -> SitesDataFrame:
+        """
+        Get the information about the AEMET climatic stations.
+
+        Parameters
+        ----------
+        update : bool, optional
+            If `True`, the information about the AEMET climatic stations
+            is updated from the AEMET Web Services.
+
+        Returns
+        -------
+        SitesDataFrame
+            The dataframe containing the information of the AEMET
+            climatic stations.
+        """
+
+        if self.aemet_sites.empty or update:
+            trace = self._aemet_request._trace(ClimaValues.sites_url)
+            data, metadata = await self._request(ClimaValues.sites_url,
+                                                 trace)
+            new_sites, new_metadata = await asyncio.to_thread(
+                ClimaValues.parse_sites_info, data, metadata,
+                self.aemet_sites, self._aemet_request._reverse_geocoder,
+                trace.step)
+            new_metadata[STATS_KEY] = trace.events
+            self._clima.aemet_sites = SitesDataFrame(data=new_sites,
+                                                     library="pyaemet",
+                                                     metadata=new_metadata)
+
+        return self.aemet_sites.copy()
+
+    async def daily_clima(
+        self,
+        site,
+        start_dt: Union[date, datetime],
+        end_dt: Union[date, datetime] = date.today(),
+        hours_as_time: bool = False,
+    ) -> ObservationsDataFrame:
+        """
+        Download the daily observations of one or several sites. Every
+        (date interval, sites batch) chunk is requested concurrently.
+
+        Parameters
+        ----------
+        site : str, list, DataFrame
+            Site code or list of site codes to download.
+        start_dt : date
+            First day of the observations.
+        end_dt : date, optional
+            Last day of the observations, by default `date.today()`.
+        hours_as_time : bool, optional
+            Give the hours (`hr_*` columns) as `datetime.time` objects
+            instead of minutes of the day, by default False.
+
+        Returns
+        -------
+        ObservationsDataFrame
+            The observations of every chunk, in the same order as
+            `AemetClima.daily_clima` returns them.
+        """
+
+        results = await asyncio.gather(
+            *(self._chunk(part, hours_as_time=hours_as_time)
+              for part in self._clima._daily_chunks(site, start_dt, end_dt)))
+
+        metadata = {}
+        for _, meta in results:
+            merge_metadata(metadata, meta)
+
+        return ObservationsDataFrame(data=concat([dt for dt, _ in results]),
+                                     library="pyaemet",
+                                     metadata=metadata)
+
+    async def _observations(self, start, end, sites, trace,
+                            hours_as_time: bool = False):
+        """
+        Download and parse the observations of a chunk. With a cache of
+        the observations, only the days missing in it are requested.
+        """
+
+        if self._aemet_request._cache is not None:
+            return await self._call(self._aemet_request.get_observations,
+                                    start, end, ",".join(sites),
+                                    hours_as_time)
+
+        data, meta = await self._request(
+            ClimaValues.observations_url(start, end, ",".join(sites)), trace)
+        data, meta = await asyncio.to_thread(
+            ClimaValues.parse_observations, data, meta, trace.step)
+        if hours_as_time:
+            with trace.step("hours_as_time"):
+                data = minutes_to_time_columns(data, HOUR_COLUMNS)
+
+        meta = dict(meta)
+        meta[STATS_KEY] = trace.events
+
+        return data, meta
+
+    async def _chunk(self, part, hours_as_time: bool = False):
+        """
+        Asynchronous version of `AemetClima._get_chunk`. If the chunk is
+        too big to be served, its halves are requested concurrently.
+        """
+
+        planner = self._clima._planner
+        endpoint = ClimaValues.observations_endpoint
+
+        (start, end), st = part
+        trace = self._aemet_request._trace(endpoint)
+        events = trace.events
+        try:
+            data, meta = await self._observations(start, end, st, trace,
+                                                  hours_as_time)
+        except OVERSIZE_ERRORS:
+            smaller = planner.split(part)
+            if not smaller:
+                raise
+        else:
+            if not planner.is_oversize(meta):
+                planner.success(endpoint, part)
+                return data, meta
+            smaller = planner.split(part)
+            if not smaller:
+                # Nothing smaller can be requested, keep the error
+                return data, meta
+            events = meta[STATS_KEY]
+
+        # Too big to be served, only its halves are requested again
+        planner.failure(endpoint, part)
+        parts = await asyncio.gather(
+            *(self._chunk(sub, hours_as_time=hours_as_time)
+              for sub in smaller))
+        meta = {STATS_KEY: list(events)}
+        for _, sub_meta in parts:
+            merge_metadata(meta, sub_meta)
+
+        return concat([dt for dt, _ in parts]), meta
+
+    async def sites_curation(
+        self,
+        start_dt: Union[date, datetime],
+        sites: Union[
+            str, list, Series, DataFrame, SitesDataFrame, NearSitesDataFrame
+        ],
+        end_dt: Union[date, datetime] = date.today(),
+        threshold: float = 0.75,
+        variables: Union[str, list] = 'all',
+        save_folder: Optional[Union[str, os.PathLike]] = None,
+        speculative: int = 4,
+    ) -> Union[SitesDataFrame, NearSitesDataFrame, DataFrame]:
+        """
+        Asynchronous version of `AemetClima.sites_curation`. The
+        observations of every batch of 25 sites are downloaded
+        concurrently and counted as they arrive. Given a
+        `NearSitesDataFrame`, the sites are evaluated from the nearest,
+        downloading the next `speculative` ones at the same time.
+        """
+
+        _sites, for_nearest = self._clima._curation_sites(sites)
+
+        _sites["has_enough"] = False
+        _sites["amount"] = float("nan")
+
+        if for_nearest:
+            return await self._nearest_curation(_sites,
+                                                start_dt=start_dt,
+                                                end_dt=end_dt,
+                                                threshold=threshold,
+                                                variables=variables,
+                                                save_folder=save_folder,
+                                                speculative=speculative)
+
+        availability = _Availability(start_dt, end_dt,
+                                     threshold=threshold,
+                                     columns=variables)
+
+        async def chunk(order, part):
+            try:
+                data, _ = await self._chunk(part)
+            except CURATION_ERRORS:
+                # The batch is skipped, as in `AemetClima.sites_curation`
+                data = DataFrame()
+            return order, data
+
+        with _SiteParts(save_folder) as parts:
+            # One request per interval and batch of 25 sites, counted and
+            # dropped as they arrive
+            chunks = self._clima._daily_chunks(list(_sites.site),
+                                               start_dt, end_dt)
+            for done in asyncio.as_completed([chunk(i, part) for i, part
+                                              in enumerate(chunks)]):
+                order, data = await done
+                availability.add(data)
+                parts.add(data, order=order)
+
+            availability = availability.result()
+            parts.save(availability.index[availability["has_enough"]])
+
+        evaluated = _sites["site"].isin(availability.index)
+        _sites.loc[evaluated, "has_enough"] = _sites.loc[evaluated, "site"] \
+            .map(availability["has_enough"]).astype(bool)
+        _sites.loc[evaluated, "amount"] = _sites.loc[evaluated, "site"] \
+            .map(availability["amount"])
+
+        return _sites
+
+    async def _nearest_curation(self, _sites, start_dt, end_dt, threshold,
+                                variables, save_folder, speculative):
+        """
+        Asynchronous version of `AemetClima._nearest_curation`: the
+        sites are evaluated from the nearest to the farthest while the
+        data of the next `speculative` ones is downloaded, and the
+        downloads still pending are cancelled once the site is found.
+        """
+
+        def get_site(st):
+            return asyncio.ensure_future(self.daily_clima(site=st,
+                                                          start_dt=start_dt,
+                                                          end_dt=end_dt))
+
+        candidates = iter(_sites.site)
+        pending = deque((st, get_site(st))
+                        for st in islice(candidates, max(1, speculative)))
+
+        try:
+            while pending:
+                # The nearest site not evaluated yet decides first
+                st, task = pending.popleft()
+                data = await task
+
+                pending.extend((nxt, get_site(nxt))
+                               for nxt in islice(candidates, 1))
+
+                if data.empty:
+                    continue
+
+                is_enough, amount = AemetClima._have_enough(
+                    data,
+                    start_date=start_dt,
+                    end_date=end_dt,
+                    threshold=threshold,
+                    columns=variables)
+
+                _sites.loc[_sites["site"] == st, "has_enough"] = is_enough
+                _sites.loc[_sites["site"] == st, "amount"] = amount
+
+                if is_enough:
+                    if save_folder is not None:
+                        data.to_csv(os.path.join(save_folder, st+".csv"))
+                    return _sites.loc[_sites["site"] == st]
+        finally:
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending),
+                                 return_exceptions=True)
+
+        # None of the sites has enough data
+        return _sites
@@ -6,24 +6,182 @@ climatic stations and to download meteorological observations data.
 
 import os
 import logging
+import tempfile
 from datetime import date, datetime
-from typing import Optional, Union
-from dateutil.relativedelta import relativedelta
-from pkg_resources import resource_stream
-from itertools import product
+from typing import Iterator, Optional, Union
+from importlib.resources import files, as_file
+from collections import deque
+from itertools import islice
+from concurrent.futures import (
+    Executor,
+    ThreadPoolExecutor,
+    FIRST_COMPLETED,
+    wait,
+    )
 
-from tqdm import tqdm
 import numpy as np
-from pandas import Series, DataFrame, concat
+from pandas import Series, DataFrame, concat, read_csv
+from requests import RequestException
 
 from .types_classes.sites import SitesDataFrame, NearSitesDataFrame
 from .types_classes.observations import ObservationsDataFrame
 from .aemet_request import ClimaValues
+from .utilities.session import AemetSession
+from .utilities.scheduler import RateLimiter
+from .utilities.cache import ObservationsCache, MetadataCache
+from .utilities.planner import ChunkPlanner, OVERSIZE_ERRORS
+from .utilities.coordinates import ReverseGeocoder
+from .utilities.transport import Transport
+from .utilities.instrumentation import (
+    RequestStats,
+    STATS_KEY,
+    merge_metadata,
+    )
 from .utilities.dictionaries import V1_TRANSLATION
 
 
 logger = logging.getLogger()
 
+# Errors of a chunk skipped by the curation of the sites
+CURATION_ERRORS = (RequestException, ValueError)
+
+
+def _progress_bar(total: int, disable: bool = False):
+    """ tqdm progress bar, only imported when it is shown """
+
+    if disable:
+        return _NoProgressBar()
+
+    from tqdm import tqdm
+
+    return tqdm(total=total)
+
+
+class _NoProgressBar():
+    """ Hidden progress bar """
+
+    def update(self, n: int = 1):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Availability():
+    """
+    Amount of available data of every site, counted chunk by chunk so
+    the observations of all the sites are never kept together.
+
+    :param start_date: first day of the curation period
+    :param end_date: last day of the curation period
+    :param threshold: minimum proportion of data of a site with enough
+    :param columns: columns evaluated, 'all' for every column
+    """
+
+    def __init__(self, start_date, end_date, threshold=0.75,
+                 columns: Union[str, list] = 'all'):
+        if isinstance(columns, str):
+            columns = [columns]
+
+        self.columns = None if columns == ['all'] else list(columns)
+        self.threshold = threshold
+        self.duration = (end_date - start_date).days + 1  # (a, b] => [a, b]
+
+        self._seen = set()
+        self._counts = None
+
+    def add(self, data_frame):
+        """ Add the non-missing values of every site in a chunk """
+
+        if data_frame.empty:
+            return
+
+        self._seen.update(data_frame.columns)
+        columns = [col for col in (self.columns or data_frame.columns)
+                   if col in data_frame.columns]
+
+        groups = data_frame.groupby("site", observed=True, sort=False)
+        counts = groups[[col for col in columns if col != "site"]].count()
+        if "site" in columns:
+            counts["site"] = groups.size()
+        counts.index = counts.index.astype(str)
+
+        if self._counts is None:
+            self._counts = counts
+        else:
+            self._counts = self._counts.add(counts, fill_value=0)
+
+    def result(self) -> DataFrame:
+        """
+        :returns: DataFrame indexed by site with the `has_enough` and
+            `amount` of each one
+        """
+
+        if self._counts is None:
+            return DataFrame({"has_enough": [], "amount": []})
+
+        if self.columns is not None \
+                and any(col not in self._seen for col in self.columns):
+            return DataFrame({"has_enough": False, "amount": 0.0},
+                             index=self._counts.index)
+
+        # Columns missing in some chunks are missing in their sites
+        amount_data = self._counts.fillna(0) / self.duration
+
+        return DataFrame({
+            "has_enough": (amount_data >= self.threshold).all(axis=1),
+            "amount": amount_data.mean(axis=1),
+            })
+
+
+class _SiteParts():
+    """
+    Observations of every site written in parts, chunk by chunk, to a
+    temporary folder until it is known which sites are saved.
+
+    :param folder: folder where the sites are saved, None to save none
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder
+        self._spool = None if folder is None \
+            else tempfile.TemporaryDirectory(dir=folder)
+        self._parts = {}
+
+    def add(self, data_frame, order: int = 0):
+        """ Write the observations of a chunk, `order` among the chunks """
+
+        if self._spool is None or data_frame.empty:
+            return
+
+        for st, site_data in data_frame.groupby("site", observed=True):
+            parts = self._parts.setdefault(st, [])
+            part = os.path.join(self._spool.name,
+                                "%s.%d.csv" % (st, len(parts)))
+            site_data.to_csv(part)
+            parts.append((order, part))
+
+    def save(self, sites):
+        """ Join the parts of each site into `folder`/<site>.csv """
+
+        for st in sites:
+            if self._spool is None or st not in self._parts:
+                continue
+            concat([read_csv(part, index_col=0, dtype=str,
+                             keep_default_na=False)
+                    for _, part in sorted(self._parts[st])]) \
+                .to_csv(os.path.join(self.folder, st+".csv"))
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 class AemetClima():
     """
@@ -33,7 +191,20 @@ class AemetClima():
     downloading meteorological observations data.
     """
 
-    def __init__(self, apikey):
+    def __init__(
+        self,
+        apikey,
+        pool_size: int = 10,
+        timeout: tuple = (10.0, 60.0),
+        gzip: bool = True,
+        scheduler: Optional[RateLimiter] = None,
+        cache: Optional[ObservationsCache] = None,
+        reverse_geocoder: Optional[ReverseGeocoder] = None,
+        planner: Optional[ChunkPlanner] = None,
+        hooks: Optional[list] = None,
+        transport: Optional[Transport] = None,
+        metadata_cache: Optional[MetadataCache] = None,
+    ):
         """
         Initialize the `AemetClima` class with a valid API Key.
 
@@ -41,19 +212,131 @@ class AemetClima():
         ----------
         apikey : str
             The API Key obtained from AEMET's web services.
+        pool_size : int, optional
+            Maximum number of keep-alive connections to AEMET, by
+            default 10.
+        timeout : tuple, optional
+            Connect and read timeouts, in seconds, of every request, by
+            default (10.0, 60.0).
+        gzip : bool, optional
+            Negotiate compressed responses with AEMET, by default True.
+        scheduler : RateLimiter, optional
+            Token bucket pacing every request sent to AEMET and retrying
+            the ones rejected by its rate limit (HTTP 429). By default a
+            `RateLimiter(rate=1.0, burst=5)`: after the first 5 requests
+            sent in a row, a download is throttled to about 1 request per
+            second, which grows by 0.05 after every successful request up
+            to 10 and halves after every 429. Give a faster `RateLimiter`
+            to start closer to the quota of the API key.
+        cache : ObservationsCache, optional
+            On-disk cache of the daily observations. When given, only the
+            days of each site not already cached are downloaded.
+        reverse_geocoder : ReverseGeocoder, optional
+            Reverse geocoding of the new or moved sites when the
+            inventory is updated, with a persistent cache of addresses
+            and an offline mode. By default an in-memory cache.
+        planner : ChunkPlanner, optional
+            Adaptive size of the (date interval, sites batch) chunks of
+            the observations, which shrinks when AEMET can not serve a
+            chunk and grows back after successful ones. By default it
+            starts with chunks of 4 years and 25 sites.
+        hooks : list, optional
+            Callables receiving an event (dict) for every HTTP request
+            sent to AEMET and for every parsing step of its answers (see
+            `pyaemet.utilities.instrumentation`). The events are always
+            collected in `request_stats`.
+        transport : Transport, optional
+            Send the requests in place of the pooled session, e.g. a
+            `RecordingTransport` archiving the answers of AEMET or a
+            `ReplayTransport` answering from such an archive without
+            network access (see `pyaemet.utilities.transport`).
+        metadata_cache : MetadataCache, optional
+            Cache of the `metadatos` document of every endpoint, which
+            is only downloaded by its first request instead of by every
+            chunk. By default it is kept in memory for 1 day; give a
+            `path` to keep it between sessions.
         """
 
-        self._aemet_request = ClimaValues(apikey=apikey)
-        self._aemet_sites = self._saved_sites_info()
+        self._session = AemetSession(pool_size=pool_size,
+                                     connect_timeout=timeout[0],
+                                     read_timeout=timeout[1],
+                                     gzip=gzip)
+        self._stats = RequestStats()
+        self._aemet_request = ClimaValues(apikey=apikey,
+                                          session=self._session,
+                                          scheduler=scheduler,
+                                          cache=cache,
+                                          reverse_geocoder=reverse_geocoder,
+                                          hooks=[self._stats]
+                                          + list(hooks or []),
+                                          transport=transport,
+                                          metadata_cache=metadata_cache)
+        self._planner = ChunkPlanner() if planner is None else planner
+        # The bundled inventory is loaded the first time it is needed
+        self._aemet_sites = None
+
+    @property
+    def session(self) -> AemetSession:
+        return self._session
+
+    def connection_stats(self) -> dict:
+        """
+        Report how many requests reused an already open connection.
+
+        Returns
+        -------
+        dict
+            Number of `requests` sent, new `connections` opened and
+            `reused` connections.
+        """
+
+        return self._session.stats()
+
+    @property
+    def stats(self) -> RequestStats:
+        """ Collector of the events of every request and parsing step """
+
+        return self._stats
+
+    def request_stats(self) -> DataFrame:
+        """
+        Report where the time of the requests goes: API calls, `datos`
+        and `metadatos` downloads and every parsing step.
+
+        Returns
+        -------
+        DataFrame
+            Number of `events`, `retries`, `bytes` received and total,
+            mean and maximum `latency` in seconds by kind ("request" or
+            "parse"), endpoint and stage.
+        """
+
+        return self._stats.summary()
+
+    def add_hook(self, hook):
+        """
+        Send the event of every request and parsing step to `hook`.
+
+        Parameters
+        ----------
+        hook : callable
+            Function receiving every event as a dict.
+        """
+
+        self._aemet_request.add_hook(hook)
 
     @property
     def aemet_sites(self):
+        if self._aemet_sites is None:
+            self._aemet_sites = self._saved_sites_info()
         return self._aemet_sites
 
     @aemet_sites.setter
     def aemet_sites(self, value):
         if isinstance(value, SitesDataFrame):
-            return value
+            # A new inventory comes with its own (not built) spatial index
+            self._aemet_sites = value
+            return
         raise TypeError("AemetClima.aemet_sites must be a "
                         + "SitesDataFrame object")
 
@@ -70,13 +353,21 @@ class AemetClima():
             climatic stations.
         """
 
-        folder = "static/sites/"
-
-        data_fl = resource_stream(__name__, folder+'data.csv')
-        metadata_fl = resource_stream(__name__, folder+'metadata.json')
+        folder = files(__package__).joinpath("static", "sites")
 
-        return SitesDataFrame.open_from(data_fl=data_fl,
-                                        metadata_fl=metadata_fl)
+        with folder.joinpath("metadata.json").open("rb") as metadata_fl:
+            try:
+                # Compact inventory built from the CSV, loaded without
+                # parsing any text
+                with as_file(folder.joinpath("data.npz")) as data_fl:
+                    return SitesDataFrame.open_from(data_fl=data_fl,
+                                                    metadata_fl=metadata_fl)
+            except (OSError, ValueError):
+                metadata_fl.seek(0)
+
+            with folder.joinpath("data.csv").open("rb") as data_fl:
+                return SitesDataFrame.open_from(data_fl=data_fl,
+                                                metadata_fl=metadata_fl)
 
     def sites_info(self, update: bool = True) -> SitesDataFrame:
         """
@@ -252,6 +543,72 @@ class AemetClima():
             n_near,
             max_distance)
 
+    def batch_near_sites(
+        self,
+        latitudes: Union[list, np.ndarray, Series, DataFrame],
+        longitudes: Optional[Union[list, np.ndarray, Series]] = None,
+        n_near: int = 5,
+        max_distance: Union[float, int] = 6237,
+        chunk_size: int = 2048,
+        update_first: bool = False,
+    ) -> DataFrame:
+        """
+        Retrieve the nearest climatic stations of many locations at once.
+
+        Parameters
+        ----------
+        latitudes : list, array, Series, DataFrame
+            Latitudes of the locations. It can also be a DataFrame with
+            `latitude` and `longitude` columns, whose index identifies
+            every location.
+        longitudes : list, array, Series, optional
+            Longitudes of the locations, if `latitudes` is not a
+            DataFrame.
+        n_near : int, optional
+            Number of nearest climatic stations per location, by
+            default 5.
+        max_distance : float, int, optional
+            Maximum distance, in kilometers, of the climatic stations, by
+            default 6237.0.
+        chunk_size : int, optional
+            Number of locations processed at once, which bounds the
+            memory used, by default 2048.
+        update_first : bool, optional
+            Flag to indicate if it is necessary to update the climatic
+            stations information before searching them, by default False.
+
+        Returns
+        -------
+        DataFrame
+            Long-format DataFrame with the columns `query_id` (index or
+            position of the location), `site`, `distance` and `rank`.
+        """
+
+        query_ids = None
+        if isinstance(latitudes, DataFrame):
+            query_ids = latitudes.index.to_numpy()
+            latitudes, longitudes = (latitudes["latitude"],
+                                     latitudes["longitude"])
+        elif isinstance(latitudes, Series):
+            query_ids = latitudes.index.to_numpy()
+
+        if longitudes is None:
+            raise TypeError("batch_near_sites() needs the longitudes of "
+                            + "the locations")
+
+        # Check if an update is needed first
+        if self.aemet_sites.empty or update_first:
+            sites = self.sites_info()
+        else:
+            sites = self.aemet_sites
+
+        return sites.nearest_sites(latitudes,
+                                   longitudes,
+                                   n_near=n_near,
+                                   max_distance=max_distance,
+                                   query_ids=query_ids,
+                                   chunk_size=chunk_size)
+
     def estaciones_cerca(
         self,
         latitud: Union[int, float],
@@ -313,8 +670,9 @@ class AemetClima():
         end_dt: Union[date, datetime] = date.today(),
         threshold: float = 0.75,
         variables: Union[str, list] = 'all',
-        save_folder: Optional[Union[str, os.PathLike]] = ...,
+        save_folder: Optional[Union[str, os.PathLike]] = None,
         verbosity: bool = True,
+        speculative: int = 4,
     ) -> Union[SitesDataFrame, NearSitesDataFrame, DataFrame]:
         """
 
@@ -352,6 +710,14 @@ class AemetClima():
             all data will be saved, independent of the amount of data abailable
             in `variables`
 
+        verbosity : bool, default True
+            Show a progress bar of the evaluated sites.
+
+        speculative : int, default 4
+            When a `NearSitesDataFrame` is passed, number of the nearest
+            sites not evaluated yet whose data is downloaded in parallel
+            while the nearer ones are evaluated.
+
         Return
         ----------
         SitesDataFrame
@@ -359,15 +725,122 @@ class AemetClima():
             returned,
         """
 
-        # To know if the curantion must end when a nearest site with
-        # enough data is found
+        _sites, for_nearest = self._curation_sites(sites)
+
+        _sites["has_enough"] = False
+        _sites["amount"] = np.nan
+
+        if for_nearest:
+            return self._nearest_curation(_sites,
+                                          start_dt=start_dt,
+                                          end_dt=end_dt,
+                                          threshold=threshold,
+                                          variables=variables,
+                                          save_folder=save_folder,
+                                          verbosity=verbosity,
+                                          speculative=speculative)
+
+        availability = _Availability(start_dt, end_dt,
+                                     threshold=threshold,
+                                     columns=variables)
+
+        # The data of every site is saved in parts until it is known to
+        # be enough
+        with _SiteParts(save_folder) as parts:
+            # One request per interval and batch of 25 sites, counted and
+            # dropped as they arrive. A batch that fails is skipped.
+            chunks = self._daily_chunks(list(_sites.site), start_dt, end_dt)
+            progress = _progress_bar(total=len(chunks),
+                                     disable=not verbosity)
+            for i, data in enumerate(self._iter_observations(
+                    chunks, skip_errors=CURATION_ERRORS)):
+                progress.update(1)
+                availability.add(data)
+                parts.add(data, order=i)
+            progress.close()
+
+            availability = availability.result()
+            parts.save(availability.index[availability["has_enough"]])
+
+        evaluated = _sites["site"].isin(availability.index)
+        _sites.loc[evaluated, "has_enough"] = _sites.loc[evaluated, "site"] \
+            .map(availability["has_enough"]).astype(bool)
+        _sites.loc[evaluated, "amount"] = _sites.loc[evaluated, "site"] \
+            .map(availability["amount"])
+
+        return _sites
+
+    def _nearest_curation(self, _sites, start_dt, end_dt, threshold,
+                          variables, save_folder, verbosity, speculative):
+        """
+        Evaluate the sites from the nearest to the farthest and return the
+        first one with enough data. The data of the next `speculative`
+        sites is downloaded in parallel, so the nearer sites do not have
+        to wait for each other, and the downloads still pending are
+        cancelled once the site is found.
+        """
+
+        def get_site(st):
+            return self.daily_clima(site=st,
+                                    start_dt=start_dt,
+                                    end_dt=end_dt,
+                                    verbosity=False)
+
+        progress = _progress_bar(total=len(_sites), disable=not verbosity)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, speculative))
+        candidates = iter(_sites.site)
+        pending = deque((st, executor.submit(get_site, st))
+                        for st in islice(candidates, max(1, speculative)))
+
+        try:
+            while pending:
+                # The nearest site not evaluated yet decides first
+                st, future = pending.popleft()
+                data = future.result()
+                progress.update(1)
+
+                pending.extend((nxt, executor.submit(get_site, nxt))
+                               for nxt in islice(candidates, 1))
+
+                if data.empty:
+                    continue
+
+                is_enough, amount = self._have_enough(data,
+                                                      start_date=start_dt,
+                                                      end_date=end_dt,
+                                                      threshold=threshold,
+                                                      columns=variables)
+
+                _sites.loc[_sites["site"] == st, "has_enough"] = is_enough
+                _sites.loc[_sites["site"] == st, "amount"] = amount
+
+                if is_enough:
+                    if save_folder is not None:
+                        data.to_csv(os.path.join(save_folder, st+".csv"))
+                    return _sites.loc[_sites["site"] == st]
+        finally:
+            progress.close()
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        # None of the sites has enough data
+        return _sites
+
+    def _curation_sites(self, sites) -> tuple:
+        """
+        Convert the `sites` passed to `sites_curation` into a
+        `SitesDataFrame` and check whether the curation must end when
+        the nearest site with enough data is found.
+        """
+
         for_nearest = False
 
-        # Convert sites parameter to SitesDataFrame
         if isinstance(sites, (str, list)):
             _sites = self.sites_in(site=sites)
         elif isinstance(sites, NearSitesDataFrame):
-            _sites = sites.sort_values(by='distance', ascending=False)
+            _sites = sites.sort_values(by='distance', ascending=True)
             for_nearest = True
         elif isinstance(sites, (Series, DataFrame, SitesDataFrame)):
             try:
@@ -380,38 +853,7 @@ class AemetClima():
         if not isinstance(_sites, DataFrame) or _sites.empty:
             raise KeyError("No sites' information passed")
 
-        _sites["has_enough"] = False
-        _sites["amount"] = np.nan
-
-        if verbosity:
-            iteration = tqdm(_sites.site)
-        else:
-            iteration = _sites.site
-
-        for st in iteration:
-            data = self.daily_clima(site=st,
-                                    start_dt=start_dt,
-                                    end_dt=end_dt,
-                                    verbosity=False)
-            if data.empty:
-                continue
-
-            is_enough, amount = self._have_enough(data,
-                                                  start_date=start_dt,
-                                                  end_date=end_dt,
-                                                  threshold=threshold,
-                                                  columns=variables)
-
-            _sites.loc[_sites["site"] == st, "has_enough"] = is_enough
-            _sites.loc[_sites["site"] == st, "amount"] = amount
-
-            if for_nearest:
-                return _sites.loc[_sites["site"] == st]
-
-            if is_enough and save_folder is not None:
-                data.to_csv(save_folder+st+".csv")
-
-        return _sites
+        return _sites, for_nearest
 
     def estaciones_curacion(
         self,
@@ -451,42 +893,260 @@ class AemetClima():
         site,
         start_dt: Union[date, datetime],
         end_dt: Union[date, datetime] = date.today(),
-        verbosity: bool = True
+        verbosity: bool = True,
+        max_workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        hours_as_time: bool = False,
+        compact: bool = False,
     ) -> ObservationsDataFrame:
         """
+        Download the daily observations of one or several sites.
+
+        The period is split in intervals of less than 5 years and the
+        sites in batches of 25, and one request is sent for every
+        (interval, batch) chunk.
+
+        Parameters
+        ----------
+        site : str, list, DataFrame
+            Site code or list of site codes to download.
+        start_dt : date
+            First day of the observations.
+        end_dt : date, optional
+            Last day of the observations, by default `date.today()`.
+        verbosity : bool, optional
+            Show a progress bar of the downloaded chunks, by default True.
+        max_workers : int, optional
+            Number of chunks downloaded in parallel threads. By default
+            the chunks are downloaded one after the other. Keep it below
+            the `pool_size` of the client to reuse the connections.
+        executor : concurrent.futures.Executor, optional
+            Executor used to download the chunks in parallel instead of
+            creating a new thread pool of `max_workers`.
+        hours_as_time : bool, optional
+            Give the hours (`hr_*` columns) as `datetime.time` objects,
+            as in previous versions. By default they are given as
+            minutes of the day (`Int16`), -1 meaning several hours.
+        compact : bool, optional
+            Give the observations with a compact memory layout (see
+            `ObservationsDataFrame.compact`): categorical sites, float32
+            measurements, hours as minutes and the date as index. By
+            default False.
+
+        Returns
+        -------
+        ObservationsDataFrame
+            The observations of every chunk, concatenated in the order
+            of the date intervals and site batches, whatever the order in
+            which the chunks were downloaded.
         """
 
-        if isinstance(site, str):
-            site = [[site]]
-        elif isinstance(site, list):
-            sites = [site[i:i+25] for i in range(0, len(site), 25)]
-            site = sites
-        elif isinstance(site, DataFrame):
-            sites = site.site.drop_duplicates().to_list()
-            site = [site[i:i+25] for i in range(0, len(site), 25)]
+        chunks = self._daily_chunks(site, start_dt, end_dt)
+
+        if executor is not None:
+            prefetch = max_workers or len(chunks)
+        else:
+            prefetch = max_workers if (max_workers or 1) > 1 else 0
+
+        progress = _progress_bar(total=len(chunks), disable=not verbosity)
 
         data_list = []
         metadata = {}
+        for data in self._iter_observations(chunks,
+                                            ordered=True,
+                                            prefetch=prefetch,
+                                            executor=executor,
+                                            hours_as_time=hours_as_time):
+            if compact:
+                # Keep the chunks small until they are concatenated
+                data = data.compact(date_index=False)
+            data_list.append(data)
+            merge_metadata(metadata, data.metadata)
+            progress.update(1)
 
-        # Split dates in intervals where: end_dt - start_dt < 5 years
-        splited_dates = self._split_date(start_dt, end_dt)
+        progress.close()
 
-        if verbosity:
-            splited_dates = tqdm(splited_dates)
+        data = ObservationsDataFrame(data=concat(data_list),
+                                     library="pyaemet",
+                                     metadata=metadata)
 
-        for dates, st in product(splited_dates, site):
-            start, end = dates
-            data, meta = self._aemet_request \
-                             .get_observations(fechaIniStr=start,
-                                               fechaFinStr=end,
-                                               idema=",".join(st))
-            data_list.append(data)
-            metadata.update(meta)
+        return data.compact() if compact else data
+
+    def iter_daily_clima(
+        self,
+        site,
+        start_dt: Union[date, datetime],
+        end_dt: Union[date, datetime] = date.today(),
+        ordered: bool = True,
+        prefetch: int = 2,
+        executor: Optional[Executor] = None,
+        hours_as_time: bool = False,
+        compact: bool = False,
+    ) -> Iterator[ObservationsDataFrame]:
+        """
+        Download the daily observations of one or several sites chunk by
+        chunk, yielding every (date interval, sites batch) chunk as soon
+        as it is parsed instead of keeping the whole result in memory.
+
+        Parameters
+        ----------
+        site : str, list, DataFrame
+            Site code or list of site codes to download.
+        start_dt : date
+            First day of the observations.
+        end_dt : date, optional
+            Last day of the observations, by default `date.today()`.
+        ordered : bool, optional
+            Yield the chunks in the order of the date intervals and site
+            batches. If False, they are yielded as soon as they are
+            downloaded. By default True.
+        prefetch : int, optional
+            Number of chunks downloaded in background threads while the
+            previous ones are consumed, by default 2. With 0, every chunk
+            is downloaded when it is requested.
+        executor : concurrent.futures.Executor, optional
+            Executor used to download the chunks in the background
+            instead of creating a new thread pool of `prefetch` threads.
+        hours_as_time : bool, optional
+            Give the hours (`hr_*` columns) as `datetime.time` objects
+            instead of minutes of the day, by default False.
+        compact : bool, optional
+            Give every chunk with the compact memory layout of
+            `ObservationsDataFrame.compact`, by default False.
+
+        Yields
+        ------
+        ObservationsDataFrame
+            The observations of one chunk with its metadata.
+        """
+
+        for data in self._iter_observations(
+                self._daily_chunks(site, start_dt, end_dt),
+                ordered=ordered,
+                prefetch=prefetch,
+                executor=executor,
+                hours_as_time=hours_as_time):
+            yield data.compact() if compact else data
+
+    def _daily_chunks(self, site, start_dt, end_dt) -> list:
+        """
+        Split the request in (date interval, sites batch) chunks of the
+        size the chunk planner found to work, at most intervals of 4
+        years and batches of 25 sites.
+        """
+
+        return self._planner.plan(ClimaValues.observations_endpoint,
+                                  start_dt, end_dt, self._site_list(site))
+
+    def _get_chunk(self, chunk, hours_as_time: bool = False):
+        """
+        Download the observations of a chunk. If it is too big to be
+        served, it is split and only its halves are requested again.
+        """
+
+        (start, end), st = chunk
+        endpoint = ClimaValues.observations_endpoint
+        # The requests of the chunk that was too big are also reported
+        metadata = {}
 
-        return ObservationsDataFrame(data=concat(data_list),
+        try:
+            data, metadata = self._aemet_request \
+                                 .get_observations(
+                                     fechaIniStr=start,
+                                     fechaFinStr=end,
+                                     idema=",".join(st),
+                                     hours_as_time=hours_as_time)
+        except OVERSIZE_ERRORS:
+            smaller = self._planner.split(chunk)
+            if not smaller:
+                raise
+        else:
+            if not self._planner.is_oversize(metadata):
+                self._planner.success(endpoint, chunk)
+                return ObservationsDataFrame(data=data,
+                                             library="pyaemet",
+                                             metadata=metadata)
+            smaller = self._planner.split(chunk)
+            if not smaller:
+                # Nothing smaller can be requested, keep the error
+                return ObservationsDataFrame(data=data,
+                                             library="pyaemet",
+                                             metadata=metadata)
+
+        self._planner.failure(endpoint, chunk)
+
+        parts = [self._get_chunk(part, hours_as_time=hours_as_time)
+                 for part in smaller]
+
+        metadata = {STATS_KEY: list(metadata.get(STATS_KEY, []))}
+        for part in parts:
+            merge_metadata(metadata, part.metadata)
+
+        return ObservationsDataFrame(data=concat(parts),
                                      library="pyaemet",
                                      metadata=metadata)
 
+    def _iter_observations(
+        self,
+        chunks: list,
+        ordered: bool = True,
+        prefetch: int = 0,
+        executor: Optional[Executor] = None,
+        hours_as_time: bool = False,
+        skip_errors: tuple = (),
+    ) -> Iterator[ObservationsDataFrame]:
+        """
+        Download the chunks, keeping at most `prefetch` of them in
+        flight, and yield their observations. The chunks failing with
+        one of `skip_errors` are yielded empty, with the error in their
+        metadata.
+        """
+
+        def get_chunk(chunk):
+            try:
+                return self._get_chunk(chunk, hours_as_time=hours_as_time)
+            except skip_errors as error:
+                logger.warning("Chunk %s skipped: %s", chunk, error)
+                return ObservationsDataFrame(
+                    data=None,
+                    library="pyaemet",
+                    metadata={"estado": None, "descripcion": str(error)})
+
+        if prefetch <= 0:
+            for chunk in chunks:
+                yield get_chunk(chunk)
+            return
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=prefetch)
+
+        chunks = iter(chunks)
+        pending = deque(executor.submit(get_chunk, chunk)
+                        for chunk in islice(chunks, prefetch))
+
+        try:
+            while pending:
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = next(fut for fut in pending if fut in done)
+                    pending.remove(future)
+
+                data = future.result()
+
+                # Keep the window full while the chunk is consumed
+                pending.extend(executor.submit(get_chunk, chunk)
+                               for chunk in islice(chunks, 1))
+
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=False)
+
     def clima_diaria(
         self,
         estacion,
@@ -505,6 +1165,19 @@ class AemetClima():
                                 start_dt=fecha_ini,
                                 end_dt=fecha_fin)
 
+    @staticmethod
+    def _site_list(site) -> list:
+        """ List of the site codes given as str, list, Series or DataFrame """
+
+        if isinstance(site, str):
+            site = [site]
+        elif isinstance(site, DataFrame):
+            site = site.site.drop_duplicates().to_list()
+        elif isinstance(site, Series):
+            site = site.drop_duplicates().to_list()
+
+        return list(site)
+
     @staticmethod
     def _have_enough(data_frame, start_date, end_date,
                      threshold=0.75, columns: Union[str, list] = 'all'):
@@ -513,35 +1186,12 @@ class AemetClima():
         if isinstance(columns, str):
             columns = [columns]
 
+        if columns == ['all']:
+            columns = data_frame.columns
         if any(col not in data_frame.columns for col in columns):
             return False, 0.0
-        if columns == 'all':
-            columns = data_frame.columns
 
         duration = (end_date - start_date).days + 1  # (a, b] => [a, b]
         amount_data = data_frame[columns].notna().sum() / duration
 
         return [(amount_data >= threshold).all(), amount_data.mean()]
-
-    @staticmethod
-    def _split_date(start_dt: date, end_dt: date, min_years: int = 4) -> list:
-        """
-        Check if interval between start_dt and end_dt is bigger than 5
-        years, and if so, divide it in interval of less than 5 years.
-
-        :param start: beginning date of interval
-        :param end: ending date of interval
-
-        :returns: list of tuplas with inteval of less than 5 years between
-            start date and end date
-        """
-
-        min_years_delta = relativedelta(years=min_years)
-        n_delta = relativedelta(end_dt, start_dt).years // min_years + 1
-
-        interval_dates = [start_dt+(i*min_years_delta)
-                          for i in range(0, n_delta)]
-        interval_dates += [end_dt]
-
-        return [(interval_dates[j], interval_dates[j+1])
-                for j in range(0, n_delta)]
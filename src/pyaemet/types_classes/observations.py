@@ -4,9 +4,12 @@ ObservationsDataFrame
 
 """
 
+from datetime import time
+
+import numpy as np
 from pandas import DataFrame
 
-# import numpy as np
+from ..utilities.curation import hours_to_minutes
 
 
 class ObservationsDataFrame(DataFrame):
@@ -43,3 +46,67 @@ class ObservationsDataFrame(DataFrame):
             metadata = {}
         object.__setattr__(self, "library", library)
         object.__setattr__(self, "metadata", metadata)
+
+    def compact(self, decimals: int = 1, date_index: bool = True):
+        """
+        Copy of the observations with a compact memory layout:
+
+            site as a categorical column,
+            float32 measurements when they keep `decimals` digits,
+            hours (hr_*) as integer minutes of the day,
+            date as the index, if `date_index`
+
+        :param decimals: decimal digits that must be kept exactly when the
+            measurements are stored as float32. AEMET gives one.
+        :param date_index: use the date of the observations as index
+        :returns: compacted ObservationsDataFrame
+        """
+
+        data = DataFrame(self, copy=True)
+
+        for col in data.columns:
+            column = data[col]
+            if col == "site":
+                data[col] = column.astype("category")
+            elif col.startswith("hr_") and col != "hr_sun":
+                if column.dtype == object:
+                    # Legacy `datetime.time` hours
+                    column = column.map(
+                        lambda value: (-1 if value == time(0, 0, 59) else
+                                       value.hour * 60 + value.minute)
+                        if isinstance(value, time) else value)
+                    data[col] = column.astype("Int16")
+                elif column.dtype == "string":
+                    data[col] = hours_to_minutes(column)
+            elif column.dtype == "float64":
+                values = column.to_numpy()
+                compact = values.astype("float32")
+                if np.array_equal(compact.astype("float64").round(decimals),
+                                  values.round(decimals), equal_nan=True):
+                    data[col] = compact
+
+        if date_index and "date" in data.columns:
+            data = data.set_index("date")
+
+        return ObservationsDataFrame(data=data,
+                                     library=self.library,
+                                     metadata=self.metadata)
+
+    def memory_report(self) -> DataFrame:
+        """
+        Bytes used by every column of the observations, including the
+        index and the total.
+
+        :returns: DataFrame with the `dtype`, `bytes` and `fraction` of
+            memory used by each column
+        """
+
+        usage = self.memory_usage(index=True, deep=True)
+        dtypes = [str(self.index.dtype)] + [str(dt) for dt in self.dtypes]
+
+        report = DataFrame({"dtype": dtypes, "bytes": usage.to_numpy()},
+                           index=usage.index)
+        report.loc["total"] = ["", int(usage.sum())]
+        report["fraction"] = report["bytes"] / max(int(usage.sum()), 1)
+
+        return report
@@ -9,10 +9,17 @@ import json
 from typing import List, Optional
 
 import pandas
-import folium
 import numpy as np
 from pandas.core.frame import DataFrame
 
+from ..utilities.spatial import haversine, SitesIndex
+from ..utilities.inventory import (
+    read_inventory_csv,
+    save_inventory,
+    load_inventory,
+    load_compact_inventory,
+    )
+
 
 class SitesDataFrame(pandas.DataFrame):
     """
@@ -51,6 +58,7 @@ class SitesDataFrame(pandas.DataFrame):
             metadata = {}
         object.__setattr__(self, "library", library)
         object.__setattr__(self, "metadata", metadata)
+        object.__setattr__(self, "_sites_index", None)
 
     @staticmethod
     def _validate(obj):
@@ -78,27 +86,51 @@ class SitesDataFrame(pandas.DataFrame):
             folder_name: Optional[str] = None
     ):
         """
+        Open the sites saved by `SitesDataFrame.save`. The data file can
+        be a pickle (.pkl), a binary inventory (.npy), a compact
+        inventory (.npz) or a CSV.
         """
 
         if data_fl is None:
             if folder_name is None:
                 raise KeyError("Not correct file path")
-            data_fl = folder_name + "data.pkl"
+            data_fl = next((folder_name + "data" + ext
+                            for ext in (".npy", ".pkl", ".csv")
+                            if os.path.exists(folder_name + "data" + ext)),
+                           folder_name + "data.pkl")
         if metadata_fl is None:
             if folder_name is None:
                 raise KeyError("Not correct file path")
             metadata_fl = folder_name + "metadata.json"
 
-        metadata = json.load(metadata_fl)
+        if isinstance(metadata_fl, (str, os.PathLike)):
+            with open(metadata_fl, encoding="utf-8") as file:
+                metadata = json.load(file)
+        else:
+            metadata = json.load(metadata_fl)
+
+        name = str(getattr(data_fl, "name", data_fl))
+        if name.endswith(".npy"):
+            data = load_inventory(data_fl)
+        elif name.endswith(".npz"):
+            data = load_compact_inventory(data_fl)
+        elif name.endswith(".pkl"):
+            data = pandas.read_pickle(data_fl)
+        else:
+            data = read_inventory_csv(data_fl)
 
         return SitesDataFrame(
-            data=pandas.read_csv(data_fl),
+            data=data,
             library="pyaemet",
             metadata=metadata
             )
 
     def save(self, folder_name: str, extension: str = 'pickle'):
         """
+        Save the sites and their metadata in `folder_name`.
+
+        :param extension: 'pickle', 'csv' or 'npy', the binary inventory
+            that is loaded without parsing
         """
 
         if not os.path.exists(folder_name):
@@ -107,7 +139,9 @@ class SitesDataFrame(pandas.DataFrame):
         if extension == 'pickle':
             self.to_pickle(folder_name+"data.pkl")
         elif extension == 'csv':
-            self.to_csv(folder_name+"data.csv")
+            self.to_csv(folder_name+"data.csv", index=False)
+        elif extension == 'npy':
+            save_inventory(self, folder_name+"data.npy")
 
         with open(folder_name+"metadata.json", 'w') as file:
             json.dump(self.metadata, file, indent=4)
@@ -115,9 +149,30 @@ class SitesDataFrame(pandas.DataFrame):
     def copy(self, deep=True):
         """ Copy object """
 
-        return SitesDataFrame(data=super().copy(deep),
-                              library=self.library,
-                              metadata=self.metadata)
+        new_data = SitesDataFrame(data=super().copy(deep),
+                                  library=self.library,
+                                  metadata=self.metadata)
+        # Same coordinates, so the spatial index is still valid
+        object.__setattr__(new_data, "_sites_index", self._sites_index)
+
+        return new_data
+
+    @property
+    def sites_index(self) -> SitesIndex:
+        """
+        Spatial index of the sites, built on the first nearest-sites
+        query and rebuilt if the coordinates of the sites change.
+        """
+
+        latitudes = self.__getitem__("latitude").to_numpy(dtype="float64")
+        longitudes = self.__getitem__("longitude").to_numpy(dtype="float64")
+
+        if (self._sites_index is None or
+                not self._sites_index.matches(latitudes, longitudes)):
+            object.__setattr__(self, "_sites_index",
+                               SitesIndex(latitudes, longitudes))
+
+        return self._sites_index
 
     def as_dataframe(self):
         return super().copy(True)
@@ -128,6 +183,9 @@ class SitesDataFrame(pandas.DataFrame):
         plot map with the sites location
         """
 
+        # folium is only needed to plot the maps
+        import folium
+
         mapa = folium.Map()
 
         if self.empty:
@@ -194,16 +252,54 @@ class SitesDataFrame(pandas.DataFrame):
         """
         """
 
-        sites_distance = self.calc_distance(latitude, longitude)
+        positions, distances = self.sites_index.query(latitude, longitude,
+                                                      n_near, max_distance)
 
-        sites_distance = sites_distance.__getitem__(
-            sites_distance.__getitem__("distance") <=
-            max_distance).sort_values(by=['distance'],
-                                      ascending=True)[:(n_near)]
+        sites_distance = pandas.DataFrame.take(self, positions)
+        sites_distance.__setitem__(key="distance", value=distances)
 
         return NearSitesDataFrame(ref_point=[latitude, longitude],
                                   data=sites_distance, metadata=self.metadata)
 
+    def nearest_sites(
+            self,
+            latitudes,
+            longitudes,
+            n_near: int = 5,
+            max_distance: float = 6237.0,
+            query_ids=None,
+            chunk_size: int = 2048,
+    ) -> DataFrame:
+        """
+        Nearest sites to many points at once, in long format.
+
+        :param latitudes: array of latitudes of the points
+        :param longitudes: array of longitudes of the points
+        :param n_near: number of nearest sites to return per point
+        :param max_distance: maximum distance, in km, of the sites
+        :param query_ids: identifier of every point, by default its
+            position
+        :param chunk_size: number of points processed at once, which
+            bounds the memory used
+
+        :returns: pandas DataFrame with the columns `query_id`, `site`,
+            `distance` and `rank` (1 for the nearest site of the point)
+        """
+
+        points, positions, distances, ranks = self.sites_index.query_many(
+            latitudes, longitudes, n_near, max_distance,
+            chunk_size=chunk_size)
+
+        if query_ids is None:
+            query_ids = np.arange(len(np.asarray(latitudes)))
+
+        return DataFrame({
+            "query_id": np.asarray(query_ids)[points],
+            "site": self.__getitem__("site").to_numpy()[positions],
+            "distance": distances,
+            "rank": ranks,
+            })
+
     def calc_distance(
             self,
             latitude: float,
@@ -212,39 +308,41 @@ class SitesDataFrame(pandas.DataFrame):
     ):
 
         """
-        Calculate distance between locations given in latitudes and
-        longitudes coordinates. The distance is calculated using the
-        following equation:
-
-            dist = radius *
-                arcocos{cos(lat1 - lat2) -
-                        cos(lat1)*cos(lat2)*[1 cos(long1 - long2)]}
-
-        :param coor1: list of coordinates of first location
-            e.g.: [latitude,longitude]
-        :param corr2: list of coordinates of second location
-            e.g.: [latitude,longitude]
+        Calculate distance between the sites and a location given in
+        latitude and longitude coordinates. The distance is calculated
+        with the haversine formula:
+
+            dist = 2 * radius *
+                arcsin{sqrt[sin²((lat1 - lat2)/2) +
+                            cos(lat1)*cos(lat2)*sin²((long1 - long2)/2)]}
+
+        :param latitude: latitude of the location
+        :param longitude: longitude of the location
         :param radius: earth radius
 
-        :returns: distance between the two locations in kilometers
-            (Due to radius is given in km)
+        :returns: copy of the sites with the distance to the location in
+            kilometers (Due to radius is given in km)
         """
 
-        coor1 = pandas.DataFrame(np.deg2rad(self.__getitem__(["latitude",
-                                                              "longitude"])))
-        latitude, longitude = np.deg2rad(latitude), np.deg2rad(longitude)
+        distance = haversine(self._get_column_array(self._column_index(
+                                 "latitude")),
+                             self._get_column_array(self._column_index(
+                                 "longitude")),
+                             latitude, longitude, radius)
 
-        new_data = self.copy()
-
-        new_data.__setitem__(key="distance", value=coor1.apply(
-            lambda row: radius *
-            np.arccos(np.cos(row["latitude"] - latitude) -
-                      np.cos(row["latitude"]) * np.cos(latitude) *
-                      (1 - np.cos(row["longitude"] - longitude))
-                      ), axis=1))
+        # Shallow copy: the new column is not added to the original sites
+        new_data = SitesDataFrame(data=pandas.DataFrame.copy(self,
+                                                             deep=False),
+                                  library=self.library,
+                                  metadata=self.metadata)
+        new_data.__setitem__(key="distance", value=distance)
 
         return new_data
 
+    def _column_index(self, column: str) -> int:
+        index, = np.where(self.columns == column)[0]
+        return index
+
     def sort_values(self, inplace=False, **kwargs):
         if inplace:
             super().sort_values(inplace=True, **kwargs)
@@ -325,6 +423,8 @@ class NearSitesDataFrame(SitesDataFrame, pandas.DataFrame):
         plot map with the sites location
         """
 
+        import folium
+
         mapa = super().map
 
         folium.Marker([self.metadata["Reference Point"]["latitude"],
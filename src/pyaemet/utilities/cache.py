@@ -0,0 +1,340 @@
+"""
+Observations Cache
+--------------------
+
+Persistent on-disk cache of the daily observations, stored per site, so
+overlapping requests only download the days that were never fetched,
+and cache of the `metadatos` document of every endpoint.
+
+:author Jaimedgp
+"""
+
+import os
+import copy
+import json
+import time
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame, Timestamp, concat
+
+from .inventory import to_records, from_records
+
+
+def _as_date(value) -> date:
+    """ Convert a date, datetime or Timestamp into a date """
+
+    if isinstance(value, (datetime, Timestamp)):
+        return value.date()
+    return value
+
+
+def _merge_intervals(intervals: list) -> list:
+    """ Merge overlapping or consecutive [start, end] day ordinals """
+
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+
+class ObservationsCache():
+    """
+    Cache of the daily observations keyed by (site, day).
+
+    Every site is kept in its own pair of files: the parsed observations,
+    sorted by date, as a typed NumPy structured array (`.npy`) and the
+    intervals of days already downloaded, even the days AEMET has no
+    data for so they are not requested again, with the dtypes of the
+    columns (`.json`). The observations are memory-mapped and only the
+    days requested are read. No file is ever unpickled, so the cache
+    can be shared.
+
+    Parameters
+    ----------
+    folder : str, os.PathLike
+        Folder where the cache files are stored.
+    max_bytes : int, optional
+        Maximum size of the cache on disk, by default 512 MB. When it is
+        exceeded, the least recently used sites are evicted.
+    refresh_days : int, optional
+        Number of most recent days that are always downloaded again,
+        since they are the only ones AEMET revises, by default 0.
+    """
+
+    def __init__(
+            self,
+            folder,
+            max_bytes: int = 512 * 1024**2,
+            refresh_days: int = 0,
+    ):
+
+        self.folder = os.fspath(folder)
+        self.max_bytes = max_bytes
+        self.refresh_days = refresh_days
+
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    def _site_file(self, site: str, extension: str = ".json") -> str:
+        return os.path.join(self.folder, site + extension)
+
+    def _read(self, site: str) -> dict:
+        """
+        Read the intervals of days downloaded for a site and the dtypes
+        of its observations.
+        """
+
+        try:
+            with open(self._site_file(site), encoding="utf-8") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return {"covered": [], "dtypes": None}
+
+        # Keep track of the least recently used sites
+        os.utime(self._site_file(site))
+
+        return cached
+
+    def _records(self, site: str) -> Optional[np.ndarray]:
+        """ Memory-mapped observations of a site, None if not cached """
+
+        try:
+            return np.load(self._site_file(site, ".npy"), mmap_mode="r",
+                           allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def metadata(self) -> dict:
+        """ Metadata of the last download stored in the cache """
+
+        try:
+            with open(os.path.join(self.folder, "metadata.json"),
+                      encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @metadata.setter
+    def metadata(self, value: dict):
+        with open(os.path.join(self.folder, "metadata.json"), "w",
+                  encoding="utf-8") as file:
+            json.dump(value, file, indent=4, default=str)
+
+    def missing_ranges(self, site: str, start_dt: date, end_dt: date) -> list:
+        """
+        Intervals of days between `start_dt` and `end_dt` that must be
+        downloaded for the `site`.
+
+        :returns: list of (start, end) date tuples
+        """
+
+        start, end = _as_date(start_dt).toordinal(), _as_date(end_dt) \
+                                                      .toordinal()
+
+        with self._lock:
+            covered = self._read(site)["covered"]
+
+        if self.refresh_days > 0:
+            refresh_from = (date.today()
+                            - timedelta(days=self.refresh_days - 1)) \
+                               .toordinal()
+            covered = [[a, min(b, refresh_from - 1)] for a, b in covered
+                       if a < refresh_from]
+
+        missing = []
+        current = start
+        for a, b in covered:
+            if b < current or a > end:
+                continue
+            if a > current:
+                missing.append((current, a - 1))
+            current = max(current, b + 1)
+        if current <= end:
+            missing.append((current, end))
+
+        return [(date.fromordinal(a), date.fromordinal(b))
+                for a, b in missing]
+
+    def load(self, site: str, start_dt: date, end_dt: date) -> DataFrame:
+        """ Cached observations of a site between two dates """
+
+        start = np.datetime64(_as_date(start_dt), "ns")
+        end = np.datetime64(_as_date(end_dt) + timedelta(days=1), "ns")
+
+        with self._lock:
+            dtypes = self._read(site)["dtypes"]
+            records = self._records(site)
+
+            if dtypes is None or records is None:
+                return None
+
+            # The days are sorted: only the rows requested are read
+            first, last = np.searchsorted(records["date"], [start, end])
+            records = records[first:last]
+
+            data = from_records(records, dtypes)
+
+        return data[list(dtypes)]
+
+    def store(self, site: str, data: DataFrame, start_dt: date, end_dt: date):
+        """
+        Store the observations of a site downloaded between two dates,
+        replacing the cached ones of those days.
+        """
+
+        start, end = _as_date(start_dt), _as_date(end_dt)
+
+        with self._lock:
+            cached = self._read(site)
+            records = self._records(site)
+
+            if cached["dtypes"] is not None and records is not None \
+                    and len(records):
+                old = from_records(records, cached["dtypes"])
+                days = old["date"].dt.date
+                old = old[(days < start) | (days > end)]
+                frames = [frame for frame in (old, data) if not frame.empty]
+                data = concat(frames) if frames else old
+
+            path = self._site_file(site, ".npy")
+            if data.empty:
+                # Days without data, only their interval is kept
+                if os.path.exists(path):
+                    os.remove(path)
+                cached["dtypes"] = None
+            else:
+                data = data.sort_values("date", kind="stable")
+                # A new file, the old one may still be memory-mapped
+                with open(path + ".tmp", "wb") as file:
+                    np.save(file, to_records(data), allow_pickle=False)
+                os.replace(path + ".tmp", path)
+                cached["dtypes"] = {col: str(dtype)
+                                    for col, dtype in data.dtypes.items()}
+
+            cached["covered"] = _merge_intervals(
+                cached["covered"] + [[start.toordinal(), end.toordinal()]])
+
+            with open(self._site_file(site), "w", encoding="utf-8") as file:
+                json.dump(cached, file)
+
+            self._evict(keep=site)
+
+    def _sites(self) -> list:
+        """ Sites in the cache, with the files of each one """
+
+        return [fl[:-len(".json")] for fl in os.listdir(self.folder)
+                if fl.endswith(".json") and fl != "metadata.json"]
+
+    def _site_size(self, site: str) -> int:
+        return sum(os.path.getsize(fl)
+                   for fl in (self._site_file(site),
+                              self._site_file(site, ".npy"))
+                   if os.path.exists(fl))
+
+    def _remove(self, site: str):
+        for fl in (self._site_file(site), self._site_file(site, ".npy")):
+            if os.path.exists(fl):
+                os.remove(fl)
+
+    def _evict(self, keep: Optional[str] = None):
+        """ Remove the least recently used sites over `max_bytes` """
+
+        sites = sorted(self._sites(),
+                       key=lambda st: os.path.getmtime(self._site_file(st)))
+        sizes = {st: self._site_size(st) for st in sites}
+
+        total = sum(sizes.values())
+        for st in sites:
+            if total <= self.max_bytes:
+                break
+            if st == keep:
+                continue
+            total -= sizes[st]
+            self._remove(st)
+
+    def clear(self):
+        """ Remove every cached site """
+
+        with self._lock:
+            for st in self._sites():
+                self._remove(st)
+            if os.path.exists(os.path.join(self.folder, "metadata.json")):
+                os.remove(os.path.join(self.folder, "metadata.json"))
+
+
+class MetadataCache():
+    """
+    Cache of the `metadatos` document of every AEMET endpoint (fields'
+    description, periodicity, copyright...), which is the same for all
+    its requests, so it is only downloaded once.
+
+    The documents are kept in memory and, with a `path`, also in a JSON
+    file shared between sessions.
+
+    Parameters
+    ----------
+    path : str, os.PathLike, optional
+        JSON file of the persistent cache, by default only in memory.
+    ttl : float, optional
+        Seconds a document is used before it is downloaded again, by
+        default 1 day. None to never expire them.
+    """
+
+    def __init__(self, path=None, ttl: Optional[float] = 24 * 3600.0):
+        self.path = None if path is None \
+            else os.path.expanduser(os.fspath(path))
+        self.ttl = ttl
+
+        self._documents = {}
+        self._lock = threading.Lock()
+
+        if self.path is not None:
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    self._documents = json.load(file)
+            except (OSError, ValueError):
+                self._documents = {}
+
+    def _expired(self, cached: dict) -> bool:
+        return self.ttl is not None and time.time() - cached["time"] > self.ttl
+
+    def get(self, endpoint: str) -> Optional[dict]:
+        """ Cached `metadatos` of an endpoint, None if missing or expired """
+
+        with self._lock:
+            cached = self._documents.get(endpoint)
+
+        if cached is None or self._expired(cached):
+            return None
+
+        # Every result gets its own copy to modify
+        return copy.deepcopy(cached["metadatos"])
+
+    def store(self, endpoint: str, metadatos: dict):
+        """ Keep the `metadatos` of an endpoint """
+
+        with self._lock:
+            self._documents[endpoint] = {"time": time.time(),
+                                         "metadatos": copy.deepcopy(
+                                             metadatos)}
+            if self.path is not None:
+                with open(self.path, "w", encoding="utf-8") as file:
+                    json.dump(self._documents, file, indent=4, default=str)
+
+    def clear(self):
+        """ Forget every document, also in the persistent cache """
+
+        with self._lock:
+            self._documents = {}
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
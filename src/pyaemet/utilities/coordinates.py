@@ -5,8 +5,20 @@ Utilities
 :author Jaimedgp
 """
 
-from pandas import Series, DataFrame, concat
-from geocoder import arcgis
+import os
+import json
+import time
+import logging
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pandas import Series, DataFrame, concat, notna
+from requests import RequestException
+
+
+logger = logging.getLogger(__name__)
 
 
 def _coordinates(coordinate: str):
@@ -32,6 +44,44 @@ def _coordinates(coordinate: str):
     return signo[orientation]*(grados+minutes+seconds)
 
 
+def coordinates_to_degrees(coordinates: Series) -> Series:
+    """
+    Vectorized version of `_coordinates`. Convert a whole column of
+    AEMET_API angles in degrees, minutes and seconds ("DDMMSS" plus the
+    orientation) into float degrees. Malformed values are NaN instead of
+    raising.
+
+    :param coordinates: column of longitude or latitude angles
+        e.g.: ["425432N", "034950W"]
+    :returns: column of float degrees. e.g.: [42.9089, -3.8306]
+    """
+
+    values = np.char.strip(
+        np.where(notna(coordinates), coordinates, "").astype(str))
+    is_valid = np.char.str_len(values) == 7
+
+    # Code points of the 7 characters of every value
+    codes = values.astype("U7").view(np.uint32).reshape(-1, 7) \
+                  .astype(np.int64)
+
+    digits = codes[:, :6] - ord("0")
+    is_valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+    orientation = codes[:, 6]
+    sign = np.select([(orientation == ord("N")) | (orientation == ord("E")),
+                      (orientation == ord("S")) | (orientation == ord("W"))],
+                     [1.0, -1.0], default=0.0)
+    is_valid &= sign != 0
+
+    degrees = (digits[:, 0] * 10 + digits[:, 1]
+               + (digits[:, 2] * 10 + digits[:, 3]) / 60
+               + (digits[:, 4] * 10 + digits[:, 5]) / 3600)
+
+    return Series(np.where(is_valid, sign * degrees, np.nan),
+                  index=coordinates.index,
+                  name=coordinates.name)
+
+
 def transform_coordinates(
         sites: Series,
         columns: list = ["latitude", "longitude"]
@@ -40,25 +90,30 @@ def transform_coordinates(
     """
 
     if sites.name in columns:
-        sites = sites.apply(_coordinates)
+        sites = coordinates_to_degrees(sites)
 
     return sites
 
 
-def get_address(lat, long):
+def get_address(lat, long, timeout: float = 5.0):
     """
     Obtain the district, city, province and Autonomus community
     of a coordiante.
 
     :param lat: float of the latitude coordinate in degrees
     :param long: float of the longitude coordinate in degrees
+    :param timeout: seconds to wait for the geocoding service
 
     :return: pandas DataFrame with the latitude, longitude, district, city,
         province and autonomus community
     """
 
+    # geocoder is only needed to update the sites' inventory
+    from geocoder import arcgis
+
     address_data = arcgis([lat, long],
-                          method='reverse').json["raw"]["address"]
+                          method='reverse',
+                          timeout=timeout).json["raw"]["address"]
 
     address_data.update({"latitude": lat,
                          "longitude": long})
@@ -82,3 +137,176 @@ def get_site_address(row):
     """
 
     return get_address(row["latitude"], row["longitude"])
+
+
+ADDRESS_COLUMNS = ["district", "city", "subregion", "region"]
+
+# Errors of a failed geocoding: the network errors and timeouts and,
+# as geocoder keeps them to itself, its answers without an address
+GEOCODING_ERRORS = (RequestException, KeyError, TypeError)
+
+
+class ReverseGeocoder():
+    """
+    Reverse geocoding of coordinates with a persistent cache.
+
+    The addresses are cached by the coordinates rounded to `precision`
+    decimals and the cache misses are resolved in a pool of, at most,
+    `max_workers` threads. In `offline` mode no request is sent: the
+    addresses come only from the cache or from a lookup table, such as
+    the sites' inventory shipped with the package.
+
+    Parameters
+    ----------
+    cache_file : str, os.PathLike, optional
+        JSON file where the cache is persisted. By default the cache
+        only lives in memory.
+    ttl_days : float, optional
+        Days an address is kept in the cache, by default 365.
+    max_entries : int, optional
+        Maximum number of addresses in the cache, by default 50000. The
+        oldest ones are removed first.
+    precision : int, optional
+        Decimals of the rounded coordinates used as cache keys, by
+        default 4 (about 10 meters).
+    max_workers : int, optional
+        Maximum number of concurrent geocoding requests, by default 8.
+    timeout : float, optional
+        Seconds to wait for every geocoding request, by default 10.
+    offline : bool, optional
+        Never send geocoding requests, by default False.
+    """
+
+    def __init__(
+            self,
+            cache_file=None,
+            ttl_days: float = 365,
+            max_entries: int = 50000,
+            precision: int = 4,
+            max_workers: int = 8,
+            timeout: float = 10.0,
+            offline: bool = False,
+    ):
+
+        self.cache_file = cache_file
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.precision = precision
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.offline = offline
+
+        self.requests = 0
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, encoding="utf-8") as file:
+                    self._cache = json.load(file)
+            except (OSError, ValueError):
+                self._cache = {}
+
+    def _key(self, lat, long) -> str:
+        return "%.*f,%.*f" % (self.precision, lat, self.precision, long)
+
+    def get(self, lat, long) -> Optional[dict]:
+        """ Cached address of a coordinate, if not expired """
+
+        entry = self._cache.get(self._key(lat, long))
+
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+
+        return entry["address"]
+
+    def set(self, lat, long, address: dict):
+        """ Add the address of a coordinate to the cache """
+
+        with self._lock:
+            self._cache[self._key(lat, long)] = {"address": address,
+                                                 "time": time.time()}
+
+    def save(self):
+        """ Remove the expired and oldest addresses and persist them """
+
+        with self._lock:
+            now = time.time()
+            entries = sorted(((k, v) for k, v in self._cache.items()
+                              if now - v["time"] <= self.ttl),
+                             key=lambda item: item[1]["time"])
+            self._cache = dict(entries[-self.max_entries:])
+
+            if self.cache_file is not None:
+                with open(self.cache_file, "w", encoding="utf-8") as file:
+                    json.dump(self._cache, file)
+
+    def _lookup(self, lat, long) -> dict:
+        """ Address of a coordinate from the geocoding service """
+
+        with self._lock:
+            self.requests += 1
+
+        try:
+            address = get_address(lat, long, timeout=self.timeout)
+        except GEOCODING_ERRORS as error:
+            # Left empty and not cached, so it is looked up again
+            logger.warning("Reverse geocoding of (%s, %s) failed: %r",
+                           lat, long, error)
+            return {}
+
+        address = {k: v for k, v in address.items() if k in ADDRESS_COLUMNS}
+        self.set(lat, long, address)
+
+        return address
+
+    def addresses(
+            self,
+            coordinates: DataFrame,
+            lookup: Optional[DataFrame] = None,
+    ) -> DataFrame:
+        """
+        Address of every coordinate.
+
+        :param coordinates: DataFrame with `latitude` and `longitude`
+        :param lookup: DataFrame with `latitude`, `longitude` and the
+            address columns used, in offline mode, for the coordinates
+            not cached
+        :returns: DataFrame with the latitude, longitude, district,
+            city, subregion and region of every coordinate
+        """
+
+        coordinates = coordinates.loc[:, ["latitude", "longitude"]] \
+                                 .drop_duplicates()
+        points = list(zip(coordinates["latitude"], coordinates["longitude"]))
+
+        found = {point: self.get(*point) for point in points}
+        missing = [point for point, address in found.items()
+                   if address is None]
+
+        if missing and self.offline:
+            table = {}
+            if lookup is not None:
+                table = {self._key(lat, long): {col: row.get(col)
+                                                for col in ADDRESS_COLUMNS}
+                         for (lat, long), row in zip(
+                             zip(lookup["latitude"], lookup["longitude"]),
+                             lookup.reindex(columns=ADDRESS_COLUMNS)
+                                   .to_dict("records"))}
+            for point in missing:
+                found[point] = table.get(self._key(*point), {})
+
+        elif missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for point, address in zip(missing,
+                                          pool.map(lambda p: self._lookup(*p),
+                                                   missing)):
+                    found[point] = address
+            self.save()
+
+        return DataFrame([{"latitude": lat, "longitude": long,
+                           **{col: found[(lat, long)].get(col)
+                              for col in ADDRESS_COLUMNS}}
+                          for lat, long in points],
+                         columns=["latitude", "longitude"] + ADDRESS_COLUMNS)
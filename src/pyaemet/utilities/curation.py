@@ -7,7 +7,7 @@ Data Curation
 
 import re
 from datetime import time
-from pandas import Series, isna, DataFrame
+from pandas import Series, isna, DataFrame, to_numeric
 
 
 def update_fields(data_cols, metadata, new_metadata):
@@ -24,6 +24,9 @@ def update_fields(data_cols, metadata, new_metadata):
     return new_metadata
 
 
+_DECIMAL_PATTERN = re.compile(r'(?<=\d),(?=\d)')
+
+
 def _str_decima_notation(value):
     """ Docstring """
 
@@ -31,7 +34,7 @@ def _str_decima_notation(value):
         return value
 
     # change decimal notation '0,0' => '0.0'
-    return re.compile(r'(?<=\d),(?=\d)').sub(".", value)
+    return _DECIMAL_PATTERN.sub(".", value)
 
 
 def decimal_notation(column: Series):
@@ -43,6 +46,37 @@ def decimal_notation(column: Series):
     return column
 
 
+def decimal_notation_columns(data: DataFrame,
+                             numeric: tuple = (),
+                             skip: tuple = ("date", "site")) -> DataFrame:
+    """
+    Change the decimal notation '0,0' => '0.0' of every column of the
+    frame at once, instead of value by value.
+
+    :param data: frame with the raw values downloaded from AEMET
+    :param numeric: columns that are cast to float afterwards. Any comma
+        in them is a decimal separator, so a plain replacement is used
+        instead of the (slower) regular expression.
+    :param skip: columns that are never numeric
+    :returns: the same frame with the decimal notation changed
+    """
+
+    for col in data.columns:
+        if col in skip:
+            continue
+        try:
+            if col in numeric:
+                data[col] = data[col].str.replace(",", ".", regex=False)
+            else:
+                data[col] = data[col].str.replace(_DECIMAL_PATTERN, ".",
+                                                  regex=True)
+        except AttributeError:
+            # Not a column of strings
+            pass
+
+    return data
+
+
 def hr_to_datetime(value):
     """ Docstring """
 
@@ -79,6 +113,74 @@ def convert_hours(column: Series):
     return column
 
 
+_HOUR_PATTERN = re.compile(r'^\s*(-?\d{1,2})(?::(\d{1,2}))?\s*$')
+
+
+def hours_to_minutes(column: Series) -> Series:
+    """
+    Parse AEMET hours ("HH:MM", "HH", "24", "Varias" or "-1") into
+    minutes of the day, for the whole column at once.
+
+    "24" is midnight (0) and "Varias" is kept as -1, the same values
+    `hr_to_datetime` gives as `time(0, 0)` and `time(0, 0, 59)`. Missing
+    or malformed hours are <NA>.
+
+    :param column: column of hours as strings
+    :returns: column of minutes of the day with `Int16` dtype
+    """
+
+    column = column.astype("string")
+    parts = column.str.extract(_HOUR_PATTERN)
+    hour = to_numeric(parts[0], errors="coerce").astype("float64")
+    minute = to_numeric(parts[1], errors="coerce").astype("float64")
+    hour = hour.mask((column == "Varias").fillna(False), -1)
+
+    is_hour = hour.between(0, 23) & (minute.isna() | minute.between(0, 59))
+    minutes = (hour * 60 + minute.fillna(0)).where(is_hour)
+
+    # Only the bare values "24" and "-1" have a special meaning
+    bare = minute.isna()
+    minutes = minutes.mask(bare & (hour == 24), 0) \
+                     .mask(bare & (hour == -1), -1)
+
+    return minutes.astype("Int16")
+
+
+def hours_to_minutes_columns(data: DataFrame, columns: list) -> DataFrame:
+    """ Parse the hours of every column in `columns` into minutes """
+
+    for col in columns:
+        if col in data.columns:
+            data[col] = hours_to_minutes(data[col])
+
+    return data
+
+
+def minutes_to_time(value):
+    """ Minutes of the day into the legacy `time` objects """
+
+    if isna(value):
+        return None
+    if value == -1:
+        return time(0, 0, 59)
+
+    return time(hour=int(value) // 60, minute=int(value) % 60, second=0)
+
+
+def minutes_to_time_columns(data: DataFrame, columns: list) -> DataFrame:
+    """
+    Convert the minutes of the day of every column in `columns` back
+    into `datetime.time` objects, as `convert_hours` did.
+    """
+
+    for col in columns:
+        if col in data.columns:
+            data[col] = data[col].astype(object).map(minutes_to_time) \
+                                 .astype(object)
+
+    return data
+
+
 def remove_newline(data: DataFrame):
 
     return data.replace(r'\n', '', regex=True)
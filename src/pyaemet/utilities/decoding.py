@@ -0,0 +1,215 @@
+"""
+Streaming JSON Decoding
+-------------------------
+
+Incremental decoding of the `datos` of AEMET, a JSON array of flat
+records, while it is downloaded. The records of every piece of text
+received are decoded together and their values appended to one buffer
+per column, so neither the whole body nor a list with a dict per record
+is ever kept in memory.
+
+AEMET encodes its answers in ISO-8859-15. Without a charset in the
+`Content-Type`, the body is decoded as UTF-8 until it is not valid
+UTF-8, and as ISO-8859-15 from then on.
+
+:author Jaimedgp
+"""
+
+import re
+import json
+import codecs
+from typing import Iterator, Optional
+
+# Bytes read from the connection at a time
+CHUNK_SIZE = 64 * 1024
+
+_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def charset(content_type: Optional[str]) -> Optional[str]:
+    """ Charset of a `Content-Type` header, None if it has none """
+
+    match = _CHARSET.search(content_type or "")
+
+    return None if match is None else match[1]
+
+
+def iter_text(chunks, encoding: Optional[str] = None) -> Iterator[str]:
+    """
+    Decode the chunks of bytes of a body, even if a character is split
+    between two chunks.
+
+    :param chunks: iterable of bytes
+    :param encoding: encoding of the body, by default UTF-8 falling back
+        to ISO-8859-15
+    """
+
+    fallback = encoding is None
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")(
+        errors="strict" if fallback else "replace")
+
+    for chunk in chunks:
+        try:
+            yield decoder.decode(chunk)
+        except UnicodeDecodeError:
+            if not fallback:
+                raise
+            # Not UTF-8, the bytes still pending are decoded again
+            pending, _ = decoder.getstate()
+            decoder = codecs.getincrementaldecoder("iso-8859-15")()
+            fallback = False
+            yield decoder.decode(pending + chunk)
+
+    try:
+        yield decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        # A truncated UTF-8 character at the very end
+        pending, _ = decoder.getstate()
+        yield pending.decode("iso-8859-15")
+
+
+class _Values():
+    """ Values of a JSON array decoded from a stream of text """
+
+    def __init__(self, texts: Iterator[str]):
+        self._texts = texts
+        self._buffer = ""
+        self._pos = 0
+        self._exhausted = False
+        self._decode = json.JSONDecoder().raw_decode
+
+    def _refill(self):
+        """ Append the next text to the buffer, dropping the parsed one """
+
+        text = next(self._texts, None)
+        if text is None:
+            self._exhausted = True
+            return
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+
+    def peek(self) -> str:
+        """ Next non-whitespace character, without consuming it """
+
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._exhausted:
+                raise ValueError("Unexpected end of the JSON document")
+            self._refill()
+
+    def _value(self):
+        """ Decode the next value, reading as much as needed """
+
+        self.peek()
+        while True:
+            try:
+                value, end = self._decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._exhausted:
+                    raise
+            else:
+                # A number may continue in the next text
+                if end < len(self._buffer) or self._exhausted:
+                    self._pos = end
+                    return value
+            self._refill()
+
+    def rest(self):
+        """ Decode the rest of the stream as a single document """
+
+        while not self._exhausted:
+            self._refill()
+
+        return json.loads(self._buffer[self._pos:])
+
+    def _batch(self) -> list:
+        """
+        Decode at once every complete value in the buffer. The values are
+        records (objects), so they can only end at a "}".
+        """
+
+        end = self._buffer.rfind("}", self._pos)
+        if end >= self._pos:
+            try:
+                batch = json.loads("[" + self._buffer[self._pos:end + 1]
+                                   + "]")
+            except json.JSONDecodeError:
+                # A "}" inside a string or an incomplete record
+                pass
+            else:
+                self._pos = end + 1
+                return batch
+
+        return [self._value()]
+
+    def __iter__(self) -> Iterator[list]:
+        """ Batches of values of the array, as they are read """
+
+        self._pos += 1
+        if self.peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield self._batch()
+
+            char = self.peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("Expecting ',' delimiter in the JSON "
+                                 + "array, found %r" % char)
+
+
+def decode_columns(chunks, encoding: Optional[str] = None,
+                   skip=()):
+    """
+    Decode a JSON array of records into one list per column as it is
+    read.
+
+    :param chunks: iterable of the bytes of the body
+    :param encoding: encoding of the body, by default UTF-8 falling back
+        to ISO-8859-15
+    :param skip: fields of the records that are not kept
+    :returns: dict of columns, with None where a record lacks the field,
+        or the decoded document if it is not an array (e.g. an error)
+    """
+
+    values = _Values(iter_text(chunks, encoding))
+
+    if values.peek() != "[":
+        return values.rest()
+
+    columns = {}
+    n_rows = 0
+    for batch in values:
+        if not all(isinstance(record, dict) for record in batch):
+            raise ValueError("Expecting a JSON array of records")
+
+        # Fields in the order they first appear, as `DataFrame(records)`
+        keys = list(batch[0])
+        extra = set().union(*batch).difference(keys)
+        if extra:
+            keys += [key for key in dict.fromkeys(key for record in batch
+                                                  for key in record)
+                     if key in extra]
+
+        for key in keys:
+            if key in skip:
+                continue
+            column = columns.get(key)
+            if column is None:
+                # The previous records lack the field
+                column = columns[key] = [None] * n_rows
+            column.extend([record.get(key) for record in batch])
+
+        n_rows += len(batch)
+        for column in columns.values():
+            if len(column) < n_rows:
+                column.extend([None] * (n_rows - len(column)))
+
+    return columns
@@ -40,9 +40,9 @@ OBSERVATIONS_TRANSLATION = {
     "temp_max": {"id": "tmax",
                  "dtype": "float64"},
     "hr_temp_min": {"id": "horatmin",
-                    "dtype": "object"},
+                    "dtype": "Int16"},
     "hr_temp_max": {"id": "horatmax",
-                    "dtype": "object"},
+                    "dtype": "Int16"},
     "wnd_dir": {"id": "dir",
                 "dtype": "float64"},
     "wnd_spd": {"id": "velmedia",
@@ -50,15 +50,15 @@ OBSERVATIONS_TRANSLATION = {
     "wnd_gst": {"id": "racha",
                 "dtype": "float64"},
     "hr_wnd_gst": {"id": "horaracha",
-                   "dtype": "object"},
+                   "dtype": "Int16"},
     "press_max": {"id": "presMax",
                   "dtype": "float64"},
     "hr_press_max": {"id": "horaPresMax",
-                     "dtype": "object"},
+                     "dtype": "Int16"},
     "press_min": {"id": "presMin",
                   "dtype": "float64"},
     "hr_press_min": {"id": "horaPresMin",
-                     "dtype": "object"},
+                     "dtype": "Int16"},
     "hr_sun": {"id": "sol",
                "dtype": "float64"},
 }
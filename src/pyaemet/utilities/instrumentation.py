@@ -0,0 +1,185 @@
+"""
+Request Instrumentation
+-------------------------
+
+Hooks to observe the requests sent to AEMET OpenData and the parsing of
+their answers, and a built-in collector of their statistics.
+
+Every hook is a callable receiving one event (a dict) per HTTP request
+(`kind` "request") and per parsing step (`kind` "parse"):
+
+    endpoint   endpoint requested, e.g. "diarios/datos/"
+    stage      "api", "datos" or "metadatos" for the requests, the name
+               of the step for the parsing
+    latency    seconds spent in the request (without the time waiting for
+               the scheduler) or in the parsing step
+    status     HTTP status of the last answer, None after an exception
+    retries    times the request was retried after a 429
+    bytes      size of the (decompressed) body of the answer
+
+:author Jaimedgp
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional
+
+from pandas import DataFrame
+
+
+logger = logging.getLogger(__name__)
+
+# Key of the metadata with the events of the requests of a result
+STATS_KEY = "requests_stats"
+
+_COLUMNS = ["kind", "endpoint", "stage", "latency", "status", "retries",
+            "bytes"]
+
+
+def untimed(step: str):
+    """ Step timer that does not time anything """
+
+    return nullcontext()
+
+
+class RequestTrace():
+    """
+    Events of the requests and parsing steps of a single call to an
+    endpoint, which are also sent to the hooks as they happen.
+
+    :param endpoint: endpoint of the call
+    :param emit: function sending every event to the hooks
+    """
+
+    def __init__(self, endpoint: str, emit: Optional[Callable] = None):
+        self.endpoint = endpoint
+        self.events = []
+        self._emit = emit
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, stage: str, latency: float, **fields):
+        """ Keep an event of the call and send it to the hooks """
+
+        event = {"kind": kind, "endpoint": self.endpoint, "stage": stage,
+                 "latency": latency, **fields}
+
+        with self._lock:
+            self.events.append(event)
+
+        if self._emit is not None:
+            self._emit(event)
+
+    @contextmanager
+    def step(self, name: str):
+        """ Time a parsing step """
+
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record("parse", name, time.perf_counter() - tic)
+
+
+class RequestStats():
+    """
+    Thread-safe hook collecting the events of every request and parsing
+    step.
+
+    Parameters
+    ----------
+    max_events : int, optional
+        Maximum number of events kept, the oldest ones are dropped. By
+        default 100000.
+    """
+
+    def __init__(self, max_events: Optional[int] = 100000):
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        with self._lock:
+            self._events.append(event)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def events(self) -> list:
+        with self._lock:
+            return list(self._events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def to_frame(self) -> DataFrame:
+        """ One row per event """
+
+        return DataFrame(self.events, columns=_COLUMNS)
+
+    def summary(self) -> DataFrame:
+        """
+        Statistics of the events grouped by kind, endpoint and stage.
+
+        Returns
+        -------
+        DataFrame
+            Number of `events`, total `retries` and `bytes` and the
+            total, mean and maximum `latency` of every group.
+        """
+
+        return summarize(self.events)
+
+
+def summarize(events: list) -> DataFrame:
+    """ Statistics of a list of events grouped by kind, endpoint and stage """
+
+    frame = DataFrame(events, columns=_COLUMNS)
+
+    return frame.groupby(["kind", "endpoint", "stage"], sort=False) \
+                .agg(events=("latency", "size"),
+                     retries=("retries", "sum"),
+                     bytes=("bytes", "sum"),
+                     latency=("latency", "sum"),
+                     mean_latency=("latency", "mean"),
+                     max_latency=("latency", "max"))
+
+
+def merge_metadata(metadata: dict, other: dict) -> dict:
+    """
+    Update the metadata of a result with the one of another part of it,
+    keeping the events of the requests of both. The events of `metadata`
+    are extended in place, so merging many parts is linear.
+    """
+
+    events = metadata.get(STATS_KEY)
+    metadata.update(other)
+
+    if events is None:
+        # A list of its own, never the one of the part merged
+        events = list(other.get(STATS_KEY, []))
+    else:
+        events.extend(other.get(STATS_KEY, []))
+    if events or STATS_KEY in metadata:
+        metadata[STATS_KEY] = events
+
+    return metadata
+
+
+def emit_to(hooks: list) -> Callable:
+    """
+    Function sending an event to every hook. A failing hook is logged
+    and never interrupts the request.
+    """
+
+    def emit(event: dict):
+        for hook in list(hooks):
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Request hook %r failed", hook)
+
+    return emit
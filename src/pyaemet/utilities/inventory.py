@@ -0,0 +1,233 @@
+"""
+Sites Inventory
+-----------------
+
+Typed reading of the inventory of the AEMET climatic stations and its
+binary formats, loaded without parsing any text:
+
+- a single NumPy structured array (`.npy`) with one typed field per
+  column, which can be memory-mapped. The observations cache stores the
+  observations of every site with the same format.
+- the compact inventory shipped with the package (`.npz`), where the
+  text columns are stored as codes of the categories they share.
+
+Build the compact inventory shipped with the package from its CSV with:
+
+    python -c "from pyaemet.utilities.inventory import build_inventory; \
+build_inventory()"
+
+:author Jaimedgp
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+from pandas import DataFrame, read_csv, concat, factorize, array as pd_array
+
+from .dictionaries import SITES_TRANSLATION
+
+# Field marking the missing values of a text column
+_MISSING = "{}__na"
+
+
+def csv_dtypes() -> dict:
+    """ dtypes of the inventory columns when they are read from a CSV """
+
+    return {k: v["dtype"] for k, v in SITES_TRANSLATION.items()}
+
+
+def read_inventory_csv(data_fl) -> DataFrame:
+    """
+    Read an inventory CSV with the dtypes of `SITES_TRANSLATION`, so the
+    codes such as the `synindic` keep their leading zeros.
+
+    :param data_fl: path or file object of the CSV
+    """
+
+    return read_csv(data_fl, dtype=csv_dtypes(),
+                    float_precision="round_trip")
+
+
+def to_records(data: DataFrame) -> np.ndarray:
+    """
+    Pack the columns of the inventory into a structured array. The text
+    columns are stored as fixed-width unicode with a boolean field of
+    their missing values.
+
+    :param data: sites' inventory, or any DataFrame of numeric, datetime
+        and text columns
+    :returns: structured array with one record per row
+    """
+
+    fields = []
+    values = {}
+
+    for col in data.columns:
+        column = data[col]
+        if column.dtype.kind == "M":
+            values[col] = column.to_numpy(dtype="datetime64[ns]")
+            fields.append((col, "M8[ns]"))
+            continue
+        if column.dtype.kind in "fiub":
+            values[col] = column.to_numpy(dtype="float64", na_value=np.nan)
+            fields.append((col, "f8"))
+            continue
+
+        missing = column.isna().to_numpy()
+        text = column.astype(object).where(~missing, "").astype(str) \
+                     .to_numpy(dtype=str)
+        values[col] = text
+        values[_MISSING.format(col)] = missing
+        fields.append((col, "U%d" % max(1, text.dtype.itemsize // 4)))
+        fields.append((_MISSING.format(col), "?"))
+
+    records = np.empty(len(data), dtype=fields)
+    for name, value in values.items():
+        records[name] = value
+
+    return records
+
+
+def from_records(records: np.ndarray, dtypes: dict = None) -> DataFrame:
+    """
+    Unpack a structured array built by `to_records` into the inventory,
+    with the dtypes of `SITES_TRANSLATION`.
+
+    :param records: structured array, even memory-mapped
+    :param dtypes: dtypes of the columns, by default the ones of the
+        inventory
+    :returns: sites' inventory
+    """
+
+    names = [name for name in records.dtype.names
+             if not name.endswith(_MISSING.format(""))]
+    if dtypes is None:
+        dtypes = csv_dtypes()
+
+    columns = {}
+    for name in names:
+        values = np.asarray(records[name])
+        if values.dtype.kind == "U":
+            values = values.astype(object)
+            values[np.asarray(records[_MISSING.format(name)])] = None
+        columns[name] = pd_array(values, dtype=dtypes.get(name,
+                                                          values.dtype))
+
+    return DataFrame(columns)
+
+
+def save_inventory(data: DataFrame, path):
+    """ Write the inventory as a `.npy` structured array """
+
+    np.save(path, to_records(data), allow_pickle=False)
+
+
+def load_inventory(path, mmap: bool = True) -> DataFrame:
+    """
+    Read an inventory written by `save_inventory`.
+
+    :param path: path or file object of the `.npy` file
+    :param mmap: memory-map the file instead of reading it
+    """
+
+    # Only files on disk can be memory-mapped
+    mmap = mmap and isinstance(path, (str, os.PathLike))
+
+    records = np.load(path, mmap_mode="r" if mmap else None,
+                      allow_pickle=False)
+
+    return from_records(records)
+
+
+def to_categories(data: DataFrame) -> dict:
+    """
+    Encode the inventory as a structured array whose text columns are
+    stored as codes, -1 for the missing values, of the categories shared
+    by all of them.
+
+    :param data: sites' inventory, or any DataFrame of numeric and text
+        columns
+    :returns: the structured array as `records` and the fixed-width
+        unicode `categories`
+    """
+
+    text = [col for col in data.columns if data[col].dtype.kind not in "fiub"]
+    codes, categories = factorize(concat([data[col].astype(object)
+                                          for col in text],
+                                         ignore_index=True))
+    code_dtype = np.int16 if len(categories) < 2**15 else np.int32
+    codes = dict(zip(text, np.split(codes.astype(code_dtype),
+                                    len(text)) if text else []))
+
+    records = np.empty(len(data),
+                       dtype=[(col, code_dtype if col in codes else "f8")
+                              for col in data.columns])
+    for col in data.columns:
+        records[col] = codes[col] if col in codes \
+            else data[col].to_numpy(dtype="float64", na_value=np.nan)
+
+    return {"records": records,
+            "categories": np.asarray(categories, dtype=str)}
+
+
+def from_categories(records: np.ndarray, categories: np.ndarray,
+                    dtypes: dict = None) -> DataFrame:
+    """
+    Decode the arrays built by `to_categories` into the inventory, with
+    the dtypes of `SITES_TRANSLATION`.
+
+    :param records: structured array of numbers and codes
+    :param categories: categories of the text columns
+    :param dtypes: dtypes of the columns, by default the ones of the
+        inventory
+    :returns: sites' inventory
+    """
+
+    if dtypes is None:
+        dtypes = csv_dtypes()
+    # The code -1 takes the None appended to the categories
+    categories = np.append(categories.astype(object), None)
+
+    columns = {}
+    for name in records.dtype.names:
+        values = records[name]
+        if values.dtype.kind == "i":
+            values = categories[values]
+        columns[name] = pd_array(values, dtype=dtypes.get(name,
+                                                          values.dtype))
+
+    return DataFrame(columns)
+
+
+def save_compact_inventory(data: DataFrame, path):
+    """ Write the inventory as a compressed `.npz` of categories' codes """
+
+    np.savez_compressed(path, **to_categories(data))
+
+
+def load_compact_inventory(path) -> DataFrame:
+    """
+    Read an inventory written by `save_compact_inventory`.
+
+    :param path: path or file object of the `.npz` file
+    """
+
+    with np.load(path, allow_pickle=False) as npz:
+        return from_categories(npz["records"], npz["categories"])
+
+
+def build_inventory(folder: Optional[str] = None) -> DataFrame:
+    """
+    Compile the `data.csv` inventory of a folder, by default the one
+    shipped with the package, into the compact `data.npz`.
+    """
+
+    if folder is None:
+        folder = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                              "static", "sites")
+
+    data = read_inventory_csv(os.path.join(folder, "data.csv"))
+    save_compact_inventory(data, os.path.join(folder, "data.npz"))
+
+    return data
@@ -0,0 +1,276 @@
+"""
+Chunk Planner
+---------------
+
+Adaptive size of the (date interval, sites batch) chunks requested to
+AEMET OpenData, which shrinks when a chunk is too big to be served and
+grows back after successful requests.
+
+:author Jaimedgp
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+import requests
+
+
+# Errors of AEMET, or of the connection, caused by a too big chunk. A
+# connection that can not be established (DNS, refused...) says nothing
+# about the size of the chunk, only a server too slow to answer it does.
+OVERSIZE_STATUS = (408, 413, 414, 500, 502, 503, 504)
+OVERSIZE_ERRORS = (requests.ReadTimeout,)
+
+# `descripcion` of AEMET when the period or the sites asked are too many
+_TOO_LARGE = re.compile(r"rango|superior a|demasiad|too large|too many",
+                        re.IGNORECASE)
+
+
+class ChunkPlanner():
+    """
+    Thread-safe planner of the chunks of every endpoint.
+
+    Every endpoint starts with the largest chunks AEMET accepts. When a
+    chunk fails by its size (timeouts, dropped connections or 5xx/413
+    answers) it is split in halves, that are requested again, and the
+    chunk size of the endpoint is multiplied by `shrink`. After every
+    successful chunk the size grows by `grow` up to the largest one that
+    has not failed yet. The sizes that failed are forgotten after
+    `forget_after` successful chunks or `forget_ttl` seconds.
+
+    Parameters
+    ----------
+    max_days : int, optional
+        Largest number of days of a chunk, by default 4 years.
+    max_sites : int, optional
+        Largest number of sites of a chunk, by default 25, the maximum
+        AEMET accepts.
+    min_days : int, optional
+        Smallest number of days of a chunk, by default 31.
+    grow : float, optional
+        Factor applied to the chunk size after a successful chunk, by
+        default 1.25.
+    shrink : float, optional
+        Factor applied to the chunk size after an oversize chunk, by
+        default 0.5.
+    state_file : str, os.PathLike, optional
+        JSON file where the chunk size of every endpoint is remembered
+        between sessions.
+    forget_after : int, optional
+        Successful chunks after which the sizes that failed are
+        forgotten, so the chunks can grow back to the largest size, by
+        default 20.
+    forget_ttl : float, optional
+        Seconds after which the sizes that failed are forgotten, by
+        default 1 day.
+    """
+
+    def __init__(
+            self,
+            max_days: int = 4 * 365 + 1,
+            max_sites: int = 25,
+            min_days: int = 31,
+            grow: float = 1.25,
+            shrink: float = 0.5,
+            state_file: Optional[str] = None,
+            forget_after: int = 20,
+            forget_ttl: float = 24 * 3600.0,
+    ):
+
+        self.max_days = max_days
+        self.max_sites = max_sites
+        self.min_days = min(min_days, max_days)
+        self.grow = grow
+        self.shrink = shrink
+        self.state_file = None if state_file is None \
+            else os.fspath(state_file)
+        self.forget_after = forget_after
+        self.forget_ttl = forget_ttl
+
+        self._state = {}
+        self._lock = threading.Lock()
+
+        if self.state_file is not None:
+            try:
+                with open(self.state_file, encoding="utf-8") as file:
+                    self._state = json.load(file)
+            except (OSError, ValueError):
+                self._state = {}
+
+    def size(self, endpoint: str) -> tuple:
+        """
+        Current chunk size of an endpoint.
+
+        :returns: number of days and number of sites of the chunks
+        """
+
+        with self._lock:
+            state = self._state.get(endpoint, {})
+
+        return (min(self.max_days, state.get("days", self.max_days)),
+                min(self.max_sites, state.get("sites", self.max_sites)))
+
+    def plan(self, endpoint: str, start_dt: date, end_dt: date,
+             sites: list) -> list:
+        """
+        Split the days between `start_dt` and `end_dt` and the `sites`
+        in chunks of the current size of the endpoint.
+
+        :returns: list of ((start, end), sites) chunks, in the order of
+            the date intervals and sites batches
+        """
+
+        days, n_sites = self.size(endpoint)
+
+        intervals = []
+        start = start_dt
+        while start <= end_dt:
+            end = min(end_dt, start + timedelta(days=days - 1))
+            intervals.append((start, end))
+            start = end + timedelta(days=1)
+
+        batches = [sites[i:i+n_sites] for i in range(0, len(sites), n_sites)]
+
+        return [(interval, batch) for interval in intervals
+                for batch in batches]
+
+    def split(self, chunk: tuple) -> list:
+        """
+        Halve a chunk that was too big: its days, while it is longer than
+        `min_days`, or else its sites.
+
+        :returns: the smaller chunks or an empty list if it can not be
+            split anymore
+        """
+
+        (start, end), sites = chunk
+        days = (end - start).days + 1
+
+        if days > self.min_days:
+            middle = start + timedelta(days=days // 2 - 1)
+            return [((start, middle), sites),
+                    ((middle + timedelta(days=1), end), sites)]
+
+        if len(sites) > 1:
+            middle = len(sites) // 2
+            return [((start, end), sites[:middle]),
+                    ((start, end), sites[middle:])]
+
+        return []
+
+    def success(self, endpoint: str, chunk: tuple):
+        """ Grow the chunk size of an endpoint after a successful chunk """
+
+        (start, end), sites = chunk
+
+        with self._lock:
+            state = self._state.setdefault(endpoint, {})
+            forgotten = self._forget_failures(state)
+            days = state.get("days", self.max_days)
+            n_sites = state.get("sites", self.max_sites)
+            # Only a chunk as big as the current size proves it works
+            # never beyond the smallest size that already failed
+            if (end - start).days + 1 >= days:
+                state["days"] = min(state.get("failed_days",
+                                              self.max_days + 1) - 1,
+                                    self.max_days,
+                                    max(days + 1, int(days * self.grow)))
+            if len(sites) >= n_sites:
+                state["sites"] = min(state.get("failed_sites",
+                                               self.max_sites + 1) - 1,
+                                     self.max_sites,
+                                     max(n_sites + 1,
+                                         int(n_sites * self.grow)))
+            changed = (forgotten
+                       or state.get("days", days) != days
+                       or state.get("sites", n_sites) != n_sites)
+
+        if changed:
+            self.save()
+
+    def _forget_failures(self, state: dict) -> bool:
+        """
+        Count a success and forget the sizes that failed once there were
+        `forget_after` successes or `forget_ttl` seconds since the last
+        failure, as it may have been a transient problem of AEMET.
+
+        :returns: whether the failures were forgotten
+        """
+
+        if "failed_at" not in state:
+            return False
+
+        state["successes"] = state.get("successes", 0) + 1
+        if (state["successes"] < self.forget_after
+                and time.time() - state["failed_at"] <= self.forget_ttl):
+            return False
+
+        for key in ("failed_days", "failed_sites", "failed_at", "successes"):
+            state.pop(key, None)
+
+        return True
+
+    def failure(self, endpoint: str, chunk: tuple):
+        """ Shrink the chunk size of an endpoint after an oversize chunk """
+
+        (start, end), sites = chunk
+
+        chunk_days = (end - start).days + 1
+
+        # Halve the failed chunk, not the current size, so the chunks that
+        # fail at the same time do not shrink it several times
+        with self._lock:
+            state = self._state.setdefault(endpoint, {})
+            state["failed_at"] = time.time()
+            state["successes"] = 0
+            days = state.get("days", self.max_days)
+            n_sites = state.get("sites", self.max_sites)
+            if chunk_days > self.min_days:
+                state["failed_days"] = min(chunk_days,
+                                           state.get("failed_days",
+                                                     chunk_days))
+                state["days"] = max(self.min_days,
+                                    min(days, int(chunk_days * self.shrink)))
+            else:
+                state["failed_sites"] = min(len(sites),
+                                            state.get("failed_sites",
+                                                      len(sites)))
+                state["days"] = min(days, chunk_days)
+                state["sites"] = max(1, min(n_sites,
+                                            int(len(sites) * self.shrink)))
+
+        self.save()
+
+    @staticmethod
+    def is_oversize(metadata: dict) -> bool:
+        """
+        Check if the error returned by AEMET is due to the chunk size: a
+        5xx or timeout status, or a `descripcion` saying the period or
+        the number of sites is too large.
+        """
+
+        try:
+            estado = int(metadata.get("estado"))
+        except (TypeError, ValueError):
+            return False
+
+        if estado in OVERSIZE_STATUS:
+            return True
+
+        return estado != 200 and bool(
+            _TOO_LARGE.search(str(metadata.get("descripcion", ""))))
+
+    def save(self):
+        """ Remember the chunk sizes in the `state_file` """
+
+        if self.state_file is None:
+            return
+
+        with self._lock:
+            with open(self.state_file, "w", encoding="utf-8") as file:
+                json.dump(self._state, file, indent=4)
@@ -0,0 +1,161 @@
+"""
+Request Scheduler
+-------------------
+
+Token bucket that paces the requests sent to AEMET OpenData and adapts
+its rate to the `429 Too Many Requests` answers of the API.
+
+:author Jaimedgp
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+class RateLimiter():
+    """
+    Thread-safe token bucket with additive increase / multiplicative
+    decrease of its rate.
+
+    Every request takes a token from the bucket, which is refilled at
+    `rate` tokens per second up to `burst` tokens. When AEMET answers
+    with a 429 the rate is multiplied by `decrease` and, after every
+    successful request, it grows again by `increase` up to `max_rate`.
+
+    Parameters
+    ----------
+    rate : float, optional
+        Initial requests per second, by default 1.0.
+    burst : int, optional
+        Maximum number of requests sent in a row without waiting, by
+        default 5.
+    min_rate : float, optional
+        Lower bound of the rate, by default 0.05 requests per second.
+    max_rate : float, optional
+        Upper bound of the rate, by default 10 requests per second.
+    increase : float, optional
+        Requests per second added after every successful request, by
+        default 0.05.
+    decrease : float, optional
+        Factor applied to the rate after every 429, by default 0.5.
+    max_retries : int, optional
+        Times a rate-limited request is retried before giving up, by
+        default 6.
+    backoff : float, optional
+        Base, in seconds, of the exponential backoff between retries
+        when AEMET gives no `Retry-After` hint, by default 2.0.
+    max_backoff : float, optional
+        Maximum seconds to wait between retries, even when AEMET asks
+        to wait longer, by default 60.
+    jitter : float, optional
+        Random fraction added to every backoff so parallel requests do
+        not retry at the same time, by default 0.25.
+    """
+
+    def __init__(
+            self,
+            rate: float = 1.0,
+            burst: int = 5,
+            min_rate: float = 0.05,
+            max_rate: float = 10.0,
+            increase: float = 0.05,
+            decrease: float = 0.5,
+            max_retries: int = 6,
+            backoff: float = 2.0,
+            max_backoff: float = 60.0,
+            jitter: float = 0.25,
+    ):
+
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+        self.throttled = 0
+
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token from the bucket, waiting until it is available.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            # Reserve the token even if it is not available yet, so the
+            # waiting threads are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def success(self):
+        """ Grow the rate after a request that was not rate limited """
+
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttle(self, attempt: int, retry_after: float = None) -> float:
+        """
+        Slow down after a 429 and return the seconds to wait before
+        retrying the request.
+
+        :param attempt: number of retries already done for the request
+        :param retry_after: seconds AEMET asked to wait, if any, up to
+            `max_backoff`
+        :returns: seconds to wait, including the random jitter
+        """
+
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Empty the bucket so the rest of threads also wait
+            self._tokens = min(self._tokens, 0.0)
+
+        if retry_after is None:
+            retry_after = self.backoff * 2 ** attempt
+        # Nor a long hint of AEMET blocks the request for longer
+        retry_after = min(self.max_backoff, retry_after)
+
+        return retry_after * (1 + self.jitter * random.random())
+
+    @staticmethod
+    def retry_after(response) -> float:
+        """
+        Read the `Retry-After` header of a response, given either in
+        seconds or as an HTTP date.
+
+        :returns: seconds to wait or `None` if there is no hint
+        """
+
+        value = response.headers.get("Retry-After")
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, (parsedate_to_datetime(value)
+                             - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,122 @@
+"""
+HTTP Session
+--------------
+
+Pooled keep-alive HTTP session shared by all the requests made to the
+AEMET OpenData API.
+
+:author Jaimedgp
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    `HTTPAdapter` that counts every socket actually opened by its
+    connection pools, so reused keep-alive connections can be told
+    apart from new ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.connections = 0
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        adapter = self
+        pool_classes = {}
+        for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme \
+                                    .items():
+
+            class _Connection(pool_cls.ConnectionCls):
+                def connect(self):
+                    adapter._count_connection()
+                    return super().connect()
+
+            pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,),
+                                        {"ConnectionCls": _Connection})
+
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+
+class AemetSession():
+    """
+    Thin wrapper around `requests.Session` that keeps the TCP/TLS
+    connections to AEMET alive between calls, so the three requests of
+    every chunk (API call, `datos` and `metadatos`) reuse the same
+    connection instead of opening a new one each.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        Maximum number of connections kept alive per host, by default 10.
+    connect_timeout : float, optional
+        Seconds to wait while establishing a connection, by default 10.
+    read_timeout : float, optional
+        Seconds to wait for the server to send data, by default 60.
+    gzip : bool, optional
+        Negotiate gzip/deflate compressed responses, by default True.
+    """
+
+    def __init__(
+            self,
+            pool_size: int = 10,
+            connect_timeout: float = 10.0,
+            read_timeout: float = 60.0,
+            gzip: bool = True,
+    ):
+
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        self._requests = 0
+        self._lock = threading.Lock()
+
+        self._session = requests.Session()
+        self._adapter = _PooledAdapter(pool_connections=pool_size,
+                                       pool_maxsize=pool_size)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._session.headers.update(
+            {"Accept-Encoding": "gzip, deflate" if gzip else "identity"})
+
+    def get(self, url, **kwargs):
+        """ GET request through the pooled session """
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        with self._lock:
+            self._requests += 1
+
+        return self._session.get(url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Connection reuse statistics of the pooled session.
+
+        Returns
+        -------
+        dict
+            Number of `requests` sent, new `connections` opened and
+            `reused` connections.
+        """
+
+        return {"requests": self._requests,
+                "connections": self._adapter.connections,
+                "reused": self._requests - self._adapter.connections}
+
+    def close(self):
+        """ Close every connection kept alive in the pool """
+
+        self._session.close()
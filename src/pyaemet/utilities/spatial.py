@@ -0,0 +1,211 @@
+"""
+Spatial
+---------
+
+Distances between coordinates on the Earth's surface.
+
+:author Jaimedgp
+"""
+
+import numpy as np
+
+
+def haversine(latitudes, longitudes, latitude, longitude,
+              radius: float = 6371.0):
+    """
+    Great-circle distance between arrays of coordinates and a point
+    using the haversine formula, which is numerically stable for short
+    distances:
+
+        dist = 2 * radius *
+            arcsin{sqrt[sin²((lat1 - lat2)/2) +
+                        cos(lat1)*cos(lat2)*sin²((long1 - long2)/2)]}
+
+    :param latitudes: array of latitudes in degrees
+    :param longitudes: array of longitudes in degrees
+    :param latitude: latitude of the point in degrees
+    :param longitude: longitude of the point in degrees
+    :param radius: earth radius
+
+    :returns: array of distances in kilometers (Due to radius is given in
+        km)
+    """
+
+    lat1 = np.deg2rad(np.asarray(latitudes, dtype="float64"))
+    lon1 = np.deg2rad(np.asarray(longitudes, dtype="float64"))
+    lat2, lon2 = np.deg2rad(latitude), np.deg2rad(longitude)
+
+    hav = (np.sin((lat1 - lat2) / 2) ** 2
+           + np.cos(lat1) * np.cos(lat2) * np.sin((lon1 - lon2) / 2) ** 2)
+
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0)))
+
+
+def unit_vectors(latitudes, longitudes):
+    """ Coordinates in degrees into (N, 3) unit vectors of the sphere """
+
+    lat = np.deg2rad(np.asarray(latitudes, dtype="float64"))
+    lon = np.deg2rad(np.asarray(longitudes, dtype="float64"))
+
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+class SitesIndex():
+    """
+    Spatial index of a set of sites for nearest-sites and radius
+    queries.
+
+    The sites are stored once as unit vectors, so every query is a
+    single matrix product: the closer a site, the bigger the dot product
+    with the query point. Only the candidates inside `max_distance` and
+    among the `n_near` closest are selected, with a partial sort instead
+    of sorting every site, and their exact haversine distance computed.
+
+    :param latitudes: array of latitudes of the sites in degrees
+    :param longitudes: array of longitudes of the sites in degrees
+    """
+
+    def __init__(self, latitudes, longitudes):
+
+        self.latitudes = np.array(latitudes, dtype="float64")
+        self.longitudes = np.array(longitudes, dtype="float64")
+        self.vectors = unit_vectors(self.latitudes, self.longitudes)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def matches(self, latitudes, longitudes) -> bool:
+        """ Check if the index was built from the same coordinates """
+
+        return (np.array_equal(self.latitudes, latitudes, equal_nan=True)
+                and np.array_equal(self.longitudes, longitudes,
+                                   equal_nan=True))
+
+    def query(
+            self,
+            latitude: float,
+            longitude: float,
+            n_near: int = None,
+            max_distance: float = None,
+            radius: float = 6371.0,
+    ):
+        """
+        Sites closest to a point.
+
+        :param latitude: latitude of the point in degrees
+        :param longitude: longitude of the point in degrees
+        :param n_near: maximum number of sites returned, all if None
+        :param max_distance: maximum distance, in km, of the sites
+        :param radius: earth radius
+
+        :returns: positions of the sites and their distances to the
+            point, sorted by distance (and by position on ties)
+        """
+
+        dots = self.vectors @ unit_vectors([latitude], [longitude])[0]
+        candidates = np.flatnonzero(~np.isnan(dots))
+
+        if max_distance is not None:
+            # Small margin so the exact distance decides the boundary
+            min_dot = np.cos(min(np.pi, max_distance / radius)) - 1e-9
+            candidates = candidates[dots[candidates] >= min_dot]
+
+        if n_near is not None and len(candidates) > n_near:
+            if n_near <= 0:
+                candidates = candidates[:0]
+            else:
+                # Keep every tie of the n_near-th closest site, the
+                # stable sort below decides which of them are returned
+                kth = -np.partition(-dots[candidates], n_near - 1)[n_near-1]
+                candidates = candidates[dots[candidates] >= kth - 1e-12]
+
+        distances = haversine(self.latitudes[candidates],
+                              self.longitudes[candidates],
+                              latitude, longitude, radius)
+
+        if max_distance is not None:
+            inside = distances <= max_distance
+            candidates, distances = candidates[inside], distances[inside]
+
+        order = np.lexsort((candidates, distances))[:n_near]
+
+        return candidates[order], distances[order]
+
+    def query_many(
+            self,
+            latitudes,
+            longitudes,
+            n_near: int = None,
+            max_distance: float = None,
+            radius: float = 6371.0,
+            chunk_size: int = 2048,
+    ):
+        """
+        Sites closest to many points at once. The points are processed
+        in chunks of `chunk_size`, so memory stays bounded by
+        `chunk_size` x number of sites whatever the number of points.
+
+        :param latitudes: array of latitudes of the points in degrees
+        :param longitudes: array of longitudes of the points in degrees
+        :param n_near: maximum number of sites per point, all if None
+        :param max_distance: maximum distance, in km, of the sites
+        :param radius: earth radius
+        :param chunk_size: number of points processed at once
+
+        :returns: positions of the points, positions of the sites, their
+            distances and their ranks (1 for the closest site), sorted by
+            point and distance
+        """
+
+        latitudes = np.asarray(latitudes, dtype="float64")
+        longitudes = np.asarray(longitudes, dtype="float64")
+
+        n_sites = len(self)
+        k = n_sites if n_near is None else max(0, min(n_near, n_sites))
+
+        results = []
+        for start in range(0, len(latitudes), chunk_size):
+            lats = latitudes[start:start+chunk_size]
+            lons = longitudes[start:start+chunk_size]
+
+            dots = unit_vectors(lats, lons) @ self.vectors.T
+            dots[np.isnan(dots)] = -np.inf
+
+            if k < n_sites:
+                sites = np.argpartition(-dots, k - 1, axis=1)[:, :k] \
+                        if k > 0 else np.empty((len(lats), 0), dtype=int)
+            else:
+                sites = np.broadcast_to(np.arange(n_sites),
+                                        (len(lats), n_sites))
+
+            points = np.broadcast_to(np.arange(len(lats))[:, None],
+                                     sites.shape).ravel()
+            sites = sites.ravel()
+
+            distances = haversine(self.latitudes[sites],
+                                  self.longitudes[sites],
+                                  lats[points], lons[points], radius)
+
+            keep = ~np.isnan(distances)
+            if max_distance is not None:
+                keep &= distances <= max_distance
+            points, sites, distances = (points[keep], sites[keep],
+                                        distances[keep])
+
+            order = np.lexsort((sites, distances, points))
+            points, sites, distances = (points[order], sites[order],
+                                        distances[order])
+
+            # Rank inside every point: position minus first of the point
+            first = np.searchsorted(points, points, side="left")
+            ranks = np.arange(len(points)) - first + 1
+
+            results.append((points + start, sites, distances, ranks))
+
+        if not results:
+            empty = np.empty(0, dtype=int)
+            return empty, empty, np.empty(0), empty
+
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
@@ -0,0 +1,295 @@
+"""
+Record/Replay Transport
+-------------------------
+
+Transports sending the HTTP requests of `_AemetApiRequest` in place of
+its pooled session: `RecordingTransport` keeps every answer of AEMET in
+a compact archive on disk and `ReplayTransport` answers from it later,
+without any network access nor pacing of the requests.
+
+    with RecordingTransport("pull.zip") as transport:
+        AemetClima(apikey, transport=transport).daily_clima(...)
+
+    with ReplayTransport("pull.zip") as transport:
+        AemetClima(apikey, transport=transport).daily_clima(...)
+
+The archive is a zip file with one deflated entry per URL, whose
+comment keeps the URL, status and content type of the answer. The
+`metadatos` document of every endpoint is archived by its endpoint, as
+it is downloaded only once and kept in the metadata cache.
+
+:author Jaimedgp
+"""
+
+import os
+import json
+import hashlib
+import weakref
+import threading
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+def archive_key(url: str, params: dict = None) -> str:
+    """
+    Key of a request in the archive: its URL and query, without the API
+    key, so the archives can be shared and replayed with any key.
+    """
+
+    params = {k: v for k, v in (params or {}).items() if k != "api_key"}
+    if not params:
+        return url
+
+    return (url + ("&" if "?" in url else "?")
+            + urlencode(sorted(params.items())))
+
+
+def metadatos_key(endpoint: str) -> str:
+    """ Key of the `metadatos` document of an endpoint in the archive """
+
+    return "metadatos:" + endpoint
+
+
+class ResponseArchive():
+    """
+    Thread-safe zip archive of HTTP answers keyed by URL.
+
+    A single handle of the zip file is kept open while the archive is
+    used: answers are appended to it and read from it on demand, never
+    kept in memory. The archive is only complete on disk, with its
+    central directory, once it is closed, which is done at the exit of
+    the interpreter at the latest.
+
+    Parameters
+    ----------
+    path : str, os.PathLike
+        Zip file of the archive, created when the first answer is added.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(os.fspath(path))
+
+        self._entries = {}
+        self._zip = None
+        self._writable = False
+        self._finalizer = None
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            self._open("r")
+            for info in self._zip.infolist():
+                entry = json.loads(info.comment)
+                self._entries[entry["key"]] = dict(entry, name=info.filename)
+
+    def _open(self, mode: str):
+        """ Open the handle of the zip file, closing the previous one """
+
+        if self._zip is not None:
+            self._finalizer()
+        self._zip = zipfile.ZipFile(self.path, mode)
+        self._writable = mode == "a"
+        self._finalizer = weakref.finalize(self, self._zip.close)
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> list:
+        return list(self._entries)
+
+    def add(self, key: str, status: int, content_type: str, body: bytes):
+        """ Write an answer, unless its key is already archived """
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            if not self._writable:
+                self._open("a")
+
+            entry = {"key": key, "status": status,
+                     "content_type": content_type}
+            info = zipfile.ZipInfo(self._name(key))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.comment = json.dumps(entry).encode("utf-8")
+
+            self._zip.writestr(info, body)
+
+            self._entries[key] = dict(entry, name=info.filename)
+
+    def get(self, key: str) -> tuple:
+        """
+        Archived answer of a key.
+
+        :returns: status, content type and body of the answer
+        :raises KeyError: if the key was never archived
+        """
+
+        entry = self._entries[key]
+
+        with self._lock:
+            body = self._zip.read(entry["name"])
+
+        return entry["status"], entry["content_type"], body
+
+    def close(self):
+        """ Write the central directory and close the zip file """
+
+        with self._lock:
+            if self._zip is not None:
+                self._finalizer()
+                self._zip = None
+                self._writable = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Transport(ABC):
+    """
+    Base of the transports of `_AemetApiRequest`: any object with the
+    `get` method of `AemetSession`.
+    """
+
+    # Whether the requests are paced by the scheduler of the client
+    paced = True
+
+    def bind(self, session):
+        """ Receive the pooled session of the client that uses it """
+
+    @abstractmethod
+    def get(self, url, **kwargs) -> requests.Response:
+        """ Send a GET request and return its response """
+
+    def metadatos(self, endpoint: str) -> Optional[dict]:
+        """ `metadatos` document of an endpoint known to the transport """
+
+        return None
+
+    def record_metadatos(self, endpoint: str, metadatos: dict):
+        """ Receive the `metadatos` document used for an endpoint """
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordingTransport(Transport):
+    """
+    Send the requests through a session and archive their answers. The
+    answers rate limited by AEMET (HTTP 429) are not archived, only the
+    retry that succeeded.
+
+    Parameters
+    ----------
+    archive : str, os.PathLike, ResponseArchive
+        Archive where the answers are written.
+    session : AemetSession, optional
+        Session sending the requests, by default the one of the client
+        the transport is given to.
+    """
+
+    def __init__(self, archive, session=None):
+        if not isinstance(archive, ResponseArchive):
+            archive = ResponseArchive(archive)
+        self.archive = archive
+        self.session = session
+
+    def close(self):
+        self.archive.close()
+
+    def bind(self, session):
+        if self.session is None:
+            self.session = session
+
+    def record_metadatos(self, endpoint: str, metadatos: dict):
+        # Whether it was downloaded or taken from the metadata cache
+        key = metadatos_key(endpoint)
+        if key not in self.archive:
+            self.archive.add(key, 200, "application/json",
+                             json.dumps(metadatos).encode("utf-8"))
+
+    def get(self, url, **kwargs) -> requests.Response:
+        response = self.session.get(url, **kwargs)
+
+        if response.status_code != 429:
+            self.archive.add(archive_key(url, kwargs.get("params")),
+                             response.status_code,
+                             response.headers.get("Content-Type"),
+                             response.content)
+
+        return response
+
+
+class ReplayTransport(Transport):
+    """
+    Answer the requests from an archive, without network access.
+
+    Parameters
+    ----------
+    archive : str, os.PathLike, ResponseArchive
+        Archive written by a `RecordingTransport`.
+    """
+
+    paced = False
+
+    def __init__(self, archive):
+        if not isinstance(archive, ResponseArchive):
+            archive = ResponseArchive(archive)
+        self.archive = archive
+
+    def close(self):
+        self.archive.close()
+
+    def metadatos(self, endpoint: str) -> Optional[dict]:
+        key = metadatos_key(endpoint)
+        if key not in self.archive:
+            return None
+
+        return json.loads(self.archive.get(key)[2])
+
+    def get(self, url, **kwargs) -> requests.Response:
+        """
+        Archived answer of the request.
+
+        :raises KeyError: if the request was not recorded
+        """
+
+        key = archive_key(url, kwargs.get("params"))
+        try:
+            status, content_type, body = self.archive.get(key)
+        except KeyError:
+            raise KeyError("No recorded answer for %s" % key) from None
+
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = body
+        # Streamed from the body in memory
+        response._content_consumed = True
+        response.headers = CaseInsensitiveDict()
+        if content_type is not None:
+            response.headers["Content-Type"] = content_type
+        response.encoding = get_encoding_from_headers(response.headers)
+
+        return response
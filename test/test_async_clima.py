@@ -0,0 +1,98 @@
+import asyncio
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import src.pyaemet as pae
+from src.pyaemet.utilities.cache import ObservationsCache
+from src.pyaemet.utilities.planner import ChunkPlanner
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+from src.pyaemet.types_classes.observations import ObservationsDataFrame
+
+from benchmarks.mock_server import MockAemetServer
+
+START, END = date(2020, 1, 1), date(2020, 1, 10)
+
+
+def scheduler() -> RateLimiter:
+    return RateLimiter(rate=100, burst=100, backoff=0.01)
+
+
+class FakeAsyncClima(pae.AsyncAemetClima):
+    """ AsyncAemetClima whose sites have data from `start_dt` to `enough` """
+
+    def __init__(self, enough, delay=0.2):
+        super().__init__(apikey=None)
+        self.enough = enough
+        self.delay = delay
+        self.requested = []
+
+    async def daily_clima(self, site, start_dt, end_dt=date.today(),
+                          hours_as_time=False):
+        self.requested.append(site)
+        await asyncio.sleep(self.delay)
+        days = pd.date_range(start_dt, self.enough.get(site, start_dt))
+        return ObservationsDataFrame(data={"date": days,
+                                           "site": site,
+                                           "temp_avg": np.ones(len(days))})
+
+
+def test_nearest_first_in_a_window():
+    clima = FakeAsyncClima(enough={})
+    near = clima._clima.near_sites(43.47, -3.798, n_near=8)
+    sites = list(near.sort_values(by="distance").site)
+    # Only the third and fifth nearest sites have enough data
+    clima.enough = {sites[2]: END, sites[4]: END}
+
+    tic = time.monotonic()
+    nearest = asyncio.run(clima.sites_curation(START, near, end_dt=END,
+                                               speculative=3))
+    elapsed = time.monotonic() - tic
+
+    assert list(nearest.site) == [sites[2]]
+    assert bool(nearest.has_enough.iloc[0])
+    # The first three sites are downloaded at the same time, and the
+    # farther ones are never requested
+    assert elapsed < 2 * clima.delay
+    assert clima.requested[:3] == sites[:3]
+    assert set(clima.requested) <= set(sites[:5])
+
+
+def test_curation_as_the_synchronous_client():
+    sites = ["0076", "0252D", "1111X", "3100B"]
+    start, end = date(2018, 1, 1), date(2019, 12, 31)
+
+    with MockAemetServer(latency=0.0, missing=0.3) as server:
+        clima = server.connect(pae.AemetClima(
+            apikey="mock", scheduler=scheduler(),
+            reverse_geocoder=ReverseGeocoder(offline=True)))
+        aclima = server.connect(pae.AsyncAemetClima(
+            apikey="mock", scheduler=scheduler()))
+
+        expected = clima.sites_curation(start, sites, end_dt=end,
+                                        verbosity=False)
+        curation = asyncio.run(aclima.sites_curation(start, sites,
+                                                     end_dt=end))
+
+    pd.testing.assert_frame_equal(curation, expected)
+
+
+def test_cache_and_planner_are_used(tmp_path):
+    planner = ChunkPlanner(state_file=tmp_path / "chunks.json")
+
+    with MockAemetServer(latency=0.0) as server:
+        aclima = server.connect(pae.AsyncAemetClima(
+            apikey="mock", scheduler=scheduler(),
+            cache=ObservationsCache(tmp_path / "cache"), planner=planner))
+
+        data = asyncio.run(aclima.daily_clima(["0076"], START, END))
+        requests = server.requests
+        again = asyncio.run(aclima.daily_clima(["0076"], START, END))
+
+        assert server.requests == requests
+
+    assert aclima._clima._planner is planner
+    assert again.reset_index(drop=True).equals(data.reset_index(drop=True))
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.pyaemet.aemet_request import ClimaValues
+from src.pyaemet.utilities.cache import ObservationsCache, MetadataCache
+
+
+def _observations(site, start, end):
+    return pd.DataFrame({"date": pd.date_range(start, end),
+                         "site": site,
+                         "temp_avg": 10.0})
+
+
+def test_missing_ranges(tmp_path):
+    cache = ObservationsCache(tmp_path)
+    cache.store("1111X", _observations("1111X", date(2020, 1, 10),
+                                       date(2020, 1, 20)),
+                date(2020, 1, 10), date(2020, 1, 20))
+
+    assert cache.missing_ranges("1111X", date(2020, 1, 1),
+                                date(2020, 1, 31)) == [
+        (date(2020, 1, 1), date(2020, 1, 9)),
+        (date(2020, 1, 21), date(2020, 1, 31)),
+        ]
+    assert cache.missing_ranges("1111X", date(2020, 1, 12),
+                                date(2020, 1, 15)) == []
+    assert cache.load("1111X", date(2020, 1, 12),
+                      date(2020, 1, 15)).shape[0] == 4
+
+
+def test_refresh_days(tmp_path):
+    cache = ObservationsCache(tmp_path, refresh_days=3)
+    end = date.today()
+    start = end - timedelta(days=9)
+    cache.store("1111X", _observations("1111X", start, end), start, end)
+
+    assert cache.missing_ranges("1111X", start, end) == [
+        (end - timedelta(days=2), end)]
+
+
+def test_eviction(tmp_path):
+    cache = ObservationsCache(tmp_path, max_bytes=1)
+    cache.store("1111X", _observations("1111X", date(2020, 1, 1),
+                                       date(2020, 1, 5)),
+                date(2020, 1, 1), date(2020, 1, 5))
+    cache.store("3100B", _observations("3100B", date(2020, 1, 1),
+                                       date(2020, 1, 5)),
+                date(2020, 1, 1), date(2020, 1, 5))
+
+    assert cache.load("1111X", date(2020, 1, 1), date(2020, 1, 5)) is None
+    assert not cache.load("3100B", date(2020, 1, 1),
+                          date(2020, 1, 5)).empty
+
+
+def test_metadata_cache(tmp_path):
+    cache = MetadataCache(tmp_path / "metadatos.json", ttl=60)
+    cache.store("diarios/datos/", {"campos": [{"id": "tmed"}]})
+
+    document = cache.get("diarios/datos/")
+    document["campos"].clear()
+
+    # Every result gets its own copy, shared between sessions
+    assert MetadataCache(tmp_path / "metadatos.json") \
+        .get("diarios/datos/") == {"campos": [{"id": "tmed"}]}
+    assert cache.get("diarios/datos/") == {"campos": [{"id": "tmed"}]}
+    assert cache.get("inventarioestaciones/todasestaciones/") is None
+
+    assert MetadataCache(tmp_path / "metadatos.json", ttl=0) \
+        .get("diarios/datos/") is None
+
+
+def test_typed_files_without_pickle(tmp_path):
+    cache = ObservationsCache(tmp_path)
+    data = pd.DataFrame({
+        "date": pd.date_range("2020-01-01", "2020-12-31"),
+        "site": pd.array(["1111X"] * 366, dtype="string"),
+        "temp_avg": np.linspace(-5, 30, 366),
+        "hr_temp_min": pd.array([540, -1, None] * 122, dtype="Int16"),
+        })
+    cache.store("1111X", data.iloc[::-1], date(2020, 1, 1),
+                date(2020, 12, 31))
+
+    # Nothing is unpickled to read the cache
+    records = np.load(tmp_path / "1111X.npy", allow_pickle=False)
+    assert len(records) == 366
+
+    march = cache.load("1111X", date(2020, 3, 1), date(2020, 3, 31))
+    expected = data[data["date"].dt.month == 3].reset_index(drop=True)
+    pd.testing.assert_frame_equal(march, expected)
+
+
+def test_days_without_data(tmp_path):
+    cache = ObservationsCache(tmp_path)
+    empty = pd.DataFrame(columns=["date", "site", "temp_avg"])
+    cache.store("1111X", empty, date(2020, 1, 1), date(2020, 1, 31))
+
+    assert cache.missing_ranges("1111X", date(2020, 1, 1),
+                                date(2020, 1, 31)) == []
+    assert cache.load("1111X", date(2020, 1, 1), date(2020, 1, 31)) is None
+
+    cache.store("1111X", _observations("1111X", date(2020, 2, 1),
+                                       date(2020, 2, 10)),
+                date(2020, 2, 1), date(2020, 2, 10))
+    assert len(cache.load("1111X", date(2020, 1, 1),
+                          date(2020, 2, 28))) == 10
+
+
+def test_cached_call_metadata(tmp_path):
+    cache = ObservationsCache(tmp_path)
+    cache.store("1111X", _observations("1111X", date(2020, 1, 1),
+                                       date(2020, 1, 10)),
+                date(2020, 1, 1), date(2020, 1, 10))
+    stored = {"fields": {}, "access_date": "2020-01-11T00:00:00"}
+    cache.metadata = stored
+
+    clima = ClimaValues("key", cache=cache)
+    clima._aemet_request = lambda url, trace: [{}, {"estado": 500}]
+
+    data, metadata = clima._cached_observations(date(2020, 1, 1),
+                                                date(2020, 1, 10), "1111X")
+    assert len(data) == 10
+    assert metadata["access_date"] > stored["access_date"]
+
+    # The error is reported, but not stored with the cached metadata
+    data, metadata = clima._cached_observations(date(2020, 1, 1),
+                                                date(2020, 1, 20), "1111X")
+    assert len(data) == 10
+    assert metadata["estado"] == 500
+    assert cache.metadata == stored
+    assert cache.missing_ranges("1111X", date(2020, 1, 1),
+                                date(2020, 1, 20)) == [
+        (date(2020, 1, 11), date(2020, 1, 20))]
+
+
+def test_load_out_of_the_cached_days(tmp_path):
+    cache = ObservationsCache(tmp_path)
+    cache.store("1111X", _observations("1111X", date(2020, 1, 10),
+                                       date(2020, 1, 20)),
+                date(2020, 1, 10), date(2020, 1, 20))
+
+    assert len(cache.load("1111X", date(2019, 12, 1),
+                          date(2020, 1, 10))) == 1
+    assert len(cache.load("1111X", date(2020, 1, 20),
+                          date(2020, 2, 10))) == 1
+    assert cache.load("1111X", date(2020, 2, 1), date(2020, 2, 10)).empty
@@ -0,0 +1,43 @@
+from datetime import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pyaemet.types_classes.observations import ObservationsDataFrame
+
+
+@pytest.fixture
+def data() -> ObservationsDataFrame:
+    return ObservationsDataFrame(
+        data={"date": pd.date_range("2000-01-01", periods=4),
+              "site": pd.array(["A", "A", "B", "B"], dtype="string"),
+              "temp_avg": [10.1, -3.4, np.nan, 1013.3],
+              "precipitation": [0.1, 123456789.1, 0.0, 2.0],
+              "hr_temp_min": [time(4, 30), time(0, 0, 59), None,
+                              time(23, 10)]},
+        library="pyaemet",
+        metadata={"fields": {}})
+
+
+def test_compact_schema(data):
+    compact = data.compact()
+
+    assert isinstance(compact, ObservationsDataFrame)
+    assert compact.metadata == data.metadata
+    assert compact.index.name == "date"
+    assert compact["site"].dtype == "category"
+    assert compact["temp_avg"].dtype == "float32"
+    # float32 would lose the decimal digit
+    assert compact["precipitation"].dtype == "float64"
+    assert compact["hr_temp_min"].tolist() == [270, -1, pd.NA, 1390]
+    np.testing.assert_allclose(compact["temp_avg"].round(1),
+                               data["temp_avg"])
+
+
+def test_memory_report(data):
+    report = data.compact(date_index=False).memory_report()
+
+    assert "total" in report.index
+    assert report.loc["total", "bytes"] == report["bytes"].drop("total").sum()
+    assert report.loc["temp_avg", "dtype"] == "float32"
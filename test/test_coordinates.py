@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import src.pyaemet as pae
+import src.pyaemet.utilities.coordinates as coordinates
+from src.pyaemet.aemet_request import ClimaValues
+from src.pyaemet.types_classes.sites import SitesDataFrame
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import (
+    _coordinates,
+    coordinates_to_degrees,
+    ADDRESS_COLUMNS,
+    ReverseGeocoder,
+    )
+
+from benchmarks.mock_server import MockAemetServer
+
+
+class CountingGeocoder(ReverseGeocoder):
+    """ ReverseGeocoder answering every lookup without network """
+
+    def __init__(self):
+        super().__init__()
+        self.looked_up = []
+
+    def _lookup(self, lat, long) -> dict:
+        with self._lock:
+            self.requests += 1
+            self.looked_up.append((lat, long))
+        address = {col: "%s %.3f" % (col, lat) for col in ADDRESS_COLUMNS}
+        self.set(lat, long, address)
+        return address
+
+
+def test_coordinates_to_degrees():
+    values = ["425432N", "034950W", "281234S", "012345E"]
+    degrees = coordinates_to_degrees(pd.Series(values, dtype=object))
+
+    assert degrees.dtype == "float64"
+    np.testing.assert_allclose(degrees, [_coordinates(v) for v in values])
+
+
+def test_malformed_coordinates():
+    values = ["0123E", "xx1234N", "425432X", None, float("nan")]
+    degrees = coordinates_to_degrees(pd.Series(values, dtype=object))
+
+    assert degrees.isna().all()
+
+
+def test_reverse_geocoder_offline(tmp_path):
+    cache_file = str(tmp_path / "addresses.json")
+    geocoder = ReverseGeocoder(cache_file=cache_file, offline=True)
+    geocoder.set(41.0, -3.0, {"city": "Cached"})
+    geocoder.save()
+
+    lookup = pd.DataFrame({"latitude": [43.491111], "longitude": [-3.800556],
+                           "city": ["Santander"]})
+    coordinates = pd.DataFrame({"latitude": [41.0, 43.4911112, 30.0],
+                                "longitude": [-3.0, -3.8005558, 0.0]})
+
+    addresses = ReverseGeocoder(cache_file=cache_file, offline=True) \
+        .addresses(coordinates, lookup=lookup)
+
+    assert addresses["city"].tolist()[:2] == ["Cached", "Santander"]
+    assert addresses["city"].isna().iloc[2]
+
+
+def test_only_new_or_moved_sites_geocoded():
+    old = pd.DataFrame({"site": ["A", "B", "C", "E"],
+                        "latitude": [40.0, 41.0, 42.0, 44.0],
+                        "longitude": [-3.0, -4.0, -5.0, -7.0],
+                        **{col: [col + " old"] * 3 + [pd.NA]
+                           for col in ADDRESS_COLUMNS}})
+    # A keeps its coordinates (up to rounding), B moved, C was removed,
+    # D is new and the lookup of E failed the last time
+    data = pd.DataFrame({"site": ["A", "B", "D", "E"],
+                         "latitude": [40.0 + 1e-12, 41.5, 43.0, 44.0],
+                         "longitude": [-3.0, -4.0, -6.0, -7.0]})
+
+    geocoder = CountingGeocoder()
+    data, geocoding = ClimaValues._sites_address(data, old, geocoder)
+
+    assert sorted(geocoder.looked_up) == [(41.5, -4.0), (43.0, -6.0),
+                                          (44.0, -7.0)]
+    assert geocoding == {"lookups": 3, "avoided": 1}
+
+    cities = data.set_index("site")["city"]
+    assert cities["A"] == "city old"
+    assert cities["B"] == "city 41.500"
+    assert cities["D"] == "city 43.000"
+    assert cities["E"] == "city 44.000"
+
+
+def test_geocoding_counters_of_the_inventory():
+    geocoder = CountingGeocoder()
+
+    with MockAemetServer(latency=0.0) as server:
+        client = server.connect(pae.AemetClima(
+            apikey="mock",
+            scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+            reverse_geocoder=geocoder))
+        stored = client.aemet_sites
+        # Two sites moved and one unknown to the stored inventory
+        moved = stored.copy()
+        moved.loc[moved.index[:2], "latitude"] += 0.1
+        client.aemet_sites = SitesDataFrame(data=moved.iloc[:-1],
+                                            library="pyaemet",
+                                            metadata=stored.metadata)
+
+        sites = client.sites_info(update=True)
+
+    # And the sites stored without any address
+    lookups = 3 + int(stored.iloc[2:-1][ADDRESS_COLUMNS].isna()
+                            .all(axis=1).sum())
+    assert len(geocoder.looked_up) == lookups
+    assert sites.metadata["geocoding"] == {"lookups": lookups,
+                                           "avoided": len(sites) - lookups}
+
+
+def test_failed_lookups_are_not_cached(monkeypatch):
+    answers = [requests.ConnectTimeout("timeout"), KeyError("raw"),
+               pd.Series({"city": "Santander", "region": "Cantabria"})]
+
+    def get_address(lat, long, timeout):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(coordinates, "get_address", get_address)
+    geocoder = ReverseGeocoder()
+
+    assert geocoder._lookup(43.46, -3.8) == {}
+    assert geocoder._lookup(43.46, -3.8) == {}
+    assert geocoder.get(43.46, -3.8) is None
+
+    address = {"city": "Santander", "region": "Cantabria"}
+    assert geocoder._lookup(43.46, -3.8) == address
+    assert geocoder.get(43.46, -3.8) == address
+    assert geocoder.requests == 3
+
+
+def test_failed_address_filled_by_the_next_update(monkeypatch):
+    available = False
+
+    def get_address(lat, long, timeout):
+        if not available:
+            raise requests.ConnectionError("unreachable")
+        return pd.Series({"city": "city %.3f" % lat})
+
+    monkeypatch.setattr(coordinates, "get_address", get_address)
+
+    with MockAemetServer(latency=0.0) as server:
+        client = server.connect(pae.AemetClima(
+            apikey="mock",
+            scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+            reverse_geocoder=ReverseGeocoder()))
+        stored = client.aemet_sites
+        # The site moved, so it is geocoded with the next update
+        moved = stored.copy()
+        moved.loc[moved.index[0], "latitude"] += 0.1
+        site = moved["site"].iloc[0]
+        client.aemet_sites = SitesDataFrame(data=moved, library="pyaemet",
+                                            metadata=stored.metadata)
+
+        first = client.sites_info(update=True).set_index("site")
+        available = True
+        second = client.sites_info(update=True).set_index("site")
+
+    assert first.loc[site, ADDRESS_COLUMNS].isna().all()
+    assert second.loc[site, "city"] \
+        == "city %.3f" % second.loc[site, "latitude"]
+    # Only the sites left without an address are looked up again
+    assert second.metadata["geocoding"]["lookups"] \
+        == first[ADDRESS_COLUMNS].isna().all(axis=1).sum()
+
+
+def test_unexpected_lookup_errors_raise(monkeypatch):
+    def get_address(lat, long, timeout):
+        raise ZeroDivisionError
+
+    monkeypatch.setattr(coordinates, "get_address", get_address)
+
+    with pytest.raises(ZeroDivisionError):
+        ReverseGeocoder()._lookup(43.46, -3.8)
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from src.pyaemet.utilities.curation import (
+    hr_to_datetime,
+    hours_to_minutes,
+    minutes_to_time,
+    )
+
+
+HOURS = ["05:30", "13", "24", "-1", "00:00", "23:59", "25", "12:75",
+         None, float("nan")]
+
+
+def test_hours_to_minutes():
+    minutes = hours_to_minutes(pd.Series(HOURS + ["Varias"], dtype=object))
+
+    assert str(minutes.dtype) == "Int16"
+    assert minutes.tolist()[:6] == [330, 780, 0, -1, 0, 1439]
+    assert minutes[6:-1].isna().all()
+    assert minutes.iloc[-1] == -1
+
+
+@pytest.mark.parametrize("value", HOURS)
+def test_legacy_hours(value):
+    minutes = hours_to_minutes(pd.Series([value], dtype=object))[0]
+
+    assert minutes_to_time(minutes) == hr_to_datetime(value)
@@ -0,0 +1,51 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.pyaemet.utilities.decoding import charset, decode_columns
+
+RECORDS = [{"fecha": "2020-01-0%d" % i, "indicativo": "1111X",
+            "nombre": "SANTANDER {Ñ}, €", "tmed": "1%d,0" % i}
+           for i in range(1, 8)]
+del RECORDS[2]["tmed"]
+RECORDS[4]["prec"] = "Ip"
+
+
+def _chunks(body: bytes, size: int) -> list:
+    return [body[i:i+size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 64, 4096])
+@pytest.mark.parametrize("encoding", ["iso-8859-15", "utf-8"])
+def test_split_chunks(size, encoding):
+    body = json.dumps(RECORDS, ensure_ascii=False, indent=2) \
+               .encode(encoding)
+
+    # Without charset, UTF-8 or ISO-8859-15 are told apart
+    for given in (encoding, None):
+        columns = decode_columns(_chunks(body, size), given)
+        assert pd.DataFrame(columns).equals(pd.DataFrame(RECORDS))
+
+
+def test_skip_fields():
+    body = json.dumps(RECORDS).encode("ascii")
+    columns = decode_columns([body], skip=("nombre", "prec"))
+
+    assert list(columns) == ["fecha", "indicativo", "tmed"]
+    assert columns["tmed"][2] is None
+
+
+def test_not_an_array():
+    assert decode_columns([b'{"estado": 404', b"}"]) == {"estado": 404}
+    assert decode_columns([b" [ ", b"] "]) == {}
+
+    with pytest.raises(ValueError):
+        decode_columns([b'[{"a": 1}, {"a": 2'])
+    with pytest.raises(ValueError):
+        decode_columns([b"<html></html>"])
+
+
+def test_charset():
+    assert charset("application/json;charset=ISO-8859-15") == "ISO-8859-15"
+    assert charset("text/plain") is None
@@ -0,0 +1,102 @@
+from datetime import date
+
+import src.pyaemet as pae
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+from src.pyaemet.utilities.instrumentation import (
+    STATS_KEY,
+    RequestStats,
+    merge_metadata,
+    )
+
+from benchmarks.mock_server import MockAemetServer
+
+
+def offline_client(server: MockAemetServer, hooks=None) -> pae.AemetClima:
+    return server.connect(pae.AemetClima(
+        apikey="mock",
+        scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+        reverse_geocoder=ReverseGeocoder(offline=True),
+        hooks=hooks))
+
+
+def test_events_of_every_stage():
+    events = []
+    with MockAemetServer(latency=0.0, throttle=0.5, missing=0.0,
+                         seed=1) as server:
+        client = offline_client(server, hooks=[events.append])
+        data = client.daily_clima(["0076", "0252D"], date(2019, 1, 1),
+                                  date(2019, 12, 31), verbosity=False)
+
+    requests = [ev for ev in events if ev["kind"] == "request"]
+    assert [ev["stage"] for ev in requests] == ["api", "datos", "metadatos"]
+    assert requests[0]["retries"] == server.throttled == 1
+    assert all(ev["status"] == 200 and ev["bytes"] > 0 for ev in requests)
+    # Only the 429 answer retried is not counted
+    assert 0 < server.bytes_sent - sum(ev["bytes"] for ev in requests) < 200
+
+    steps = {ev["stage"] for ev in events if ev["kind"] == "parse"}
+    assert {"json_datos", "frame", "decimal_notation", "hours",
+            "astype"} <= steps
+
+    assert data.metadata[STATS_KEY] == events
+    assert client.stats.events == events
+
+    summary = client.request_stats()
+    assert summary.loc[("request", "diarios/datos/", "api"),
+                       "retries"] == 1
+    assert summary["events"].sum() == len(events)
+
+
+def test_failing_hook_does_not_stop_the_request():
+    def hook(event):
+        raise RuntimeError("broken hook")
+
+    with MockAemetServer(latency=0.0) as server:
+        client = offline_client(server, hooks=[hook])
+        sites = client.sites_info(update=True)
+
+    assert not sites.empty
+    assert len(client.stats) == len(sites.metadata[STATS_KEY])
+
+
+def test_merge_metadata_keeps_the_events():
+    metadata = {"access_date": "a", STATS_KEY: [1]}
+    merge_metadata(metadata, {"access_date": "b", STATS_KEY: [2, 3]})
+
+    assert metadata == {"access_date": "b", STATS_KEY: [1, 2, 3]}
+
+
+def test_merge_metadata_does_not_change_the_parts():
+    parts = [{STATS_KEY: [i]} for i in range(1000)]
+
+    metadata = {}
+    for part in parts:
+        merge_metadata(metadata, part)
+
+    assert metadata[STATS_KEY] == list(range(1000))
+    assert [part[STATS_KEY] for part in parts[:2]] == [[0], [1]]
+
+
+def test_stats_keep_the_last_events():
+    stats = RequestStats(max_events=2)
+    for i in range(3):
+        stats({"kind": "parse", "endpoint": "e", "stage": "s",
+               "latency": i})
+
+    assert [ev["latency"] for ev in stats.events] == [1, 2]
+    assert stats.summary().loc[("parse", "e", "s"), "latency"] == 3
+
+
+def test_metadatos_downloaded_once_per_endpoint():
+    events = []
+    with MockAemetServer(latency=0.0) as server:
+        client = offline_client(server, hooks=[events.append])
+        data = client.daily_clima(["0076"], date(2000, 1, 1),
+                                  date(2019, 12, 31), verbosity=False)
+
+    stages = [(ev["kind"], ev["stage"]) for ev in events
+              if ev["stage"] == "metadatos"]
+    assert stages == [("request", "metadatos")] + [("cache", "metadatos")] * 4
+    assert server.requests == 5 * 2 + 1
+    assert "fields" in data.metadata
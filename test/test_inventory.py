@@ -0,0 +1,87 @@
+import shutil
+from importlib.resources import files
+
+import pandas as pd
+
+import src.pyaemet as pae
+import src.pyaemet.types_classes.sites as sites_module
+from src.pyaemet.types_classes.sites import SitesDataFrame
+from src.pyaemet.utilities.inventory import (
+    read_inventory_csv,
+    save_inventory,
+    load_inventory,
+    load_compact_inventory,
+    build_inventory,
+    )
+from src.pyaemet.utilities.dictionaries import SITES_TRANSLATION
+
+from . import clima
+
+STATIC = files("src.pyaemet").joinpath("static", "sites")
+
+
+def test_bundled_inventory_dtypes():
+    sites = pae.AemetClima._saved_sites_info()
+
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(sites),
+        read_inventory_csv(str(STATIC.joinpath("data.csv"))))
+    for col in sites.columns:
+        assert str(sites[col].dtype) == SITES_TRANSLATION[col]["dtype"]
+    # Codes keep their leading zeros
+    assert sites["synindic"].str.startswith("0").any()
+
+
+def test_compact_inventory_matches_csv():
+    compact = STATIC.joinpath("data.npz")
+    csv = STATIC.joinpath("data.csv")
+
+    # Rebuild it with `build_inventory` when the CSV changes
+    pd.testing.assert_frame_equal(load_compact_inventory(str(compact)),
+                                  read_inventory_csv(str(csv)))
+    assert compact.stat().st_size < csv.stat().st_size
+
+
+def test_csv_fallback(monkeypatch):
+    def unreadable(path):
+        raise OSError("data.npz")
+
+    monkeypatch.setattr(sites_module, "load_compact_inventory", unreadable)
+    sites = pae.AemetClima._saved_sites_info()
+
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(sites),
+        read_inventory_csv(str(STATIC.joinpath("data.csv"))))
+    assert sites.metadata
+
+
+def test_build_inventory(tmp_path):
+    shutil.copy(str(STATIC.joinpath("data.csv")), tmp_path)
+    shutil.copy(str(STATIC.joinpath("metadata.json")), tmp_path)
+
+    csv = build_inventory(str(tmp_path))
+    saved = SitesDataFrame.open_from(data_fl=str(tmp_path / "data.npz"),
+                                     metadata_fl=str(tmp_path
+                                                     / "metadata.json"))
+
+    pd.testing.assert_frame_equal(pd.DataFrame(saved), csv)
+
+
+def test_binary_inventory_round_trip(tmp_path):
+    csv = read_inventory_csv(str(STATIC.joinpath("data.csv")))
+    save_inventory(csv, str(tmp_path / "data.npy"))
+
+    for mmap in (True, False):
+        binary = load_inventory(str(tmp_path / "data.npy"), mmap=mmap)
+        pd.testing.assert_frame_equal(binary, csv)
+
+
+def test_save_binary_inventory(tmp_path):
+    sites = clima.aemet_sites
+    folder = str(tmp_path) + "/"
+
+    sites.save(folder, extension="npy")
+    saved = SitesDataFrame.open_from(folder_name=folder)
+
+    pd.testing.assert_frame_equal(pd.DataFrame(saved), pd.DataFrame(sites))
+    assert saved.metadata == sites.metadata
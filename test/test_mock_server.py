@@ -0,0 +1,38 @@
+from datetime import date
+
+import src.pyaemet as pae
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+
+from benchmarks.mock_server import MockAemetServer
+
+SITES = ["0252D", "0076", "1111X"]
+
+
+def offline_client(server: MockAemetServer) -> pae.AemetClima:
+    return server.connect(pae.AemetClima(
+        apikey="mock",
+        scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+        reverse_geocoder=ReverseGeocoder(offline=True)))
+
+
+def test_daily_clima():
+    with MockAemetServer(latency=0.0, missing=0.0) as server:
+        data = offline_client(server).daily_clima(
+            SITES, date(2019, 1, 1), date(2020, 12, 31), verbosity=False)
+
+    assert len(data) == 731 * len(SITES)
+    assert set(data["site"]) == set(SITES)
+    assert str(data["temp_avg"].dtype) == "float64"
+    assert "fields" in data.metadata
+
+
+def test_throttled_requests_are_retried():
+    with MockAemetServer(latency=0.0, throttle=0.5, missing=0.0,
+                         seed=1) as server:
+        client = offline_client(server)
+        sites = client.sites_info(update=True)
+
+    assert server.throttled == 1
+    assert list(sites.site) == list(client.aemet_sites.site)
+    assert sites["latitude"].notna().all()
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+from src.pyaemet.utilities.planner import ChunkPlanner
+
+ENDPOINT = "diarios/datos/"
+SITES = ["S%02d" % i for i in range(60)]
+
+
+def test_plan_covers_every_day_once():
+    planner = ChunkPlanner()
+    chunks = planner.plan(ENDPOINT, date(2000, 1, 1), date(2009, 12, 31),
+                          SITES)
+
+    days = {}
+    for (start, end), sites in chunks:
+        assert len(sites) <= 25
+        assert (end - start).days + 1 <= planner.max_days
+        for i in range((end - start).days + 1):
+            for st in sites:
+                key = (start + timedelta(days=i), st)
+                days[key] = days.get(key, 0) + 1
+
+    assert len(days) == 3653 * len(SITES)
+    assert set(days.values()) == {1}
+
+
+def test_shrink_and_grow(tmp_path):
+    planner = ChunkPlanner(state_file=tmp_path / "planner.json",
+                           forget_after=100)
+    chunk = ((date(2000, 1, 1), date(2003, 12, 31)), SITES[:25])
+
+    halves = planner.split(chunk)
+    assert [part[0] for part in halves] == [
+        (date(2000, 1, 1), date(2001, 12, 30)),
+        (date(2001, 12, 31), date(2003, 12, 31))]
+
+    planner.failure(ENDPOINT, chunk)
+    days, sites = planner.size(ENDPOINT)
+    assert days == 730 and sites == 25
+
+    planner.success(ENDPOINT, halves[0])
+    assert planner.size(ENDPOINT)[0] > days
+    # Remembered between sessions
+    assert ChunkPlanner(state_file=tmp_path / "planner.json") \
+        .size(ENDPOINT) == planner.size(ENDPOINT)
+
+    for _ in range(20):
+        planner.success(ENDPOINT, ((date(2000, 1, 1), date(2003, 12, 31)),
+                                   SITES[:25]))
+    # Never grows back to the size that failed
+    assert planner.size(ENDPOINT)[0] < 1461
+
+
+def test_split_sites():
+    planner = ChunkPlanner(min_days=31)
+    chunk = ((date(2000, 1, 1), date(2000, 1, 31)), SITES[:25])
+
+    assert [len(part[1]) for part in planner.split(chunk)] == [12, 13]
+    assert planner.split(((date(2000, 1, 1), date(2000, 1, 1)),
+                          SITES[:1])) == []
+
+
+def test_only_oversize_errors_shrink():
+    assert ChunkPlanner.is_oversize({"estado": 504})
+    assert ChunkPlanner.is_oversize(
+        {"estado": 404, "descripcion": "El rango de fechas no puede ser "
+                                       "superior a 5 años"})
+    assert not ChunkPlanner.is_oversize(
+        {"estado": 404, "descripcion": "No hay datos que satisfagan "
+                                       "esos criterios"})
+    assert not ChunkPlanner.is_oversize({"estado": 401})
+
+
+def test_failures_are_forgotten():
+    planner = ChunkPlanner(forget_after=3)
+    chunk = ((date(2000, 1, 1), date(2003, 12, 31)), SITES[:25])
+
+    planner.failure(ENDPOINT, chunk)
+    for _ in range(30):
+        days, n_sites = planner.size(ENDPOINT)
+        planner.success(ENDPOINT, ((date(2000, 1, 1),
+                                    date(2000, 1, 1) + timedelta(days - 1)),
+                                   SITES[:n_sites]))
+
+    assert planner.size(ENDPOINT) == (1461, 25)
+
+    # Also when the failure is old enough
+    planner = ChunkPlanner(forget_ttl=-1)
+    planner.failure(ENDPOINT, chunk)
+    planner.success(ENDPOINT, ((date(2000, 1, 1), date(2001, 12, 30)),
+                               SITES[:25]))
+    assert "failed_days" not in planner._state[ENDPOINT]
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+import src.pyaemet.aemet_request as aemet_request
+import src.pyaemet.utilities.scheduler as scheduler
+from src.pyaemet.aemet_request import _AemetApiRequest
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.transport import Transport
+
+
+class FakeClock():
+    """ Clock that only moves when something sleeps """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeTransport(Transport):
+    """ Transport answering with the given statuses and headers """
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.requests = 0
+
+    def get(self, url, **kwargs) -> requests.Response:
+        self.requests += 1
+        status, headers = self.answers.pop(0)
+
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = b'{"estado": %d}' % status
+
+        return response
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    monkeypatch.setattr(aemet_request, "time", clock)
+    return clock
+
+
+def test_rate_halves_on_429_and_recovers():
+    limiter = RateLimiter(rate=4.0, min_rate=0.5, max_rate=4.0,
+                          increase=0.5, decrease=0.5)
+
+    limiter.throttle(0)
+    assert limiter.rate == 2.0
+    limiter.throttle(1)
+    assert limiter.rate == 1.0
+
+    for rate in [1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.0]:
+        limiter.success()
+        assert limiter.rate == rate
+
+    for _ in range(5):
+        limiter.throttle(0)
+    assert limiter.rate == limiter.min_rate
+    assert limiter.throttled == 7
+
+
+def test_bucket_paces_the_requests(clock):
+    limiter = RateLimiter(rate=2.0, burst=2)
+
+    for _ in range(5):
+        limiter.acquire()
+
+    # The burst is free, then one request every 1 / rate seconds
+    assert clock.sleeps == [0.5, 0.5, 0.5]
+
+    clock.now += 10
+    limiter.acquire()
+    assert len(clock.sleeps) == 3
+
+
+def test_throttle_empties_the_bucket(clock):
+    limiter = RateLimiter(rate=2.0, burst=5, jitter=0.0)
+
+    limiter.acquire()
+    limiter.throttle(0, retry_after=1.0)
+    limiter.acquire()
+
+    # The halved rate is also paid by the requests already in the bucket
+    assert clock.sleeps == [1.0]
+
+
+def test_backoff_without_hint():
+    limiter = RateLimiter(backoff=2.0, max_backoff=60.0, jitter=0.0)
+
+    assert [limiter.throttle(attempt) for attempt in range(7)] \
+        == [2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]
+    assert limiter.throttle(3, retry_after=5.0) == 5.0
+    # Nor AEMET makes a request wait longer than max_backoff
+    assert limiter.throttle(0, retry_after=3600.0) == 60.0
+
+    jittered = RateLimiter(backoff=2.0, jitter=0.25).throttle(0)
+    assert 2.0 <= jittered <= 2.5
+
+
+def test_retry_after_header():
+    def response(value):
+        answer = requests.Response()
+        if value is not None:
+            answer.headers["Retry-After"] = value
+        return answer
+
+    assert RateLimiter.retry_after(response("7")) == 7.0
+    assert RateLimiter.retry_after(response("-3")) == 0.0
+    assert RateLimiter.retry_after(response(None)) is None
+    assert RateLimiter.retry_after(response("soon")) is None
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert RateLimiter.retry_after(response(format_datetime(later, True))) \
+        == pytest.approx(30, abs=2)
+
+
+def test_retries_honour_retry_after(clock):
+    limiter = RateLimiter(rate=4.0, burst=10, increase=0.5, jitter=0.0)
+    transport = FakeTransport([(429, {"Retry-After": "7"}),
+                               (429, {}),
+                               (200, {})])
+    request = _AemetApiRequest("key", scheduler=limiter, transport=transport)
+
+    events = []
+    request.add_hook(events.append)
+    response = request._get("http://aemet/api/")
+
+    assert response.status_code == 200
+    assert transport.requests == 3
+    # The hint of AEMET, then the exponential backoff
+    assert clock.sleeps == [7.0, limiter.backoff * 2]
+    assert limiter.rate == 4.0 * 0.5 * 0.5 + 0.5
+    assert events[-1]["retries"] == 2
+
+
+def test_rate_limit_exceeded(clock):
+    limiter = RateLimiter(rate=100.0, burst=10, max_retries=2, jitter=0.0)
+    transport = FakeTransport([(429, {"Retry-After": "1"})] * 3)
+    request = _AemetApiRequest("key", scheduler=limiter, transport=transport)
+
+    with pytest.raises(requests.HTTPError, match="after 2 retries"):
+        request._get("http://aemet/api/")
+
+    assert transport.requests == 3
+    assert clock.sleeps == [1.0, 1.0]
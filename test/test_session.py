@@ -0,0 +1,91 @@
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import src.pyaemet as pae
+from src.pyaemet.utilities.session import AemetSession
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+
+from benchmarks.mock_server import MockAemetServer
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """ Keep-alive handler answering with the headers it received """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps(dict(self.headers)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d/" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reused(url):
+    session = AemetSession(pool_size=2)
+
+    for _ in range(5):
+        assert session.get(url).ok
+
+    assert session.stats() == {"requests": 5, "connections": 1,
+                               "reused": 4}
+
+    # A closed pool opens a new connection
+    session.close()
+    session.get(url)
+    assert session.stats()["connections"] == 2
+
+
+def test_gzip_negotiation(url):
+    assert AemetSession().get(url).json()["Accept-Encoding"] \
+        == "gzip, deflate"
+    assert AemetSession(gzip=False).get(url).json()["Accept-Encoding"] \
+        == "identity"
+
+
+def test_default_timeout(monkeypatch):
+    session = AemetSession(connect_timeout=3.0, read_timeout=30.0)
+    sent = []
+    monkeypatch.setattr(session._session, "get",
+                        lambda url, **kwargs: sent.append(kwargs))
+
+    session.get("http://aemet/")
+    session.get("http://aemet/", timeout=1.0)
+
+    assert [kwargs["timeout"] for kwargs in sent] == [(3.0, 30.0), 1.0]
+
+
+def test_client_shares_one_session():
+    with MockAemetServer(latency=0.0) as server:
+        client = server.connect(pae.AemetClima(
+            apikey="mock",
+            scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+            reverse_geocoder=ReverseGeocoder(offline=True)))
+        client.daily_clima(["0076"], date(2019, 1, 1), date(2019, 12, 31),
+                           verbosity=False)
+        client.sites_info(update=True)
+
+    assert client._aemet_request._session is client.session
+    stats = client.connection_stats()
+    assert stats["requests"] == server.requests == 6
+    assert stats["connections"] == 1
+    assert stats["reused"] == 5
@@ -0,0 +1,125 @@
+import os
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from requests import HTTPError
+
+import src.pyaemet as pae
+from src.pyaemet.climatology import _Availability
+from src.pyaemet.types_classes.observations import ObservationsDataFrame
+
+START, END = date(2020, 1, 1), date(2020, 1, 10)
+
+
+class FakeClima(pae.AemetClima):
+    """ AemetClima whose sites have data from `start_dt` to `enough` """
+
+    def __init__(self, enough, delay=0.2):
+        super().__init__(apikey=None)
+        self.enough = enough
+        self.delay = delay
+        self.requested = []
+
+    def daily_clima(self, site, start_dt, end_dt=date.today(), **kwargs):
+        self.requested.append(site)
+        time.sleep(self.delay)
+        days = pd.date_range(start_dt, self.enough.get(site, start_dt))
+        return ObservationsDataFrame(data={"date": days,
+                                           "site": site,
+                                           "temp_avg": np.ones(len(days))})
+
+
+def test_nearest_first():
+    clima = FakeClima(enough={})
+    near = clima.near_sites(43.47, -3.798, n_near=8)
+    sites = list(near.sort_values(by="distance").site)
+    # Only the third and fifth nearest sites have enough data
+    clima.enough = {sites[2]: END, sites[4]: END}
+
+    tic = time.monotonic()
+    nearest = clima.sites_curation(START, near, end_dt=END, threshold=0.75,
+                                   verbosity=False, speculative=4)
+    elapsed = time.monotonic() - tic
+
+    assert list(nearest.site) == [sites[2]]
+    assert bool(nearest.has_enough.iloc[0])
+    # The first four sites are downloaded at the same time
+    assert elapsed < 2 * clima.delay
+    assert sites[-1] not in clima.requested
+
+
+def test_availability():
+    rng = np.random.default_rng(0)
+    days = pd.date_range(START, END)
+    data = pd.concat([
+        pd.DataFrame({"date": days,
+                      "site": site,
+                      "temp_avg": np.where(rng.random(len(days)) < ratio,
+                                           1.0, np.nan),
+                      "precipitation": np.where(
+                          rng.random(len(days)) < ratio, 1.0, np.nan)})
+        for site, ratio in [("A", 1.0), ("B", 0.8), ("C", 0.5), ("D", 0.0)]
+        ])
+
+    for variables in ["all", "temp_avg", ["temp_avg", "precipitation"]]:
+        availability = _Availability(START, END, columns=variables)
+        availability.add(data)
+        availability = availability.result()
+        for site, site_data in data.groupby("site"):
+            is_enough, amount = pae.AemetClima._have_enough(
+                site_data, START, END, columns=variables)
+            assert availability.loc[site, "has_enough"] == is_enough
+            assert availability.loc[site, "amount"] == pytest.approx(amount)
+
+
+class ChunkedClima(pae.AemetClima):
+    """ AemetClima whose `enough` sites have every day of data """
+
+    def __init__(self, enough, failing):
+        super().__init__(apikey=None)
+        self.enough = enough
+        self.failing = failing
+
+    def _get_chunk(self, chunk, hours_as_time=False):
+        (start, end), sites = chunk
+        if self.failing in sites:
+            raise HTTPError("AEMET rate limit still exceeded")
+
+        days = pd.date_range(start, end)
+        return ObservationsDataFrame(data=pd.concat([
+            pd.DataFrame({"date": days,
+                          "site": site,
+                          "temp_avg": 1.0 if site in self.enough else np.nan})
+            for site in sites
+            ]))
+
+
+def test_curation_by_chunks(tmp_path):
+    clima = ChunkedClima(enough=set(), failing=None)
+    sites = list(clima.aemet_sites.site[:30])
+    clima.enough = {sites[0], sites[1], sites[27]}
+    # The second batch of 5 sites fails in both intervals
+    clima.failing = sites[29]
+
+    start, end = date(2015, 1, 1), date(2020, 12, 31)
+    curation = clima.sites_curation(start, sites, end_dt=end,
+                                    variables="temp_avg",
+                                    save_folder=str(tmp_path),
+                                    verbosity=False)
+
+    enough = curation.set_index("site")["has_enough"]
+    assert set(enough[enough].index) == {sites[0], sites[1]}
+    amount = curation.set_index("site")["amount"]
+    assert amount[sites[0]] == pytest.approx(1.0)
+    assert amount[sites[2]] == 0.0
+    # The sites of the failing batch are not evaluated
+    assert np.isnan(amount[sites[27]])
+
+    # Both intervals of the sites with enough data, and nothing else
+    assert sorted(os.listdir(tmp_path)) == sorted([sites[0] + ".csv",
+                                                   sites[1] + ".csv"])
+    saved = pd.read_csv(tmp_path / (sites[0] + ".csv"))
+    assert len(saved) == (end - start).days + 1
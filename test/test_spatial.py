@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.pyaemet.utilities.spatial import haversine, SitesIndex
+
+from . import clima
+
+
+@pytest.mark.parametrize("latitude, longitude, n_near, max_distance", [
+    (43.47, -3.798, 4, 6237),
+    (40.41, -3.70, 20, 50),
+    (28.1, -15.4, 100, 6237),
+    (41.38, 2.17, 5, 0.5),
+    ])
+def test_filter_at(latitude, longitude, n_near, max_distance):
+    sites = clima.aemet_sites
+    distances = haversine(sites["latitude"], sites["longitude"],
+                          latitude, longitude)
+    expected = np.lexsort((np.arange(len(sites)), distances))
+    expected = expected[distances[expected] <= max_distance][:n_near]
+
+    response = sites.filter_at(latitude, longitude, n_near, max_distance)
+
+    assert list(response.index) == list(sites.index[expected])
+    np.testing.assert_allclose(response["distance"], distances[expected])
+
+
+def test_sites_index_rebuilt():
+    sites = clima.aemet_sites.copy()
+    index = sites.sites_index
+
+    assert sites.sites_index is index
+
+    sites["latitude"] = sites["latitude"] + 1.0
+
+    assert sites.sites_index is not index
+    assert isinstance(sites.sites_index, SitesIndex)
+
+
+def test_batch_near_sites():
+    latitudes = [43.47, 40.41, 28.1, 41.38]
+    longitudes = [-3.798, -3.70, -15.4, 2.17]
+
+    response = clima.batch_near_sites(latitudes, longitudes, n_near=6,
+                                      max_distance=80, chunk_size=3)
+
+    assert list(response.columns) == ["query_id", "site", "distance", "rank"]
+    for query_id, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+        near = clima.near_sites(lat, lon, n_near=6, max_distance=80)
+        batch = response[response["query_id"] == query_id]
+
+        assert list(batch["site"]) == list(near["site"])
+        assert list(batch["rank"]) == list(range(1, len(near) + 1))
@@ -0,0 +1,143 @@
+from datetime import date
+
+import pytest
+
+import src.pyaemet as pae
+from src.pyaemet.utilities.cache import MetadataCache
+from src.pyaemet.utilities.scheduler import RateLimiter
+from src.pyaemet.utilities.coordinates import ReverseGeocoder
+from src.pyaemet.utilities.transport import (
+    RecordingTransport,
+    ReplayTransport,
+    ResponseArchive,
+    archive_key,
+    )
+
+from benchmarks.mock_server import MockAemetServer
+
+SITES = ["0252D", "0076"]
+
+
+def client(transport, url, metadata_cache=None) -> pae.AemetClima:
+    aemet = pae.AemetClima(
+        apikey="mock",
+        scheduler=RateLimiter(rate=100, burst=100, backoff=0.01),
+        reverse_geocoder=ReverseGeocoder(offline=True),
+        transport=transport,
+        metadata_cache=metadata_cache)
+    aemet._aemet_request.main_url = url
+    return aemet
+
+
+def test_replay_without_network(tmp_path):
+    archive = tmp_path / "pull.zip"
+
+    with MockAemetServer(latency=0.0, throttle=0.5, seed=1) as server:
+        url = server.url
+        with RecordingTransport(archive) as transport:
+            recording = client(transport, url)
+            data = recording.daily_clima(SITES, date(2019, 1, 1),
+                                         date(2020, 12, 31),
+                                         verbosity=False)
+            sites = recording.sites_info(update=True)
+
+    # API call, datos and metadatos of the two endpoints, but no 429,
+    # and the metadatos kept by endpoint
+    assert server.throttled > 0
+    assert len(ResponseArchive(archive)) == 8
+
+    # A different key and a scheduler that would take minutes
+    replay = pae.AemetClima(apikey="other",
+                            scheduler=RateLimiter(rate=0.01, burst=1),
+                            reverse_geocoder=ReverseGeocoder(offline=True),
+                            transport=ReplayTransport(archive))
+    replay._aemet_request.main_url = url
+
+    replayed = replay.daily_clima(SITES, date(2019, 1, 1),
+                                  date(2020, 12, 31), verbosity=False)
+
+    assert replayed.equals(data)
+    assert replay.sites_info(update=True).equals(sites)
+    assert replay.connection_stats()["requests"] == 0
+
+
+def test_missing_answer(tmp_path):
+    replay = client(ReplayTransport(tmp_path / "empty.zip"),
+                    "http://127.0.0.1:1/api/")
+
+    with pytest.raises(KeyError, match="No recorded answer"):
+        replay.sites_info(update=True)
+
+
+def test_archive_key_ignores_the_api_key():
+    assert archive_key("http://a/b", {"api_key": "x"}) == "http://a/b"
+    assert archive_key("http://a/b", {"api_key": "x", "y": 1, "b": 2}) \
+        == "http://a/b?b=2&y=1"
+
+
+def test_archive_reads_and_appends_with_one_handle(tmp_path):
+    path = tmp_path / "pull.zip"
+
+    with ResponseArchive(path) as archive:
+        for i in range(50):
+            archive.add("http://a/%d" % i, 200, "application/json",
+                        b"[%d]" % i)
+        handle = archive._zip
+        # Read back through the same handle while it is being written
+        assert archive.get("http://a/7") == (200, "application/json",
+                                             b"[7]")
+        assert archive._zip is handle
+
+    with ResponseArchive(path) as archive:
+        assert len(archive) == 50
+        assert archive.get("http://a/49")[2] == b"[49]"
+        archive.add("http://a/50", 404, None, b"")
+
+    assert ResponseArchive(path).get("http://a/50") == (404, None, b"")
+
+
+def test_replay_a_parallel_recording(tmp_path):
+    archive = tmp_path / "pull.zip"
+    start, end = date(2000, 1, 1), date(2019, 12, 31)
+
+    with MockAemetServer(latency=0.01) as server:
+        url = server.url
+        with RecordingTransport(archive) as transport:
+            data = client(transport, url).daily_clima(
+                SITES, start, end, max_workers=5, verbosity=False)
+
+    # Whichever chunk downloaded the metadatos, a sequential replay
+    # finds it
+    with ReplayTransport(archive) as transport:
+        replayed = client(transport, url).daily_clima(SITES, start, end,
+                                                      verbosity=False)
+
+    assert replayed.equals(data)
+
+
+def test_replay_a_recording_with_a_warm_cache(tmp_path):
+    archive = tmp_path / "pull.zip"
+    metadata_cache = MetadataCache()
+
+    with MockAemetServer(latency=0.0) as server:
+        url = server.url
+        # The metadatos of both endpoints are cached before recording
+        warm = client(None, url, metadata_cache)
+        warm.daily_clima(SITES, date(2018, 1, 1), date(2018, 12, 31),
+                         verbosity=False)
+        warm.sites_info(update=True)
+
+        with RecordingTransport(archive) as transport:
+            recording = client(transport, url, metadata_cache)
+            data = recording.daily_clima(SITES, date(2019, 1, 1),
+                                         date(2019, 12, 31),
+                                         verbosity=False)
+            sites = recording.sites_info(update=True)
+
+    with ReplayTransport(archive) as transport:
+        replay = client(transport, url)
+        replayed = replay.daily_clima(SITES, date(2019, 1, 1),
+                                      date(2019, 12, 31), verbosity=False)
+
+        assert replayed.equals(data)
+        assert replay.sites_info(update=True).equals(sites)